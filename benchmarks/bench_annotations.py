@@ -0,0 +1,96 @@
+"""
+Benchmark of the conversions of SDRF files to annotation tables on synthetic files.
+
+    python benchmarks/bench_annotations.py --rows 1000,10000,100000
+
+Times the MSstats annotation of files whose source names have a sample number ("Sample 12") and of files where every
+sample is numbered from its source name, with the CSV written to disk, and the NormalyzerDE design with and without a
+MaxQuant experimental design. The numbering of the samples and the mapping of the assays to the MaxQuant samples are
+also timed with the per-row loops over lists they replace, that are quadratic in the number of samples and runs, up to
+``--max-per-row`` rows.
+"""
+
+import os
+import sys
+import tempfile
+
+import click
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import best_time  # noqa: E402
+from common import make_sdrf  # noqa: E402
+from common import report  # noqa: E402
+
+from sdrf_pipelines.msstats.msstats import Msstats  # noqa: E402
+from sdrf_pipelines.normalyzerde.normalyzerde import NormalyzerDE  # noqa: E402
+
+
+def per_row_bio_replicates(source_names):
+    bio_replicates = []
+    sample_id_map = {}
+    for source_name in source_names:
+        if source_name not in sample_id_map:
+            sample_id_map[source_name] = len(sample_id_map) + 1
+        sample = sample_id_map[source_name]
+        if sample not in bio_replicates:
+            bio_replicates.append(sample)
+        str(bio_replicates.index(sample) + 1)
+
+
+def per_row_maxquant_samples(assays, mq_assays, mq_experiments):
+    for assay in assays:
+        mq_experiments[mq_assays.index(assay)].replace(" ", ".").replace("-", ".")
+
+
+@click.command()
+@click.option("--rows", default="1000,10000,100000", help="Comma separated numbers of rows of the synthetic SDRFs")
+@click.option("--repeat", default=3, help="Number of repetitions, the best time is reported")
+@click.option("--max-per-row", default=10000, help="Largest SDRF timed with the per-row loop")
+def main(rows: str, repeat: int, max_per_row: int):
+    msstats = Msstats()
+    normalyzerde = NormalyzerDE()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        annotation_path = os.path.join(tmpdir, "annotation.csv")
+        mq_design_path = os.path.join(tmpdir, "exp_design.txt")
+        for n_rows in [int(n) for n in rows.split(",")]:
+            numbered = make_sdrf(n_rows)
+            # one sample per row, named without a sample number
+            named = numbered.assign(**{"source name": [f"patient {i}" for i in range(n_rows)]})
+            for name, sdrf in (("sample numbers", numbered), ("source names", named)):
+                report(
+                    f"msstats annotation, {name}",
+                    n_rows,
+                    best_time(
+                        lambda: msstats.convert_msstats_annotation(sdrf, None, annotation_path, False, True), repeat
+                    ),
+                )
+            # the MaxQuant design lists the runs in reverse order
+            assays = numbered["comment[data file]"].str.replace(".raw", "", regex=False).tolist()
+            mq_design = pd.DataFrame({"Name": assays[::-1], "Fraction": 1, "Experiment": numbered["source name"][::-1]})
+            mq_design.to_csv(mq_design_path, sep="\t", index=False)
+            report("normalyzerde design", n_rows, best_time(lambda: normalyzerde.design_table(numbered), repeat))
+            report(
+                "normalyzerde design, maxquant samples",
+                n_rows,
+                best_time(lambda: normalyzerde.design_table(numbered, None, mq_design_path), repeat),
+            )
+            if n_rows <= max_per_row:
+                source_names = named["source name"].tolist()
+                report(
+                    "sample numbering (per row)",
+                    n_rows,
+                    best_time(lambda: per_row_bio_replicates(source_names), repeat),
+                )
+                mq_assays, mq_experiments = mq_design["Name"].tolist(), mq_design["Experiment"].tolist()
+                report(
+                    "maxquant samples (per row)",
+                    n_rows,
+                    best_time(lambda: per_row_maxquant_samples(assays, mq_assays, mq_experiments), repeat),
+                )
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of the experimental design and factor value checks on synthetic files.
+
+    python benchmarks/bench_experimental_design.py --rows 10000,100000
+
+Times the integer checks of the replicate and fraction columns (vectorized masks, and the per-cell ``Series.apply``
+of ``check_if_integer`` they replace, once per check), the factor values and the whole experimental design, on valid
+files and on files where a tenth of the replicates and fractions are not positive integers.
+"""
+
+import os
+import sys
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import best_time  # noqa: E402
+from common import make_sdrf  # noqa: E402
+from common import report  # noqa: E402
+
+from sdrf_pipelines.sdrf.sdrf import INTEGER_COLUMNS  # noqa: E402
+from sdrf_pipelines.sdrf.sdrf import SdrfDataFrame  # noqa: E402
+from sdrf_pipelines.sdrf.sdrf import check_if_integer  # noqa: E402
+
+
+def make_invalid(df: SdrfDataFrame, seed: int = 0) -> SdrfDataFrame:
+    """
+    Replace a tenth of the values of the integer columns with decimals, zeros and text.
+    """
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    for column in INTEGER_COLUMNS:
+        values = df[column].to_numpy(dtype=object)
+        bad = rng.random(len(df)) < 0.1
+        values[bad] = rng.choice(["1.5", "0", "not available"], bad.sum())
+        df[column] = values
+    return df
+
+
+def per_cell_checks(df: SdrfDataFrame):
+    for column in INTEGER_COLUMNS:
+        df[column].apply(check_if_integer)
+        df[column].apply(lambda x: check_if_integer(x) and int(x) > 0)
+
+
+@click.command()
+@click.option("--rows", default="10000,100000", help="Comma separated numbers of rows of the synthetic SDRFs")
+@click.option("--repeat", default=3, help="Number of repetitions, the best time is reported")
+def main(rows: str, repeat: int):
+    for n_rows in [int(n) for n in rows.split(",")]:
+        valid = SdrfDataFrame(make_sdrf(n_rows))
+        for name, df in (("valid", valid), ("invalid", SdrfDataFrame(make_invalid(valid)))):
+            report(f"integer checks, {name} (per cell)", n_rows, best_time(lambda: per_cell_checks(df), repeat))
+            report(
+                f"integer checks, {name} (masks)",
+                n_rows,
+                best_time(lambda: df.check_accessions_conventions([]), repeat),
+            )
+            report(f"factor values, {name}", n_rows, best_time(df.validate_factor_values, repeat))
+            report(f"experimental design, {name}", n_rows, best_time(df.validate_experimental_design, repeat))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Soak benchmark of a long-running OpenMS converter.
+
+    python benchmarks/bench_openms_loop.py --files 1000 --rows 100
+
+Converts many synthetic SDRF files, each with its own raw files, with one converter and writes the files to disk, like
+a service converting submissions. Every ``--every`` files it reports the time per conversion, the number of objects
+tracked by the garbage collector and the size of the pickled converter, which stay flat when nothing is kept from one
+conversion to the next.
+"""
+
+import contextlib
+import gc
+import io
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import write_sdrf  # noqa: E402
+
+from sdrf_pipelines.openms.openms import OpenMS  # noqa: E402
+
+
+@click.command()
+@click.option("--files", default=1000, help="Number of SDRF files converted")
+@click.option("--rows", default=100, help="Number of rows of every synthetic SDRF")
+@click.option("--every", default=100, help="Number of conversions between two reports")
+def main(files: int, rows: int, every: int):
+    openms = OpenMS()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sdrf_file = write_sdrf(os.path.join(tmpdir, "bench.sdrf.tsv"), rows)
+        with open(sdrf_file, encoding="utf-8") as fh:
+            content = fh.read()
+        cwd = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            start = time.perf_counter()
+            for i in range(1, files + 1):
+                with open(sdrf_file, "w", encoding="utf-8") as fh:
+                    fh.write(content.replace(".raw", f"_{i}.raw"))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    openms.openms_convert(sdrf_file)
+                if i % every == 0 or i == files:
+                    seconds = (time.perf_counter() - start) / (every if i % every == 0 else i % every)
+                    gc.collect()
+                    print(
+                        f"{i:>6} files  {seconds * 1000:8.1f} ms per file  {len(gc.get_objects()):>9} objects  "
+                        f"converter {len(pickle.dumps(openms)):>9} bytes"
+                    )
+                    start = time.perf_counter()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark of split-sdrf on synthetic files.
+
+    python benchmarks/bench_split.py --rows 100000,1000000 --jobs 1,4
+
+Splits files into a few groups (disease), one group per sample (source name) and one group per raw file (data file),
+with every number of writer threads, and reports the rows and megabytes written per second.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import write_sdrf  # noqa: E402
+
+from sdrf_pipelines.sdrf.split import split_sdrf_file  # noqa: E402
+
+SPLITS = [
+    ("disease", "characteristics[disease]"),
+    ("samples", "source name"),
+    ("raw files", "comment[data file]"),
+]
+
+
+@click.command()
+@click.option("--rows", default="100000,1000000", help="Comma separated numbers of rows of the synthetic SDRFs")
+@click.option("--jobs", default="1,4", help="Comma separated numbers of writer threads")
+@click.option("--directory", help="Directory of the files, a temporary directory by default (e.g. on another disk)")
+def main(rows: str, jobs: str, directory: str):
+    with tempfile.TemporaryDirectory(dir=directory) as tmpdir:
+        for n_rows in [int(n) for n in rows.split(",")]:
+            sdrf_file = write_sdrf(os.path.join(tmpdir, "bench.sdrf.tsv"), n_rows)
+            for name, column in SPLITS:
+                for n_jobs in [int(n) for n in jobs.split(",")]:
+                    output_directory = os.path.join(tmpdir, "split")
+                    os.mkdir(output_directory)
+                    statuses = []
+                    split_sdrf_file(
+                        sdrf_file, [column], output_directory=output_directory, jobs=n_jobs, progress=statuses.append
+                    )
+                    print(f"{name:<10} {n_jobs:>2} writers  {statuses[-1]}")
+                    shutil.rmtree(output_directory)
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark of the SDRF validation on synthetic files.
+
+    python benchmarks/bench_validation.py --rows 1000,10000,100000
+
+Times the parsing, the column rules of the templates, the empty cells check and the full validation. When
+pandas_schema is installed, the same column rules are timed with its per-cell implementation for comparison, on
+valid columns and on columns where every cell fails (one error per cell).
+"""
+
+import os
+import sys
+import tempfile
+
+import click
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import best_time  # noqa: E402
+from common import report  # noqa: E402
+from common import write_sdrf  # noqa: E402
+
+from sdrf_pipelines.sdrf.rules import EmptyCells  # noqa: E402
+from sdrf_pipelines.sdrf.rules import LeadingWhitespaceValidation  # noqa: E402
+from sdrf_pipelines.sdrf.rules import TrailingWhitespaceValidation  # noqa: E402
+from sdrf_pipelines.sdrf.sdrf import SdrfDataFrame  # noqa: E402
+from sdrf_pipelines.sdrf.sdrf_schema import MASS_SPECTROMETRY  # noqa: E402
+from sdrf_pipelines.sdrf.sdrf_schema import SDRFColumn  # noqa: E402
+
+try:
+    import pandas_schema
+    from pandas_schema import validation as ps_validation
+except ImportError:
+    pandas_schema = None
+
+
+def bench_column_rules(df: pd.DataFrame, n_rows: int, repeat: int):
+    columns = [c for c in df.columns if not c.startswith("factor value")]
+    rules = [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()]
+    sdrf_columns = [SDRFColumn(c, rules, allow_empty=True) for c in columns]
+    report(
+        "column rules (rules engine)", n_rows, best_time(lambda: [c.validate(df[c.name]) for c in sdrf_columns], repeat)
+    )
+
+    # every cell fails: measures the cost of reporting one error per cell
+    failing = (" " + df["assay name"].astype(str)).rename("assay name")
+    column = SDRFColumn("assay name", rules, allow_empty=True)
+    report("failing column (rules engine)", n_rows, best_time(lambda: column.validate(failing), repeat))
+    report(
+        "failing column, materialized (rules engine)", n_rows, best_time(lambda: list(column.validate(failing)), repeat)
+    )
+
+    if pandas_schema is None:
+        return
+    ps_rules = [ps_validation.LeadingWhitespaceValidation(), ps_validation.TrailingWhitespaceValidation()]
+    ps_columns = [pandas_schema.Column(c, ps_rules, allow_empty=True) for c in columns]
+    report(
+        "column rules (pandas_schema)", n_rows, best_time(lambda: [c.validate(df[c.name]) for c in ps_columns], repeat)
+    )
+    ps_column = pandas_schema.Column("assay name", ps_rules, allow_empty=True)
+    report("failing column (pandas_schema)", n_rows, best_time(lambda: ps_column.validate(failing), repeat))
+
+
+@click.command()
+@click.option("--rows", default="1000,10000,100000", help="Comma separated numbers of rows of the synthetic SDRFs")
+@click.option("--repeat", default=3, help="Number of repetitions, the best time is reported")
+def main(rows: str, repeat: int):
+    for n_rows in [int(n) for n in rows.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            sdrf_file = write_sdrf(os.path.join(tmp, "bench.sdrf.tsv"), n_rows)
+            report("parse", n_rows, best_time(lambda: SdrfDataFrame.parse(sdrf_file), repeat))
+            df = SdrfDataFrame.parse(sdrf_file)
+
+        bench_column_rules(df, n_rows, repeat)
+        report("empty cells", n_rows, best_time(lambda: EmptyCells().evaluate(df), repeat))
+        report(
+            "validate default + mass spectrometry",
+            n_rows,
+            best_time(lambda: df.validate("default", True) + df.validate(MASS_SPECTROMETRY, True), repeat),
+        )
+        report("factor values", n_rows, best_time(df.validate_factor_values, repeat))
+        report("experimental design", n_rows, best_time(df.validate_experimental_design, repeat))
+        print()
+
+
+if __name__ == "__main__":
+    main()
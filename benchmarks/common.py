@@ -0,0 +1,73 @@
+"""
+Helpers shared by the benchmarks: synthetic SDRF files and timing.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def make_sdrf(n_rows: int, n_samples: int = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a synthetic label free SDRF with ``n_rows`` raw files. Values repeat like in real submissions: a handful of
+    organisms, instruments and modifications, one source name per sample and fractions per sample.
+    :param n_rows: number of rows (raw files)
+    :param n_samples: number of samples, default one sample per 10 rows
+    :param seed: seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    if n_samples is None:
+        n_samples = max(1, n_rows // 10)
+    sample = np.arange(n_rows) * n_samples // n_rows + 1
+    fraction = np.arange(n_rows) % max(1, n_rows // n_samples) + 1
+    disease = np.array(["normal", "colorectal cancer", "adenoma"])[sample % 3]
+    columns = [
+        ("source name", [f"Sample {s}" for s in sample]),
+        ("characteristics[organism]", ["Homo sapiens"] * n_rows),
+        ("characteristics[organism part]", rng.choice(["colon", "liver", "blood plasma"], n_rows)),
+        ("characteristics[disease]", disease),
+        ("characteristics[cell type]", ["not available"] * n_rows),
+        ("characteristics[biological replicate]", sample.astype(str)),
+        ("assay name", [f"run {i + 1}" for i in range(n_rows)]),
+        ("comment[technical replicate]", ["1"] * n_rows),
+        ("comment[fraction identifier]", fraction.astype(str)),
+        ("comment[label]", ["label free sample"] * n_rows),
+        ("comment[data file]", [f"file_{i + 1}.raw" for i in range(n_rows)]),
+        ("comment[file uri]", [f"ftp://ftp.pride.ebi.ac.uk/pride/data/file_{i + 1}.raw" for i in range(n_rows)]),
+        ("comment[instrument]", rng.choice(["NT=Q Exactive;AC=MS:1001911", "NT=LTQ Orbitrap;AC=MS:1000449"], n_rows)),
+        ("comment[cleavage agent details]", ["NT=Trypsin;AC=MS:1001251"] * n_rows),
+        ("comment[modification parameters]", ["NT=Carbamidomethyl;AC=UNIMOD:4;TA=C;MT=Fixed"] * n_rows),
+        ("comment[modification parameters]", ["NT=Oxidation;MT=Variable;TA=M;AC=UNIMOD:35"] * n_rows),
+        ("comment[precursor mass tolerance]", ["10 ppm"] * n_rows),
+        ("comment[fragment mass tolerance]", ["0.02 Da"] * n_rows),
+        ("comment[dissociation method]", ["NT=HCD;AC=PRIDE:0000590"] * n_rows),
+        ("factor value[disease]", disease),
+    ]
+    df = pd.DataFrame({i: values for i, (_, values) in enumerate(columns)})
+    df.columns = [name for name, _ in columns]
+    return df
+
+
+def write_sdrf(path, n_rows: int, **kwargs) -> str:
+    """
+    Write a synthetic SDRF (see :func:`make_sdrf`) to a TSV file, keeping duplicated column names.
+    """
+    make_sdrf(n_rows, **kwargs).to_csv(path, sep="\t", index=False)
+    return str(path)
+
+
+def best_time(func, repeat: int = 3) -> float:
+    """
+    Return the best wall time in seconds of ``repeat`` calls of ``func``.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(name: str, n_rows: int, seconds: float):
+    print(f"{name:<45} {n_rows:>9} rows {seconds * 1000:>10.1f} ms")
@@ -12,12 +12,18 @@ from xml.dom.minidom import Document
 from xml.dom.minidom import parse
 
 import numpy as np
-import pandas as pd
 
 # NOTE pkg_resources is deprecated
 import pkg_resources
 import yaml
 
+from sdrf_pipelines.sdrf.snapshot import read_sdrf
+from sdrf_pipelines.sdrf.terms import FORMULA
+from sdrf_pipelines.sdrf.terms import NAME
+from sdrf_pipelines.sdrf.terms import POSITION
+from sdrf_pipelines.sdrf.terms import TARGET
+from sdrf_pipelines.sdrf.terms import parse_term
+
 
 class Maxquant:
     def __init__(self) -> None:
@@ -140,25 +146,22 @@ class Maxquant:
                 self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
                 continue
 
-            name = re.search("NT=(.+?)(;|$)", mod).group(1)
+            term = parse_term(mod)
+            name = term[NAME]
             if "Label:" in name:
                 warning_message = name + " Label modifications is Automatically supplemented by MaxQuant"
                 self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
                 continue
 
-            if re.search("PP=(.+?)(;|$)", mod) is None:
-                pp = "anywhere"
-            else:
-                pp = re.search("PP=(.+?)(;|$)", mod).group(
-                    1
-                )  # one of [Anywhere, Protein N-term, Protein C-term, Any N-term, Any C-term
+            # one of [Anywhere, Protein N-term, Protein C-term, Any N-term, Any C-term
+            pp = term.get(POSITION, "anywhere")
             pp = pp.replace(" ", "").replace("-", "").lower()
-            if re.search("TA=(.+?)(;|$)", mod) is None:
+            if TARGET not in term:
                 warning_message = "Warning no TA= specified."
                 self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
                 aa = ["-"]
             else:
-                ta = re.search("TA=(.+?)(;|$)", mod).group(1)  # target amino-acid
+                ta = term[TARGET]  # target amino-acid
                 if ta.lower() == "c-term":
                     pp = "anycterm"
                     aa = ["-"]
@@ -167,12 +170,12 @@ class Maxquant:
                     aa = ["-"]
                 else:
                     aa = ta.split(",")  # multiply target site e.g., S,T,Y
-            if re.search("CF=(.+?)(;|$)", mod) is None:
+            if FORMULA not in term:
                 warning_message = "Warning no CF= specified.Please add manually"
                 self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
                 CF = ""
             else:
-                CF = re.search("CF=(.+?)(;|$)", mod).group(1).replace(" ", "").replace(")", ") ").rstrip()
+                CF = term[FORMULA].replace(" ", "").replace(")", ") ").rstrip()
 
             if name.lower().startswith("tmt"):
                 w = True
@@ -600,21 +603,18 @@ class Maxquant:
                 warning_message = "only UNIMOD modifications supported. skip " + m
                 self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
                 continue
-            name = re.search("NT=(.+?)(;|$)", m).group(1)
+            term = parse_term(m)
+            name = term[NAME]
 
             # workaround for missing PP in some sdrf
-            if re.search("PP=(.+?)(;|$)", m) is None:
-                pp = "anywhere"
-            else:
-                pp = re.search("PP=(.+?)(;|$)", m).group(
-                    1
-                )  # one of [Anywhere, Protein N-term,Protein C-term,Any N-term,Any C-term,not C-term,not N-term
+            # one of [Anywhere, Protein N-term,Protein C-term,Any N-term,Any C-term,not C-term,not N-term
+            pp = term.get(POSITION, "anywhere")
             pp = pp.replace(" ", "").replace("-", "").lower()
 
-            if re.search("TA=(.+?)(;|$)", m) is None:
+            if TARGET not in term:
                 aa = ["-"]
             else:
-                ta = re.search("TA=(.+?)(;|$)", m).group(1)  # target amino-acid
+                ta = term[TARGET]  # target amino-acid
                 if ta.lower() == "c-term":
                     pp = "anycterm"
                     aa = ["-"]
@@ -723,7 +723,7 @@ class Maxquant:
     ):
         print("PROCESSING: " + sdrf_file + '"')
 
-        sdrf = pd.read_csv(sdrf_file, sep="\t")
+        sdrf = read_sdrf(sdrf_file)
         sdrf = sdrf.astype(str)
         sdrf.columns = map(str.lower, sdrf.columns)  # convert column names to lower-case
 
@@ -840,7 +840,7 @@ class Maxquant:
                 if row["comment[dissociation method]"] == "not available":
                     file2diss[raw] = "HCD"
                 else:
-                    diss_method = re.search("NT=(.+?)(;|$)", row["comment[dissociation method]"]).group(1)
+                    diss_method = parse_term(row["comment[dissociation method]"])[NAME]
                     file2diss[raw] = diss_method.upper()
             else:
                 warning_message = "No dissociation method provided. Assuming HCD."
@@ -866,7 +866,7 @@ class Maxquant:
 
             e_list = []
             for e in all_enzy:
-                enzyme = re.search("NT=(.+?)(;|$)", e).group(1)
+                enzyme = parse_term(e)[NAME]
                 enzyme = enzyme.capitalize()
                 if "Trypsin/p" in enzyme:  # workaround
                     enzyme = "Trypsin/P"
@@ -888,8 +888,8 @@ class Maxquant:
             # For different quantitative experiments
             if "not available" in row["comment[label]"] or "not applicable" in row["comment[label]"]:
                 file2label[raw] = "label free sample"
-            elif re.search("NT=(.+?)(;|$)", row["comment[label]"]) is not None:
-                label = re.search("NT=(.+?)(;|$)", row["comment[label]"]).group(1)
+            elif NAME in parse_term(row["comment[label]"]):
+                label = parse_term(row["comment[label]"])[NAME]
                 file2label[raw] = label
             elif row["comment[label]"].lower() == "ibaq":
                 file2label[raw] = "iBAQ"
@@ -2519,7 +2519,7 @@ class Maxquant:
 
     # create maxquant experimental design file
     def maxquant_experiamental_design(self, sdrf_file, output):
-        sdrf = pd.read_csv(sdrf_file, sep="\t")
+        sdrf = read_sdrf(sdrf_file)
         sdrf = sdrf.astype(str)
         sdrf.columns = map(str.lower, sdrf.columns)
         f = open(output, "w")
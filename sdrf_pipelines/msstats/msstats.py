@@ -1,9 +1,27 @@
 import re
+import typing
 
+import numpy as np
 import pandas as pd
 
+from sdrf_pipelines.sdrf.snapshot import read_sdrf
+
 # example:  parse_sdrf convert-msstats -s ./testdata/PXD000288.sdrf.tsv -o ./test1.csv
 
+SAMPLE_IDENTIFIER_RE = re.compile(r"sample (\d+)$", re.IGNORECASE)
+
+
+def join_columns(sdrf: pd.DataFrame, columns: typing.List[str]) -> pd.Series:
+    """
+    Return the values of the given columns of every row joined by "_", an empty string if there are no columns.
+    """
+    if not columns:
+        return pd.Series("", index=sdrf.index, dtype=object)
+    joined = sdrf[columns[0]]
+    for column in columns[1:]:
+        joined = joined + "_" + sdrf[column]
+    return joined
+
 
 class Msstats:
     def __init__(self) -> None:
@@ -14,15 +32,31 @@ class Msstats:
     def convert_msstats_annotation(
         self, sdrf_file, split_by_columns, annotation_path, openswathtomsstats, maxqtomsstats
     ):
-        sdrf = pd.read_csv(sdrf_file, sep="\t")
+        annotation = self.annotation_table(sdrf_file, split_by_columns, openswathtomsstats, maxqtomsstats)
+        annotation.to_csv(annotation_path, index=False)
+
+    def annotation_table(
+        self,
+        sdrf_file: typing.Union[str, pd.DataFrame],
+        split_by_columns: str = None,
+        openswathtomsstats: bool = False,
+        maxqtomsstats: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Return the MSstats annotation of an SDRF, the warnings of the conversion are in :attr:`warnings`.
+        :param sdrf_file: SDRF file, snapshot or dataframe
+        :param split_by_columns: columns of the conditions, e.g. "[factor value[phenotype]]", the factors by default
+        :param openswathtomsstats: add the Filename column of OpenSWATH
+        :param maxqtomsstats: add the Experiment column of MaxQuant
+        """
+        self.warnings = {}
+        sdrf = read_sdrf(sdrf_file)
         sdrf = sdrf.astype(str)
         sdrf.columns = map(str.lower, sdrf.columns)  # convert column names to lower-case
         data = {}
-        condition = []
-        Experiments = []
-        runs = sdrf["comment[data file]"].tolist()
+        runs = sdrf["comment[data file]"].to_numpy(dtype=object)
         data["Run"] = runs
-        data["IsotopeLabelType"] = ["L"] * len(runs)
+        data["IsotopeLabelType"] = np.full(len(runs), "L", dtype=object)
 
         # convert list passed on command line '[assay name,comment[fraction identifier]]' to python list
         if split_by_columns:
@@ -35,57 +69,28 @@ class Msstats:
         if not split_by_columns:
             # get factor columns (except constant ones)
             factor_cols = [c for ind, c in enumerate(sdrf) if c.startswith("factor value[")]
+            condition = self.combine_factors_to_conditions(factor_cols, sdrf)
         else:
-            factor_cols = split_by_columns
-        for _, row in sdrf.iterrows():
-            if not split_by_columns:
-                combined_factors = self.combine_factors_to_conditions(factor_cols, row)
-            else:
-                # take only only entries of splitting columns to generate the conditions
-                combined_factors = "_".join(list(row[split_by_columns]))
-            condition.append(combined_factors)
-        data["Condition"] = condition
-
-        sample_identifier_re = re.compile(r"sample (\d+)$", re.IGNORECASE)
-        # get BioReplicate
-        BioReplicate = []
-        sample_id_map = {}
-        sample_id = 1
-        value = []
-
-        for _, row in sdrf.iterrows():
-            source_name = row["source name"]
-
-            if re.search(sample_identifier_re, source_name) is not None:
-                sample = re.search(sample_identifier_re, source_name).group(1)
-
-                # MSstats BioReplicate column needs to be different for samples from different conditions.
-                # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
-                MSstatsBioReplicate = sample
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-            else:
-                warning_message = "No sample number identifier"
-                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-
-                # Solve non-sample id expression models
-                if source_name in sample_id_map.keys():
-                    sample = sample_id_map[source_name]
-                else:
-                    sample_id_map[source_name] = sample_id
-                    sample = sample_id
-                    sample_id += 1
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-                MSstatsBioReplicate = str(BioReplicate.index(sample) + 1)
-            value.append(MSstatsBioReplicate)
-
-            if "comment[technical replicate]" in sdrf.columns:
-                Experiments.append(row["source name"] + "_" + str(row["comment[technical replicate]"]))
-            else:
-                Experiments.append(row["source name"] + "_" + "1")
-
-        data["BioReplicate"] = value
+            # take only only entries of splitting columns to generate the conditions
+            condition = join_columns(sdrf, split_by_columns)
+        data["Condition"] = condition.to_numpy(dtype=object)
+
+        # MSstats BioReplicate column needs to be different for samples from different conditions.
+        # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
+        source_names = sdrf["source name"]
+        samples = source_names.str.extract(SAMPLE_IDENTIFIER_RE, expand=False)
+        no_sample = samples.isna()
+        n_no_sample = int(no_sample.sum())
+        if n_no_sample:
+            warning_message = "No sample number identifier"
+            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + n_no_sample
+
+            # Solve non-sample id expression models: the samples are numbered in the order they appear, together
+            # with the sample identifiers
+            keys = ("sample " + samples).where(~no_sample, "source " + source_names)
+            codes, _ = pd.factorize(keys.to_numpy(dtype=object))
+            samples = samples.where(~no_sample, pd.Series(codes + 1, index=samples.index).astype(str))
+        data["BioReplicate"] = samples.to_numpy(dtype=object)
 
         # for OpenSWATH
         if openswathtomsstats:
@@ -93,14 +98,23 @@ class Msstats:
 
         # for MaxQuant
         if maxqtomsstats:
-            data["Experiment"] = Experiments
-        pd.DataFrame(data).to_csv(annotation_path, index=False)
-
-    def combine_factors_to_conditions(self, factor_cols, row):
-        all_factors = list(row[factor_cols])
-        combined_factors = "_".join(all_factors)
-        if combined_factors == "":
+            if "comment[technical replicate]" in sdrf.columns:
+                experiments = source_names + "_" + sdrf["comment[technical replicate]"]
+            else:
+                experiments = source_names + "_" + "1"
+            data["Experiment"] = experiments.to_numpy(dtype=object)
+        return pd.DataFrame(data)
+
+    def combine_factors_to_conditions(self, factor_cols: typing.List[str], sdrf: pd.DataFrame) -> pd.Series:
+        """
+        Return the condition of every row, the factor values joined by "_", or the source name of the rows without
+        factor values.
+        """
+        combined_factors = join_columns(sdrf, factor_cols)
+        no_factors = combined_factors == ""
+        n_no_factors = int(no_factors.sum())
+        if n_no_factors:
             warning_message = "No factors specified. Adding Source Name as factor. Will be used as condition. "
-            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-            combined_factors = row["source name"]
+            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + n_no_factors
+            combined_factors = combined_factors.where(~no_factors, sdrf["source name"])
         return combined_factors
@@ -3,9 +3,14 @@
 
 import csv
 import re
+import typing
 
 import pandas as pd
 
+from sdrf_pipelines.msstats.msstats import SAMPLE_IDENTIFIER_RE
+from sdrf_pipelines.msstats.msstats import join_columns
+from sdrf_pipelines.sdrf.snapshot import read_sdrf
+
 # Based on msstats class
 
 # example:  parse_sdrf convert-normalyzerde -s ./testdata/PXD000288.sdrf.tsv -o ./normalyzer_design.tsv
@@ -20,19 +25,34 @@ class NormalyzerDE:
     def convert_normalyzerde_design(
         self, sdrf_file, split_by_columns, annotation_path, comparisons_path, maxquant_exp_design_file
     ):
-        sdrf = pd.read_csv(sdrf_file, sep="\t")
+        design = self.design_table(sdrf_file, split_by_columns, maxquant_exp_design_file)
+        design.to_csv(annotation_path, index=False, sep="\t")
+
+        # Write out comparisons toward first factor
+        if comparisons_path != "":
+            with open(comparisons_path, "w") as target:
+                writer = csv.writer(target, delimiter=",")
+                writer.writerow(self.get_comparisons(design))
+
+    def design_table(
+        self,
+        sdrf_file: typing.Union[str, pd.DataFrame],
+        split_by_columns: str = None,
+        maxquant_exp_design_file: str = "",
+    ) -> pd.DataFrame:
+        """
+        Return the NormalyzerDE design of an SDRF, the warnings of the conversion are in :attr:`warnings`.
+        :param sdrf_file: SDRF file, snapshot or dataframe
+        :param split_by_columns: columns of the conditions, e.g. "[factor value[phenotype]]", the factors by default
+        :param maxquant_exp_design_file: MaxQuant experimental design file, to map the assays to the MaxQuant samples
+        """
+        self.warnings = {}
+        sdrf = read_sdrf(sdrf_file)
         sdrf = sdrf.astype(str)
         sdrf.columns = map(str.lower, sdrf.columns)  # convert column names to lower-case
         data = {}
-        condition = []
-        runs = sdrf["comment[data file]"].tolist()
-        source_names = sdrf["source name"].tolist()
-
-        assays = []
-
-        for raw in runs:
-            new_assay = raw.replace(".raw", "")
-            assays.append(new_assay)
+        runs = sdrf["comment[data file]"]
+        assays = runs.str.replace(".raw", "", regex=False)
 
         # convert list passed on command line '[assay name,comment[fraction identifier]]' to python list
         if split_by_columns:
@@ -45,111 +65,85 @@ class NormalyzerDE:
         if not split_by_columns:
             # get factor columns (except constant ones)
             factor_cols = [c for ind, c in enumerate(sdrf) if c.startswith("factor value[")]
+            condition = self.combine_factors_to_conditions(factor_cols, sdrf)
         else:
-            factor_cols = split_by_columns
-        for _, row in sdrf.iterrows():
-            if not split_by_columns:
-                combined_factors = self.combine_factors_to_conditions(factor_cols, row)
-            else:
-                # take only only entries of splitting columns to generate the conditions
-                combined_factors = "_".join(list(row[split_by_columns]))
-            condition.append(combined_factors)
-
-        group = []
+            # take only only entries of splitting columns to generate the conditions
+            condition = join_columns(sdrf, split_by_columns)
+
         # Shorten down condition to QY only if present. Also replace '-' with '_' as reserved for comparisons.
-        for con in condition:
-            con = con.replace("-", "_")
-            if re.search("QY=.*", con) != None:
-                match = re.search("QY=(.*)", con)
-                groupnew = match[1]
-                if groupnew.index(";") > 0:
-                    groupnew = groupnew[: groupnew.index(";")]
-                group.append(groupnew.replace(" ", "."))
-            else:
-                group.append(con.replace(" ", "."))
-
-        sample_identifier_re = re.compile(r"sample (\d+)$", re.IGNORECASE)
-        # get BioReplicate
-        sample_id_map = {}
-        sample_id = 1
-
-        replicates = self.get_replicates(sdrf, sample_identifier_re, sample_id_map, sample_id)
+        condition = condition.str.replace("-", "_", regex=False)
+        quantities = condition.str.extract("QY=(.*)", expand=False)
+        with_quantity = quantities.notna()
+        unterminated = with_quantity & ~quantities.str.contains(";", regex=False, na=True)
+        if unterminated.any():
+            raise ValueError(f"The quantity (QY=) of the condition {condition[unterminated].iloc[0]!r} has no ';'")
+        # the quantity ends at the first ';', unless the value starts with it
+        quantity = quantities.str.split(";", n=1).str[0]
+        group = condition.where(~with_quantity, quantity.where(quantity != "", quantities))
+        group = group.str.replace(" ", ".", regex=False)
+
+        replicates = self.get_replicates(sdrf, SAMPLE_IDENTIFIER_RE)
 
         # For MaxQuant mapping
         if maxquant_exp_design_file != "":
             mq_design = pd.read_csv(maxquant_exp_design_file, sep="\t")
-            mq_assays = mq_design["Name"].tolist()
-            mq_experiments = mq_design["Experiment"].tolist()
-            new_samples = []
-            for assay in assays:
-                new_sample = mq_experiments[mq_assays.index(assay)].replace(" ", ".")
-                new_samples.append(new_sample.replace("-", "."))
-            data["sample"] = new_samples
+            # the sample of an assay is the experiment of its first row in the MaxQuant design
+            mq_design = mq_design.drop_duplicates("Name")
+            mq_samples = dict(zip(mq_design["Name"], mq_design["Experiment"]))
+            missing = ~assays.isin(mq_design["Name"])
+            if missing.any():
+                raise ValueError(f"{assays[missing].iloc[0]!r} is not in the MaxQuant experimental design")
+            samples = assays.map(mq_samples)
+            data["sample"] = samples.str.replace(" ", ".", regex=False).str.replace("-", ".", regex=False)
         else:
             data["sample"] = assays
 
         data["Run"] = runs
         data["Assay"] = assays
-        data["source_name"] = source_names
+        data["source_name"] = sdrf["source name"]
         data["technical_replicate"] = replicates
         data["group"] = group
-        pd.DataFrame(data).to_csv(annotation_path, index=False, sep="\t")
-
-        # Write out comparisons toward first factor
-        if comparisons_path != "":
-            comparisons = []
-            uniquefactors = sorted(set(group))
-            firstfactor = group[0]
-            for factor in uniquefactors:
-                if factor != firstfactor:
-                    comparisons.append(factor + "-" + firstfactor)
-            with open(comparisons_path, "w") as target:
-                writer = csv.writer(target, delimiter=",")
-                writer.writerow(comparisons)
-
-    def get_replicates(self, sdrf, sample_identifier_re="comment[organism]", sample_id_map=None, sample_id=1):
-        replicates = []
-        value = []
-        BioReplicate = []
-        for _, row in sdrf.iterrows():
-            source_name = row["source name"]
-
-            if re.search(sample_identifier_re, source_name) is not None:
-                sample = re.search(sample_identifier_re, source_name).group(1)
-                # Bioreplicate not used for NormalyzerDE
-                # BioReplicate column needs to be different for samples from different conditions.
-                # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
-                MSstatsBioReplicate = sample
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-            else:
-                warning_message = "No sample number identifier"
-                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-
-                # Solve non-sample id expression models
-                if source_name in sample_id_map.keys():
-                    sample = sample_id_map[source_name]
-                else:
-                    sample_id_map[source_name] = sample_id
-                    sample = sample_id
-                    sample_id += 1
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-                MSstatsBioReplicate = str(BioReplicate.index(sample) + 1)
-            value.append(MSstatsBioReplicate)
-
-            if "comment[technical replicate]" in sdrf.columns:
-                replicates.append(str(row["comment[technical replicate]"]))
-            else:
-                replicates.append("1")
-
-        return replicates
-
-    def combine_factors_to_conditions(self, factor_cols, row):
-        all_factors = list(row[factor_cols])
-        combined_factors = "_".join(all_factors)
-        if combined_factors == "":
+        return pd.DataFrame({name: column.to_numpy(dtype=object) for name, column in data.items()})
+
+    def get_comparisons(self, design: pd.DataFrame) -> typing.List[str]:
+        """
+        Return the comparisons of every group of a design with the group of its first row.
+        """
+        group = design["group"].tolist()
+        comparisons = []
+        uniquefactors = sorted(set(group))
+        firstfactor = group[0]
+        for factor in uniquefactors:
+            if factor != firstfactor:
+                comparisons.append(factor + "-" + firstfactor)
+        return comparisons
+
+    def get_replicates(self, sdrf: pd.DataFrame, sample_identifier_re: re.Pattern = SAMPLE_IDENTIFIER_RE) -> pd.Series:
+        """
+        Return the technical replicate of every row, 1 if the SDRF has no technical replicate column. The rows whose
+        source name has no sample number are counted in the warnings.
+        """
+        # Bioreplicate not used for NormalyzerDE
+        no_sample = sdrf["source name"].str.extract(sample_identifier_re, expand=False).isna()
+        n_no_sample = int(no_sample.sum())
+        if n_no_sample:
+            warning_message = "No sample number identifier"
+            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + n_no_sample
+
+        if "comment[technical replicate]" in sdrf.columns:
+            return sdrf["comment[technical replicate]"]
+        return pd.Series("1", index=sdrf.index, dtype=object)
+
+    def combine_factors_to_conditions(self, factor_cols: typing.List[str], sdrf: pd.DataFrame) -> pd.Series:
+        """
+        Return the condition of every row, the factor values joined by "_", or the source name of the rows without
+        factor values.
+        """
+        combined_factors = join_columns(sdrf, factor_cols)
+        no_factors = combined_factors == ""
+        n_no_factors = int(no_factors.sum())
+        if n_no_factors:
             warning_message = "No factors specified. Adding Source Name as factor. Will be used " "as condition. "
-            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-            combined_factors = row["source name"]
+            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + n_no_factors
+            combined_factors = combined_factors.where(~no_factors, sdrf["source name"])
         return combined_factors
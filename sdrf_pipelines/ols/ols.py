@@ -14,14 +14,21 @@ TODO: handle requests.exceptions.ConnectionError when traffic is too high and AP
 import glob
 import logging
 import os.path
+import typing
 import urllib.parse
 
-import duckdb
 import pandas as pd
 import pkg_resources
+import pyarrow as pa
 import rdflib
 import requests
 
+from sdrf_pipelines.ols.ontology_index import INDEX_SUFFIX
+from sdrf_pipelines.ols.ontology_index import index_ontologies
+from sdrf_pipelines.ols.ontology_index import load_index
+from sdrf_pipelines.ols.ontology_index import to_index_table
+from sdrf_pipelines.ols.ontology_index import write_index
+
 OLS = "https://www.ebi.ac.uk/ols4"
 
 __all__ = ["OlsClient"]
@@ -67,25 +74,26 @@ class OlsTerm:
         return f"{self._term} -- {self._ontology} -- {self._iri}"
 
 
-def get_cache_parquet_files():
+def find_cache_parquet_files():
     """
-    This function returns a list of parquet files in the cache directory.
+    This function returns the pattern and the list of parquet files in the cache directory.
     """
     parquet_files_pattern = pkg_resources.resource_filename(__name__, "*.parquet")
-    parquet_files = glob.glob(parquet_files_pattern)
+    return parquet_files_pattern, sorted(glob.glob(parquet_files_pattern))
+
+
+def get_cache_parquet_files():
+    """
+    This function returns a list of parquet files in the cache directory and the ontologies found in them.
+    """
+    parquet_files_pattern, parquet_files = find_cache_parquet_files()
 
     if not parquet_files:
         logger.info("No parquet files found in %s", parquet_files_pattern)
         return parquet_files_pattern, []
 
-    # select from all the parquets the ontology names and return a list of the unique ones
-    # use for reading all the parquets the duckdb library.
-    df = duckdb.execute("""SELECT DISTINCT ontology FROM read_parquet(?)""", (parquet_files,)).fetchdf()
-
-    if df is None or df.empty:
-        return parquet_files, []
-
-    ontologies = df.ontology.unique().tolist()
+    # the ontologies are read from the dictionaries of the memory-mapped indexes, without scanning the terms
+    ontologies = index_ontologies(load_index(parquet_file) for parquet_file in parquet_files)
     return parquet_files, ontologies
 
 
@@ -165,6 +173,13 @@ def read_obo_file(ontology_file, ontology_name=None):
     return terms_info
 
 
+def _cache_term(term: dict) -> dict:
+    """
+    Return a term of the cache indexes in the format of the results of the cache searches.
+    """
+    return {"ontology_name": term["ontology"], "label": term["label"], "obo_id": term["accession"]}
+
+
 class OlsClient:
     def __init__(self, ols_base=None, ontology=None, field_list=None, query_fields=None, use_cache=True):
         """
@@ -189,12 +204,14 @@ class OlsClient:
 
         if use_cache:
             self.use_cache = use_cache
-            parquet_ontologies, ontologies = get_cache_parquet_files()
-            if len(parquet_ontologies) == 0:
+            _, parquet_files = find_cache_parquet_files()
+            if len(parquet_files) == 0:
                 self.use_cache = False
             else:
-                self.parquet_files = parquet_ontologies
-                self.ontologies = ontologies
+                self.parquet_files = parquet_files
+                # memory-mapped, the processes of one host share the pages of the indexes, see OntologyIndex
+                self.indexes = [load_index(parquet_file) for parquet_file in parquet_files]
+                self.ontologies = index_ontologies(self.indexes)
         else:
             self.use_cache = False
 
@@ -205,7 +222,8 @@ class OlsClient:
         - the accession of the term in the form of ONTOLOGY:NUMBER (e.g. GO:0000001) the name of the term and the number.
         - The name of the term.
         - The ontology in which the term is found (e.g. GO).
-        All information should be in lower case and also the file will be compressed.
+        All information should be in lower case and also the file will be compressed. The memory-mapped index of the
+        terms (an uncompressed Arrow IPC file, sorted by label) is written next to it with the .arrow extension.
         @:param ontology_file: The name of the ontology
         @:param output_file: The name of the output file
         @:param ontology_name: The name of the ontology
@@ -254,7 +272,11 @@ class OlsClient:
         logger.info("Terms found in %s: %s", ontology_file, len(df))
 
         df.to_parquet(output_file, compression="gzip", index=False)
-        logger.info("Index has finished, output file: %s", output_file)
+        index_file = write_index(
+            to_index_table(pa.Table.from_pandas(df, preserve_index=False)),
+            os.path.splitext(output_file)[0] + INDEX_SUFFIX,
+        )
+        logger.info("Index has finished, output files: %s, %s", output_file, index_file)
 
     def besthit(self, name, **kwargs):
         """
@@ -427,34 +449,39 @@ class OlsClient:
         if not is_cached and not full_search:
             return []
 
-        if ontology is not None:
-            # Query for case-insensitive search and ensure all fields are cast to string
-            duckdb_conn = duckdb.execute(
-                """SELECT CAST(accession AS VARCHAR) AS accession, 
-                          CAST(label AS VARCHAR) AS label, 
-                          CAST(ontology AS VARCHAR) AS ontology 
-                   FROM read_parquet(?) 
-                   WHERE lower(CAST(label AS VARCHAR)) = lower(?) 
-                     AND lower(CAST(ontology AS VARCHAR)) = lower(?)""",
-                (self.parquet_files, term, ontology),
-            )
-        else:
-            # Query for case-insensitive search without ontology
-            duckdb_conn = duckdb.execute(
-                """SELECT CAST(accession AS VARCHAR) AS accession, 
-                          CAST(label AS VARCHAR) AS label, 
-                          CAST(ontology AS VARCHAR) AS ontology 
-                   FROM read_parquet(?) 
-                   WHERE lower(CAST(label AS VARCHAR)) = lower(?)""",
-                (self.parquet_files, term),
-            )
-        df = duckdb_conn.fetchdf()
-
-        if df is None or df.empty:
-            return []
-
         terms = []
-        for _, row in df.iterrows():
-            terms.append({"ontology_name": row.ontology, "label": row.label, "obo_id": row.accession})
+        for index in self.indexes:
+            terms.extend(_cache_term(found) for found in index.search(term, ontology))
 
         return terms
+
+    def cache_search_many(self, terms: typing.Iterable[str], ontology: str = None, full_search: bool = False) -> dict:
+        """
+        Search many terms in the cache files, the terms are sorted and searched together in every index.
+        @param terms: The names of the terms
+        @param ontology: The name of the ontology
+        @return: dictionary term name -> list of terms, like the results of cache_search
+        """
+        terms = list(dict.fromkeys(terms))
+        results = {term: [] for term in terms}
+        is_cached = ontology is not None and ontology.lower() in self.ontologies
+        if not is_cached and not full_search:
+            return results
+
+        for index in self.indexes:
+            for term, found in index.search_many(terms, ontology).items():
+                results[term].extend(_cache_term(found_term) for found_term in found)
+        return results
+
+    def cache_prefix_search(self, prefix: str, ontology: str = None, limit: int = 10) -> list:
+        """
+        Search the terms whose name starts with a prefix in the cache files, e.g. to complete the names of terms.
+        @param prefix: The start of the names of the terms
+        @param ontology: The name of the ontology, all the ontologies of the cache if None
+        @param limit: The maximum number of terms returned
+        """
+        terms = []
+        for index in self.indexes:
+            terms.extend(_cache_term(found) for found in index.search_prefix(prefix, ontology, limit))
+        terms.sort(key=lambda term: term["label"])
+        return terms[:limit] if limit is not None else terms
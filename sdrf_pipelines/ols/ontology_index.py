@@ -0,0 +1,361 @@
+"""
+Memory-mapped indexes of the ontologies of the local cache.
+
+The ontologies bundled with sdrf-pipelines are gzip-compressed parquet files (accession, label, ontology), every scan of
+them decompresses the whole file in the process doing it. The index of an ontology is the same table in an uncompressed
+Arrow IPC file, memory-mapped when it is read, so the processes validating SDRF files on one host share the pages of
+the operating system cache instead of each inflating its own copy of the terms.
+
+The labels of the index are normalized (lowercase, runs of whitespace collapsed to one space) and the rows are sorted
+by ontology and label, with the offsets of every ontology in the schema metadata. A lookup is a binary search in the
+rows of the ontology: a NumPy search in the first bytes of the labels (a fixed-width column, read without a copy)
+narrows the range down to the labels with the same first bytes, which are then compared. The searches return the
+original label, kept in the index when the normalization changes it. Batches of labels are searched at once, sorted,
+and the labels starting with a prefix are a range of the index.
+
+``build-index-ontology`` writes the index next to the parquet file. The indexes of the bundled parquet files are
+written once, at the first use, in the cache folder ($SDRF_PIPELINES_CACHE/ontologies), one file per parquet file named
+after its path. The size and modification time of the parquet file are stored in the index, a parquet file that changed
+is indexed again and its index replaced.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import typing
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from sdrf_pipelines.utils.cache import get_cache_home
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".arrow"
+# Version of the layout of the index, stored in its metadata
+INDEX_VERSION = 2
+VERSION_KEY = b"sdrf-pipelines.index"
+SOURCE_KEY = b"sdrf-pipelines.source"
+OFFSETS_KEY = b"sdrf-pipelines.offsets"
+INDEX_COLUMNS = ["label", "prefix", "accession", "ontology", "original_label"]
+# Number of leading bytes of the labels searched with NumPy
+PREFIX_BYTES = 8
+# The same whitespace for the labels of the index (RE2) and the searched labels (re)
+WHITESPACE = r"[ \t\n\r\f\v]+"
+_whitespace = re.compile(WHITESPACE)
+# Greater than any character, the labels starting with a prefix are lower than the prefix followed by it
+_LAST_CHARACTER = "\U0010ffff"
+
+
+def get_cache_dir() -> str:
+    """
+    Folder of the indexes of the bundled ontologies, $SDRF_PIPELINES_CACHE or the user cache folder.
+    """
+    return os.path.join(get_cache_home(), "ontologies")
+
+
+def source_stamp(path: str) -> bytes:
+    """
+    Return the size and modification time of a file, the parquet file of an index is indexed again when they change.
+    """
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}".encode()
+
+
+def normalize_label(label: str) -> str:
+    """
+    Return the label as it is in the indexes: lowercase, with the runs of whitespace collapsed to one space.
+    """
+    return _whitespace.sub(" ", label.lower()).strip(" ")
+
+
+def _string_buffers(array: pa.Array) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the offsets and the UTF-8 bytes of a string array, without a copy.
+    """
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)[array.offset : array.offset + len(array) + 1]
+    data = array.buffers()[2]
+    return offsets, np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+
+
+def _prefixes(label: pa.Array) -> pa.Array:
+    """
+    Return the first bytes of the labels, padded with zeros, as a fixed-width binary array.
+    """
+    offsets, data = _string_buffers(label)
+    prefixes = np.zeros((len(label), PREFIX_BYTES), dtype=np.uint8)
+    for k in range(PREFIX_BYTES):
+        position = offsets[:-1] + k
+        inside = position < offsets[1:]
+        prefixes[inside, k] = data[position[inside]]
+    return pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(PREFIX_BYTES), len(label), [None, pa.py_buffer(prefixes.tobytes())]
+    )
+
+
+def to_index_table(table: pa.Table) -> pa.Table:
+    """
+    Return the index of a table of terms (accession, label, ontology): the terms sorted by ontology and normalized
+    label, without the terms missing a label or an accession, and the offsets of every ontology in the schema metadata.
+    """
+    table = table.select(["accession", "label", "ontology"]).cast(
+        pa.schema([("accession", pa.string()), ("label", pa.string()), ("ontology", pa.string())])
+    )
+    table = table.filter(pc.and_(pc.is_valid(table["label"]), pc.is_valid(table["accession"])))
+    original = pc.utf8_lower(table["label"])
+    label = pc.utf8_trim(pc.replace_substring_regex(original, WHITESPACE, " "), " ")
+    table = pa.table(
+        {
+            "label": label,
+            "accession": table["accession"],
+            "ontology": pc.utf8_lower(table["ontology"]),
+            "original_label": pc.if_else(pc.equal(original, label), pa.scalar(None, pa.string()), original),
+        }
+    )
+    # the sort is stable, the terms with the same label keep the order of the ontology file
+    table = table.sort_by([("ontology", "ascending"), ("label", "ascending")])
+    columns = {name: table[name].combine_chunks() for name in table.column_names}
+
+    offsets = {}
+    for position, ontology in enumerate(columns["ontology"].to_pylist()):
+        offsets.setdefault(ontology, [position, position])[1] = position + 1
+    arrays = [
+        columns["label"],
+        _prefixes(columns["label"]),
+        columns["accession"],
+        columns["ontology"].dictionary_encode(),
+        columns["original_label"],
+    ]
+    metadata = {VERSION_KEY: str(INDEX_VERSION).encode(), OFFSETS_KEY: json.dumps(offsets).encode()}
+    schema = pa.schema([pa.field(name, array.type) for name, array in zip(INDEX_COLUMNS, arrays)], metadata=metadata)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_index(table: pa.Table, index_file: str) -> str:
+    """
+    Write an index (see :func:`to_index_table`) to an uncompressed Arrow IPC file. The file is replaced atomically, the
+    processes reading the previous file keep their mapping of it.
+    """
+    directory = os.path.dirname(os.path.abspath(index_file))
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as fh:
+        try:
+            with pa.ipc.new_file(fh, table.schema) as writer:
+                writer.write_table(table)
+        except Exception:
+            os.unlink(fh.name)
+            raise
+    os.replace(fh.name, index_file)
+    return index_file
+
+
+def read_index(index_file: str) -> pa.Table:
+    """
+    Read an index, memory-mapped.
+    """
+    with pa.memory_map(index_file, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _is_current_index(index_file: str, stamp: bytes = None) -> bool:
+    try:
+        with pa.memory_map(index_file, "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return metadata.get(VERSION_KEY) == str(INDEX_VERSION).encode() and (
+        stamp is None or metadata.get(SOURCE_KEY) == stamp
+    )
+
+
+def _remove_legacy_indexes(name: str):
+    # indexes named after the digest of the parquet file by the previous versions
+    legacy = re.compile(re.escape(name) + r"-[0-9a-f]{16}-v\d+" + re.escape(INDEX_SUFFIX))
+    try:
+        for file_name in os.listdir(get_cache_dir()):
+            if legacy.fullmatch(file_name):
+                os.unlink(os.path.join(get_cache_dir(), file_name))
+    except OSError as ex:
+        logger.debug("The previous indexes of %s could not be removed: %s", name, ex)
+
+
+def get_index_file(parquet_file: str) -> typing.Optional[str]:
+    """
+    Return the index of a parquet file of terms, the index next to it if it is up to date, otherwise the index in the
+    cache folder, written if it does not exist yet. None if the index cannot be written.
+    """
+    sibling = os.path.splitext(parquet_file)[0] + INDEX_SUFFIX
+    if (
+        os.path.isfile(sibling)
+        and os.path.getmtime(sibling) >= os.path.getmtime(parquet_file)
+        and _is_current_index(sibling)
+    ):
+        return sibling
+
+    name = os.path.splitext(os.path.basename(parquet_file))[0]
+    location = hashlib.sha256(os.path.abspath(parquet_file).encode()).hexdigest()[:16]
+    index_file = os.path.join(get_cache_dir(), f"{name}-{location}{INDEX_SUFFIX}")
+    stamp = source_stamp(parquet_file)
+    if not _is_current_index(index_file, stamp):
+        try:
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            table = to_index_table(pq.read_table(parquet_file))
+            write_index(table.replace_schema_metadata({**table.schema.metadata, SOURCE_KEY: stamp}), index_file)
+            logger.info("Index of %s written to %s", parquet_file, index_file)
+        except OSError as ex:
+            logger.debug("The index of %s could not be written in %s: %s", parquet_file, index_file, ex)
+            return None
+        _remove_legacy_indexes(name)
+    return index_file
+
+
+def load_index(parquet_file: str) -> "OntologyIndex":
+    """
+    Return the index of a parquet file of terms, memory-mapped, or built in memory if it cannot be written.
+    """
+    index_file = get_index_file(parquet_file)
+    if index_file is None:
+        return OntologyIndex(to_index_table(pq.read_table(parquet_file)))
+    return OntologyIndex(read_index(index_file))
+
+
+def index_ontologies(indexes: typing.Iterable["OntologyIndex"]) -> typing.List[str]:
+    """
+    Return the ontologies of the indexes.
+    """
+    ontologies = set()
+    for index in indexes:
+        ontologies.update(index.ontologies)
+    return sorted(ontologies)
+
+
+class OntologyIndex:
+    """
+    Searches in an index of ontology terms (see :func:`to_index_table`). The labels are compared as UTF-8 bytes, in
+    the order of the sort of the index.
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table.combine_chunks() if any(column.num_chunks != 1 for column in table.columns) else table
+        self.offsets = {
+            ontology: tuple(bounds) for ontology, bounds in json.loads(table.schema.metadata[OFFSETS_KEY]).items()
+        }
+        label = self.table["label"].combine_chunks()
+        self._label_offsets, self._label_data = _string_buffers(label)
+        prefix = self.table["prefix"].combine_chunks()
+        if len(prefix):
+            self._prefixes = np.frombuffer(prefix.buffers()[1], dtype=f"S{PREFIX_BYTES}")[
+                prefix.offset : prefix.offset + len(prefix)
+            ]
+        else:
+            self._prefixes = np.zeros(0, dtype=f"S{PREFIX_BYTES}")
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def ontologies(self) -> typing.List[str]:
+        return list(self.offsets)
+
+    def _ranges(self, ontology: str = None) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Return the rows of an ontology, of every ontology if it is None.
+        """
+        if ontology is None:
+            return list(self.offsets.values())
+        bounds = self.offsets.get(ontology.lower())
+        return [bounds] if bounds is not None else []
+
+    def _label(self, position: int) -> bytes:
+        return self._label_data[self._label_offsets[position] : self._label_offsets[position + 1]].tobytes()
+
+    def _bisect(self, key: bytes, low: int, high: int, right: bool = False) -> int:
+        """
+        Return the first row in [low, high) whose label is greater than (right) or greater or equal to the key.
+        """
+        while low < high:
+            middle = (low + high) // 2
+            label = self._label(middle)
+            if label < key or (right and label == key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _bounds(self, keys: typing.List[bytes], start: int, end: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Return, for every key, the first row in [start, end) whose label is greater or equal to the key and the first
+        one whose label is greater than it. The first bytes of the keys are searched at once with NumPy, the labels
+        with the same first bytes as a key are then compared with it.
+        """
+        prefixes = np.array([key[:PREFIX_BYTES] for key in keys], dtype=f"S{PREFIX_BYTES}")
+        low = start + np.searchsorted(self._prefixes[start:end], prefixes, side="left")
+        high = start + np.searchsorted(self._prefixes[start:end], prefixes, side="right")
+        lower = np.empty(len(keys), dtype=np.intp)
+        upper = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            lower[i] = self._bisect(key, int(low[i]), int(high[i]))
+            upper[i] = self._bisect(key, int(lower[i]), int(high[i]), right=True)
+        return lower, upper
+
+    def terms(self, rows: typing.Iterable[int]) -> typing.List[dict]:
+        """
+        Return the terms of rows of the index: the accession, the original label and the ontology.
+        """
+        rows = self.table.take(pa.array(list(rows), type=pa.int64())).to_pylist()
+        return [
+            {
+                "accession": row["accession"],
+                "label": row["original_label"] if row["original_label"] is not None else row["label"],
+                "ontology": row["ontology"],
+            }
+            for row in rows
+        ]
+
+    def search(self, label: str, ontology: str = None) -> typing.List[dict]:
+        """
+        Return the terms with a label (normalized like the labels of the index), optionally from one ontology.
+        """
+        return self.search_many([label], ontology)[label]
+
+    def search_many(self, labels: typing.Iterable[str], ontology: str = None) -> typing.Dict[str, typing.List[dict]]:
+        """
+        Return the terms of many labels, the labels are sorted and searched together in every ontology.
+        :param labels: labels to search
+        :param ontology: the ontology of the terms, every ontology of the index if None
+        :return: dictionary label -> terms, with every label
+        """
+        labels = list(dict.fromkeys(labels))
+        keys = sorted({normalize_label(label).encode() for label in labels})
+        rows = {key: [] for key in keys}
+        for start, end in self._ranges(ontology):
+            if not keys or start == end:
+                continue
+            lower, upper = self._bounds(keys, start, end)
+            for key, first, last in zip(keys, lower, upper):
+                rows[key].extend(range(first, last))
+        found = {key: self.terms(positions) for key, positions in rows.items() if positions}
+        return {label: found.get(normalize_label(label).encode(), []) for label in labels}
+
+    def search_prefix(self, prefix: str, ontology: str = None, limit: int = None) -> typing.List[dict]:
+        """
+        Return the terms whose label starts with a prefix (normalized like the labels of the index), sorted by label.
+        :param prefix: start of the labels
+        :param ontology: the ontology of the terms, every ontology of the index if None
+        :param limit: maximum number of terms returned per ontology
+        """
+        key = normalize_label(prefix).encode()
+        last = (normalize_label(prefix) + _LAST_CHARACTER).encode()
+        rows = []
+        for start, end in self._ranges(ontology):
+            lower, _ = self._bounds([key], start, end)
+            upper, _ = self._bounds([last], start, end)
+            first, stop = int(lower[0]), int(upper[0])
+            if limit is not None:
+                stop = min(stop, first + limit)
+            rows.extend(range(first, stop))
+        return self.terms(rows)
@@ -0,0 +1,128 @@
+"""
+Conversion of a batch of SDRF files to OpenMS.
+
+The converter (:class:`~sdrf_pipelines.openms.openms.OpenMS`, with the Unimod database, the enzymes and the labels) is
+created once in the parent process and the worker processes are forked from it, so they start with the converter ready.
+Where processes cannot be forked, every worker creates its converter once. Every SDRF is converted in memory and its
+files are written to a directory of its own. The result of the batch is a summary with one row per file.
+"""
+
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from sdrf_pipelines.openms.openms import OpenMS
+from sdrf_pipelines.openms.openms import write_tables
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLUMNS = ["file", "output", "status", "warnings", "seconds", "message"]
+CONVERTED = "converted"
+FAILED = "failed"
+SDRF_EXTENSIONS = (".sdrf.arrow", ".sdrf.tsv", ".tsv", ".sdrf")
+
+_converter = None
+
+
+def get_converter() -> OpenMS:
+    """
+    Return the converter of the process, created once.
+    """
+    global _converter
+    if _converter is None:
+        _converter = OpenMS()
+    return _converter
+
+
+def get_output_directories(sdrf_files: typing.List[str], output_directory: str) -> typing.List[str]:
+    """
+    Return the output directory of every SDRF file, named after the file (PXD000001.sdrf.tsv -> PXD000001). The files
+    with the name of a previous directory get the first free number, in the order of the files (PXD000001,
+    PXD000001-2...). The names are compared ignoring the case, for the file systems that do.
+    """
+    directories = []
+    used = set()
+    for sdrf_file in sdrf_files:
+        name = os.path.basename(sdrf_file)
+        for extension in SDRF_EXTENSIONS:
+            if name.lower().endswith(extension):
+                name = name[: -len(extension)]
+                break
+        unique_name, number = name, 1
+        while unique_name.lower() in used:
+            number += 1
+            unique_name = f"{name}-{number}"
+        used.add(unique_name.lower())
+        directories.append(os.path.join(output_directory, unique_name))
+    return directories
+
+
+def convert_file(sdrf_file: str, output_directory: str, log: typing.TextIO = None, **options) -> dict:
+    """
+    Convert an SDRF file and return its row of the batch summary. Exceptions are reported as failed files.
+    :param sdrf_file: SDRF file or snapshot
+    :param output_directory: directory of openms.tsv and experimental_design.tsv
+    :param log: if given, the messages of the conversion are written to it
+    :param options: options of :meth:`OpenMS.convert_tables`
+    """
+    start = time.perf_counter()
+    try:
+        # the messages of the conversions of a batch are replaced by the summary
+        with contextlib.redirect_stdout(log if log is not None else io.StringIO()):
+            context = get_converter().convert_tables(sdrf_file, jobs=1, **options)
+        os.makedirs(output_directory, exist_ok=True)
+        write_tables(context.tables, output_directory)
+    except Exception as ex:
+        logger.debug("Conversion of %s failed", sdrf_file, exc_info=True)
+        status, warnings, message = FAILED, 0, f"{type(ex).__name__}: {ex}"
+    else:
+        status, warnings = CONVERTED, len(context.warnings)
+        message = "; ".join(f"{warning} ({count} times)" for warning, count in context.warnings.items())
+    return {
+        "file": sdrf_file,
+        "output": output_directory,
+        "status": status,
+        "warnings": warnings,
+        "seconds": round(time.perf_counter() - start, 3),
+        "message": message,
+    }
+
+
+def _init_worker():
+    """
+    Create the converter of a worker process, if it was not forked with the converter of the parent.
+    """
+    get_converter()
+
+
+def convert_batch(
+    sdrf_files: typing.List[str], output_directory: str = ".", jobs: int = None, **options
+) -> typing.List[dict]:
+    """
+    Convert SDRF files in a pool of processes, the files of every SDRF are written to their own directory (see
+    :func:`get_output_directories`).
+    :param sdrf_files: SDRF files to be converted
+    :param output_directory: directory of the output directories of the SDRF files
+    :param jobs: number of worker processes, the number of CPUs by default, 1 converts in this process
+    :param options: options of :meth:`OpenMS.convert_tables`
+    :return: the summary, one row per file in the order of the files
+    """
+    directories = get_output_directories(sdrf_files, output_directory)
+    convert = partial(convert_file, **options)
+    # the Unimod database is loaded once, before the workers are forked
+    get_converter()
+    jobs = min(jobs or os.cpu_count() or 1, len(sdrf_files))
+    if jobs <= 1:
+        return [convert(sdrf_file, directory) for sdrf_file, directory in zip(sdrf_files, directories)]
+
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    mp_context = multiprocessing.get_context("fork") if fork else None
+    chunksize = max(1, min(16, len(sdrf_files) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context, initializer=_init_worker) as executor:
+        return list(executor.map(convert, sdrf_files, directories, chunksize=chunksize))
@@ -1,26 +1,168 @@
+import contextlib
+import copy
+import os
 import re
+import typing
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 
 from sdrf_pipelines.openms.unimod import UnimodDatabase
+from sdrf_pipelines.sdrf.snapshot import read_sdrf
+from sdrf_pipelines.sdrf.terms import ACCESSION
+from sdrf_pipelines.sdrf.terms import NAME
+from sdrf_pipelines.sdrf.terms import POSITION
+from sdrf_pipelines.sdrf.terms import TARGET
+from sdrf_pipelines.sdrf.terms import extract_keys
+from sdrf_pipelines.sdrf.terms import parse_term
 
 # example: parse_sdrf convert-openms -s .\sdrf-pipelines\sdrf_pipelines\large_sdrf.tsv -c '[characteristics[biological replicate],characteristics[individual]]'
 
 
 class FileToColumnEntries:
-    file2mods = {}
-    file2pctol = {}
-    file2pctolunit = {}
-    file2fragtol = {}
-    file2fragtolunit = {}
-    file2diss = {}
-    file2enzyme = {}
-    file2source = {}
-    file2label = {}
-    file2fraction = {}
-    file2combined_factors = {}
-    file2technical_rep = {}
+    def __init__(self) -> None:
+        self.file2mods = {}
+        self.file2pctol = {}
+        self.file2pctolunit = {}
+        self.file2fragtol = {}
+        self.file2fragtolunit = {}
+        self.file2diss = {}
+        self.file2enzyme = {}
+        self.file2source = {}
+        self.file2label = {}
+        self.file2fraction = {}
+        self.file2combined_factors = {}
+        self.file2technical_rep = {}
+
+
+class TableWriter:
+    """
+    Writer of the rows of an OpenMS file into dataframes, one per section of the file. The sections are separated by an
+    empty row and the first row of a section is its header.
+    """
+
+    def __init__(self) -> None:
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(list(row))
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def to_frames(self) -> typing.List[pd.DataFrame]:
+        frames = []
+        section = []
+        for row in self.rows + [[]]:
+            if row:
+                section.append(row)
+            elif section:
+                frames.append(pd.DataFrame(section[1:], columns=section[0], dtype=str))
+                section = []
+        return frames
+
+
+class TsvWriter:
+    """
+    Writer of the rows of an OpenMS file to a text file, tab separated and unquoted. The values are written as they
+    are, the tabs and new lines of a quoted SDRF cell included, like the rows were written before they were streamed.
+    """
+
+    def __init__(self, fh: typing.TextIO) -> None:
+        self.fh = fh
+
+    def writerow(self, row):
+        self.fh.write("\t".join("" if value is None else str(value) for value in row) + "\n")
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+
+class ConversionContext:
+    """
+    State of the conversion of one SDRF file: the entries of its raw files, its source names, the warnings and the
+    tables of a conversion in memory. Every call of :meth:`OpenMS.openms_convert` or :meth:`OpenMS.convert_tables`
+    creates its own context, the converter only keeps what the conversions share (the Unimod database, the enzymes and
+    the labels), so one converter converts any number of files at steady memory.
+    """
+
+    def __init__(self, sdrf_file: typing.Union[str, pd.DataFrame] = None) -> None:
+        self.sdrf_file = sdrf_file
+        self.f2c = FileToColumnEntries()
+        self.source_name_list = []
+        self.source_name2n_reps = {}
+        self.warnings = {}
+        # the sections of the output files, by file name, of a conversion in memory
+        self.tables = {}
+
+    @property
+    def sdrf_name(self) -> str:
+        """
+        Name of the SDRF in the messages of the conversion.
+        """
+        return "<dataframe>" if isinstance(self.sdrf_file, pd.DataFrame) else str(self.sdrf_file)
+
+    @contextlib.contextmanager
+    def open_table_writer(self, output_filename: str):
+        """
+        Open a writer of the rows of an output file into :attr:`tables`, see :class:`TableWriter`.
+        """
+        writer = TableWriter()
+        yield writer
+        self.tables[output_filename] = writer.to_frames()
+
+
+@contextlib.contextmanager
+def open_tsv_writer(output_filename: str):
+    """
+    Open a writer of the rows of an OpenMS file, tab separated and unquoted. The rows are written as they are produced
+    to a temporary file next to the output file, which replaces the output file once all the rows are written.
+    :param output_filename: output file
+    :return: a :class:`TsvWriter`
+    """
+    temporary_filename = f"{output_filename}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_filename, "w") as fh:
+            yield TsvWriter(fh)
+        os.replace(temporary_filename, output_filename)
+    except Exception:
+        if os.path.exists(temporary_filename):
+            os.unlink(temporary_filename)
+        raise
+
+
+def write_tables(tables: typing.Dict[str, typing.List[pd.DataFrame]], output_directory: str = "."):
+    """
+    Write the tables of a conversion in memory (:meth:`OpenMS.convert_tables`), the files are the same as the ones of
+    :meth:`OpenMS.openms_convert`.
+    :param tables: the sections of the output files, by file name
+    :param output_directory: directory of the files
+    """
+    for output_filename, frames in tables.items():
+        with open_tsv_writer(os.path.join(output_directory, output_filename)) as writer:
+            for i, frame in enumerate(frames):
+                if i > 0:
+                    writer.writerow([])
+                writer.writerow(frame.columns)
+                writer.writerows(frame.itertuples(index=False))
+
+
+def get_fraction_group_offsets(source_name_list, source_name2n_reps):
+    """
+    Return the offset of the fraction groups of every source name, the number of technical replicates of the preceding
+    source names.
+    :param source_name_list: source names in the order of the SDRF
+    :param source_name2n_reps: number of technical replicates of every source name
+    """
+    offsets = {}
+    offset = 0
+    for source_name in source_name_list:
+        offsets[source_name] = offset
+        offset += int(source_name2n_reps[source_name])
+    return offsets
 
 
 def get_openms_file_name(raw, extension_convert: str = None):
@@ -77,6 +219,8 @@ class OpenMS:
     def __init__(self) -> None:
         super().__init__()
         self.warnings = {}
+        # the output files are written to disk, or to the tables of a conversion in memory
+        self.open_writer = open_tsv_writer
         self._unimod_database = UnimodDatabase()
         self.tmt16plex = {
             "TMT126": 1,
@@ -170,24 +314,21 @@ class OpenMS:
             if "AC=UNIMOD" not in m and "AC=Unimod" not in m:
                 raise Exception("only UNIMOD modifications supported. " + m)
 
-            name = re.search("NT=(.+?)(;|$)", m).group(1)
+            term = parse_term(m)
+            name = term[NAME]
             name = name.capitalize()
 
-            accession = re.search("AC=(.+?)(;|$)", m).group(1)
+            accession = term[ACCESSION]
             ptm = self._unimod_database.get_by_accession(accession)
             if ptm is not None:
                 name = ptm.get_name()
 
             # workaround for missing PP in some sdrf TODO: fix in sdrf spec?
-            if re.search("PP=(.+?)(;|$)", m) is None:
-                pp = "Anywhere"
-            else:
-                pp = re.search("PP=(.+?)(;|$)", m).group(
-                    1
-                )  # one of [Anywhere, Protein N-term, Protein C-term, Any N-term, Any C-term
+            # one of [Anywhere, Protein N-term, Protein C-term, Any N-term, Any C-term
+            pp = term.get(POSITION, "Anywhere")
 
             ta = ""
-            if re.search("TA=(.+?)(;|$)", m) is None:  # TODO: missing in sdrf.
+            if TARGET not in term:  # TODO: missing in sdrf.
                 warning_message = "Warning no TA= specified. Setting to N-term or C-term if possible."
                 self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
                 if "C-term" in pp:
@@ -199,7 +340,7 @@ class OpenMS:
                     # print(warning_message + " "+ m)
                     self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
             else:
-                ta = re.search("TA=(.+?)(;|$)", m).group(1)  # target amino-acid
+                ta = term[TARGET]  # target amino-acid
             aa = ta.split(",")  # multiply target site e.g., S,T,Y including potentially termini "C-term"
 
             if pp == "Protein N-term" or pp == "Protein C-term":
@@ -221,6 +362,27 @@ class OpenMS:
 
         return ",".join(oms_mods)
 
+    def openms_ify_mod_set(self, sdrf_mods, occurrences=1):
+        """
+        Convert the modifications of a row to OpenMS notation, the fixed and the variable modifications apart.
+        The warnings of the conversion are counted for every row with the same modifications.
+        :param sdrf_mods: the values of the modification parameters columns of a row
+        :param occurrences: number of rows with these modifications
+        :return: tuple (fixed modifications, variable modifications)
+        """
+        # workaround for capitalization
+        var_mods = sorted(m for m in sdrf_mods if "MT=variable" in m or "MT=Variable" in m)
+        fixed_mods = sorted(m for m in sdrf_mods if "MT=fixed" in m or "MT=Fixed" in m)
+
+        warnings, self.warnings = self.warnings, {}
+        try:
+            openms_mods = (self.openms_ify_mods(fixed_mods), self.openms_ify_mods(var_mods))
+        finally:
+            mod_warnings, self.warnings = self.warnings, warnings
+        for warning_message, count in mod_warnings.items():
+            self.warnings[warning_message] = self.warnings.get(warning_message, 0) + count * occurrences
+        return openms_mods
+
     def openms_convert(
         self,
         sdrf_file: str = None,
@@ -229,7 +391,67 @@ class OpenMS:
         verbose: bool = False,
         split_by_columns: str = None,
         extension_convert: str = None,
+        jobs: int = None,
+    ) -> ConversionContext:
+        """
+        Convert an SDRF file to openms.tsv and experimental_design.tsv in the working directory.
+        :param sdrf_file: SDRF file or snapshot
+        :param one_table: write the experimental design in the one-table format
+        :param legacy: add the Sample column to the one-table format
+        :param verbose: print every row
+        :param split_by_columns: columns of the conditions, e.g. '[characteristics[biological replicate]]', one pair of
+            files is written for every condition
+        :param extension_convert: conversion of the extensions of the raw files, e.g. 'raw:mzML'
+        :param jobs: number of conditions written in parallel
+        :return: the context of the conversion, with its warnings
+        """
+        context = ConversionContext(sdrf_file)
+        self.with_warnings(context.warnings)._convert(
+            context, one_table, legacy, verbose, split_by_columns, extension_convert, jobs
+        )
+        return context
+
+    def convert_tables(
+        self,
+        sdrf: typing.Union[str, pd.DataFrame],
+        one_table: bool = False,
+        legacy: bool = False,
+        split_by_columns: str = None,
+        extension_convert: str = None,
+        jobs: int = None,
+    ) -> ConversionContext:
+        """
+        Convert an SDRF to the tables of openms.tsv and experimental_design.tsv, in memory. The options are the ones of
+        :meth:`openms_convert`, :func:`write_tables` writes the tables to disk.
+        :param sdrf: SDRF file, snapshot or dataframe
+        :return: the context of the conversion, with the sections of every output file by file name in ``tables``
+            (one dataframe per table, the two-table experimental design has two) and the warnings in ``warnings``
+        """
+        context = ConversionContext(sdrf)
+        converter = self.with_warnings(context.warnings)
+        converter.open_writer = context.open_table_writer
+        converter._convert(context, one_table, legacy, False, split_by_columns, extension_convert, jobs)
+        return context
+
+    def with_warnings(self, warnings: dict) -> "OpenMS":
+        """
+        Return a converter sharing the resources of this one, that counts its warnings in the given dictionary.
+        """
+        converter = copy.copy(self)
+        converter.warnings = warnings
+        return converter
+
+    def _convert(
+        self,
+        context: ConversionContext,
+        one_table: bool,
+        legacy: bool,
+        verbose: bool,
+        split_by_columns: str,
+        extension_convert: str,
+        jobs: int,
     ):
+        sdrf_file = context.sdrf_name
         print("PROCESSING: " + sdrf_file + '"')
 
         # convert list passed on command line '[assay name,comment[fraction identifier]]' to python list
@@ -241,7 +463,7 @@ class OpenMS:
             print("User selected factor columns: " + str(split_by_columns))
 
         # load sdrf file
-        sdrf = pd.read_table(sdrf_file)
+        sdrf = read_sdrf(context.sdrf_file)
         null_cols = sdrf.columns[sdrf.isnull().any()]
         if sdrf.isnull().values.any():
             raise Exception(
@@ -272,32 +494,34 @@ class OpenMS:
         else:
             factor_cols = split_by_columns  # enforce columns as factors if names provided by user
 
-        source_name_list = []
-        source_name2n_reps = {}
+        # names (NT=) of the terms of the columns read for every row, every distinct cell is parsed once
+        term_names = {
+            column: extract_keys(sdrf[column], [NAME])[NAME]
+            for column in ("comment[dissociation method]", "comment[cleavage agent details]", "comment[label]")
+            if column in sdrf
+        }
+
+        source_name_list = context.source_name_list
+        source_name2n_reps = context.source_name2n_reps
 
-        f2c = FileToColumnEntries()
+        # the modifications of a row are converted once per distinct set of modifications in the file
+        if mod_cols:
+            mod_sets = pd.Series(list(zip(*(sdrf[c] for c in mod_cols))), index=sdrf.index)
+        else:
+            mod_sets = pd.Series([()] * len(sdrf), index=sdrf.index)
+        mod_set_counts = Counter(mod_sets)
+        openms_mods = {}
+
+        row_conditions = []
+        f2c = context.f2c
         for row_index, row in sdrf.iterrows():
-            # extract mods
-            all_mods = list(row[mod_cols])
-            # print(all_mods)
-            var_mods = [
-                m for m in all_mods if "MT=variable" in m or "MT=Variable" in m
-            ]  # workaround for capitalization
-            var_mods.sort()
-            fixed_mods = [m for m in all_mods if "MT=fixed" in m or "MT=Fixed" in m]  # workaround for capitalization
-            fixed_mods.sort()
             if verbose:
                 print(row)
             raw = row["comment[data file]"]
-            fixed_mods_string = ""
-            if fixed_mods is not None:
-                fixed_mods_string = self.openms_ify_mods(fixed_mods)
-
-            variable_mods_string = ""
-            if var_mods is not None:
-                variable_mods_string = self.openms_ify_mods(var_mods)
-
-            f2c.file2mods[raw] = (fixed_mods_string, variable_mods_string)
+            mod_set = mod_sets[row_index]
+            if mod_set not in openms_mods:
+                openms_mods[mod_set] = self.openms_ify_mod_set(mod_set, mod_set_counts[mod_set])
+            f2c.file2mods[raw] = openms_mods[mod_set]
 
             source_name = row["source name"]
             f2c.file2source[raw] = source_name
@@ -340,8 +564,8 @@ class OpenMS:
                 f2c.file2fragtolunit[raw] = "ppm"
 
             if "comment[dissociation method]" in row:
-                if re.search("NT=(.+?)(;|$)", row["comment[dissociation method]"]) is not None:
-                    diss_method = re.search("NT=(.+?)(;|$)", row["comment[dissociation method]"]).group(1)
+                diss_method = term_names["comment[dissociation method]"][row_index]
+                if diss_method is not None:
                     f2c.file2diss[raw] = diss_method.upper()
                 else:
                     warning_message = "No dissociation method provided. Assuming HCD."
@@ -369,7 +593,9 @@ class OpenMS:
             else:
                 source_name2n_reps[source_name] = int(f2c.file2technical_rep[raw])
 
-            enzyme = re.search("NT=(.+?)(;|$)", row["comment[cleavage agent details]"]).group(1)
+            enzyme = term_names["comment[cleavage agent details]"][row_index]
+            if enzyme is None:
+                raise Exception("No enzyme name (NT=) in " + row["comment[cleavage agent details]"])
 
             enzyme = enzyme.capitalize()
             # This is to check if the openMS map of enzymes
@@ -387,8 +613,8 @@ class OpenMS:
             else:
                 f2c.file2fraction[raw] = "1"
 
-            if re.search("NT=(.+?)(;|$)", row["comment[label]"]) is not None:
-                label = re.search("NT=(.+?)(;|$)", row["comment[label]"]).group(1)
+            label = term_names["comment[label]"][row_index]
+            if label is not None:
                 f2c.file2label[raw] = [label]
             else:
                 if "TMT" in row["comment[label]"]:
@@ -411,14 +637,14 @@ class OpenMS:
                 # take only entries of splitting columns to generate the conditions
                 combined_factors = "|".join(list(row[split_by_columns]))
 
-            # add condition from factors as extra column to sdrf so we can easily filter in pandas
-            sdrf["_conditions_from_factors"] = pd.Series([None] * sdrf.shape[0], dtype="object")
-            sdrf.at[row_index, "_conditions_from_factors"] = combined_factors
-
+            row_conditions.append(combined_factors)
             f2c.file2combined_factors[raw + row["comment[label]"]] = combined_factors
 
             # print("Combined factors: " + str(combined_factors))
 
+        # add condition from factors as extra column to sdrf so we can easily group the rows in pandas
+        sdrf["_conditions_from_factors"] = pd.Series(row_conditions, index=sdrf.index, dtype="object")
+
         conditions = Counter(f2c.file2combined_factors.values()).keys()
         files_per_condition = Counter(f2c.file2combined_factors.values()).values()
         print("Conditions (" + str(len(conditions)) + "): " + str(conditions))
@@ -456,42 +682,84 @@ class OpenMS:
                 )
 
         else:  # split by columns
-            for index, c in enumerate(conditions):
-                # extract rows from sdrf for current condition
-                split_sdrf = sdrf.loc[sdrf["_conditions_from_factors"] == c]
-                output_filename = "openms.tsv." + str(index)
-                self.save_search_settings_to_file(output_filename, split_sdrf, f2c)
-
-                # output of experimental design
-                output_filename = "experimental_design.tsv." + str(index)
-                if one_table:
-                    self.writeOneTableExperimentalDesign(
-                        output_filename,
-                        legacy,
-                        split_sdrf,
-                        f2c.file2technical_rep,
-                        source_name_list,
-                        source_name2n_reps,
-                        f2c.file2combined_factors,
-                        f2c.file2label,
-                        extension_convert,
-                        f2c.file2fraction,
-                    )
-                else:  # two table format
-                    self.writeTwoTableExperimentalDesign(
-                        output_filename,
-                        split_sdrf,
-                        f2c.file2technical_rep,
-                        source_name_list,
-                        source_name2n_reps,
-                        f2c.file2label,
-                        extension_convert,
-                        f2c.file2fraction,
-                        f2c.file2combined_factors,
-                    )
+            # the label modifications are added before the conditions are written, the writers only read the entries
+            for raw in sdrf["comment[data file]"].unique():
+                self.get_search_settings_label(raw, f2c)
+
+            condition_sdrfs = dict(list(sdrf.groupby("_conditions_from_factors", sort=False)))
+            conditions = [c for c in conditions if c in condition_sdrfs]
+
+            def write_condition(index, condition):
+                # every condition counts its warnings apart, they are added in the order of the conditions
+                converter = self.with_warnings({})
+                converter.writeConditionFiles(
+                    index,
+                    condition_sdrfs[condition],
+                    f2c,
+                    one_table,
+                    legacy,
+                    source_name_list,
+                    source_name2n_reps,
+                    extension_convert,
+                )
+                return converter.warnings
+
+            jobs = min(jobs or os.cpu_count() or 1, len(conditions))
+            if jobs <= 1:
+                condition_warnings = map(write_condition, range(len(conditions)), conditions)
+            else:
+                with ThreadPoolExecutor(max_workers=jobs) as executor:
+                    condition_warnings = list(executor.map(write_condition, range(len(conditions)), conditions))
+            for warnings in condition_warnings:
+                for warning_message, count in warnings.items():
+                    self.warnings[warning_message] = self.warnings.get(warning_message, 0) + count
 
         self.reportWarnings(sdrf_file)
 
+    def writeConditionFiles(
+        self,
+        index,
+        sdrf,
+        f2c,
+        one_table,
+        legacy,
+        source_name_list,
+        source_name2n_reps,
+        extension_convert,
+    ):
+        """
+        Write openms.tsv.<index> and experimental_design.tsv.<index> with the rows of one condition.
+        """
+        self.save_search_settings_to_file("openms.tsv." + str(index), sdrf, f2c)
+
+        # output of experimental design
+        output_filename = "experimental_design.tsv." + str(index)
+        if one_table:
+            self.writeOneTableExperimentalDesign(
+                output_filename,
+                legacy,
+                sdrf,
+                f2c.file2technical_rep,
+                source_name_list,
+                source_name2n_reps,
+                f2c.file2combined_factors,
+                f2c.file2label,
+                extension_convert,
+                f2c.file2fraction,
+            )
+        else:  # two table format
+            self.writeTwoTableExperimentalDesign(
+                output_filename,
+                sdrf,
+                f2c.file2technical_rep,
+                source_name_list,
+                source_name2n_reps,
+                f2c.file2label,
+                extension_convert,
+                f2c.file2fraction,
+                f2c.file2combined_factors,
+            )
+
     def combine_factors_to_conditions(self, characteristics_cols, factor_cols, row):
         all_factors = list(row[factor_cols])
         combined_factors = "|".join(all_factors)
@@ -541,179 +809,158 @@ class OpenMS:
         file2combined_factors,
     ):
         openms_file_header = ["Fraction_Group", "Fraction", "Spectra_Filepath", "Label", "Sample"]
-        f = ""
-        f += "\t".join(openms_file_header) + "\n"
-        label_index = dict(zip(sdrf["comment[data file]"], [0] * len(sdrf["comment[data file]"])))
-        sample_identifier_re = re.compile(r"sample (\d+)$", re.IGNORECASE)
-        Fraction_group = {}
-        sample_id_map = {}
-        sample_id = 1
-        pre_frac_group = 1
-        raw_frac = {}
-        for _0, row in sdrf.iterrows():
-            raw = row["comment[data file]"]
-            source_name = row["source name"]
-            replicate = file2technical_rep[raw]
-
-            # calculate fraction group by counting all technical replicates of the preceeding source names
-            source_name_index = source_name_list.index(source_name)
-            offset = 0
-            for i in range(source_name_index):
-                offset = offset + int(source_name2n_reps[source_name_list[i]])
-
-            fraction_group = offset + int(replicate)
+        with self.open_writer(output_filename) as writer:
+            writer.writerow(openms_file_header)
+            label_index = dict(zip(sdrf["comment[data file]"], [0] * len(sdrf["comment[data file]"])))
+            sample_identifier_re = re.compile(r"sample (\d+)$", re.IGNORECASE)
+            Fraction_group = {}
+            sample_id_map = {}
+            sample_id = 1
+            pre_frac_group = 1
+            raw_frac = {}
+            fraction_group_offsets = get_fraction_group_offsets(source_name_list, source_name2n_reps)
+            for _0, row in sdrf.iterrows():
+                raw = row["comment[data file]"]
+                source_name = row["source name"]
+                replicate = file2technical_rep[raw]
+
+                fraction_group = fraction_group_offsets[source_name] + int(replicate)
+
+                if fraction_group not in raw_frac:
+                    raw_frac[fraction_group] = [raw]
+
+                    if raw in Fraction_group:
+                        if fraction_group < Fraction_group[raw]:
+                            Fraction_group[raw] = fraction_group
+                    else:
+                        Fraction_group[raw] = fraction_group
 
-            if fraction_group not in raw_frac:
-                raw_frac[fraction_group] = [raw]
+                    # make fraction group consecutive
+                    if Fraction_group[raw] > pre_frac_group + 1:
+                        Fraction_group[raw] = pre_frac_group + 1
+                    pre_frac_group = Fraction_group[raw]
 
-                if raw in Fraction_group:
-                    if fraction_group < Fraction_group[raw]:
-                        Fraction_group[raw] = fraction_group
                 else:
-                    Fraction_group[raw] = fraction_group
+                    raw_frac[fraction_group].append(raw)
+                    Fraction_group[raw] = Fraction_group[raw_frac[fraction_group][0]]
 
-                # make fraction group consecutive
-                if Fraction_group[raw] > pre_frac_group + 1:
-                    Fraction_group[raw] = pre_frac_group + 1
-                pre_frac_group = Fraction_group[raw]
+                if re.search(sample_identifier_re, source_name) is not None:
+                    sample = re.search(sample_identifier_re, source_name).group(1)
+                else:
+                    warning_message = "No sample identifier"
+                    self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
 
-            else:
-                raw_frac[fraction_group].append(raw)
-                Fraction_group[raw] = Fraction_group[raw_frac[fraction_group][0]]
+                    # Solve non-sample id expression models
+                    if source_name in sample_id_map.keys():
+                        sample = sample_id_map[source_name]
+                    else:
+                        sample_id_map[source_name] = sample_id
+                        sample = sample_id
+                        sample_id += 1
+
+                label = file2label[raw]
+                if "label free sample" in label:
+                    label = "1"
+                elif "TMT" in ",".join(file2label[raw]):
+                    if (
+                        len(label) > 11
+                        or "TMT134N" in label
+                        or "TMT133C" in label
+                        or "TMT133N" in label
+                        or "TMT132C" in label
+                        or "TMT132N" in label
+                    ):
+                        choice = self.tmt16plex
+                    elif len(label) == 11 or "TMT131C" in label:
+                        choice = self.tmt11plex
+                    elif len(label) > 6:
+                        choice = self.tmt10plex
+                    else:
+                        choice = self.tmt6plex
+                    label = str(choice[label[label_index[raw]]])
+                    label_index[raw] = label_index[raw] + 1
+                elif "SILAC" in ",".join(file2label[raw]):
+                    if len(label) == 3:
+                        label = str(self.silac3[label[label_index[raw]].lower()])
+                    else:
+                        label = str(self.silac2[label[label_index[raw]].lower()])
+                elif "ITRAQ" in ",".join(file2label[raw]):
+                    if (
+                        len(label) > 4
+                        or "ITRAQ113" in label
+                        or "ITRAQ118" in label
+                        or "ITRAQ119" in label
+                        or "ITRAQ121" in label
+                    ):
+                        label = str(self.itraq8plex[label[label_index[raw]].lower()])
+                    else:
+                        label = str(self.itraq4plex[label[label_index[raw]].lower()])
+                    label_index[raw] = label_index[raw] + 1
 
-            if re.search(sample_identifier_re, source_name) is not None:
-                sample = re.search(sample_identifier_re, source_name).group(1)
-            else:
-                warning_message = "No sample identifier"
-                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
+                out = get_openms_file_name(raw, extension_convert)
 
-                # Solve non-sample id expression models
-                if source_name in sample_id_map.keys():
-                    sample = sample_id_map[source_name]
-                else:
-                    sample_id_map[source_name] = sample_id
-                    sample = sample_id
-                    sample_id += 1
-
-            label = file2label[raw]
-            if "label free sample" in label:
-                label = "1"
-            elif "TMT" in ",".join(file2label[raw]):
-                if (
-                    len(label) > 11
-                    or "TMT134N" in label
-                    or "TMT133C" in label
-                    or "TMT133N" in label
-                    or "TMT132C" in label
-                    or "TMT132N" in label
-                ):
-                    choice = self.tmt16plex
-                elif len(label) == 11 or "TMT131C" in label:
-                    choice = self.tmt11plex
-                elif len(label) > 6:
-                    choice = self.tmt10plex
-                else:
-                    choice = self.tmt6plex
-                label = str(choice[label[label_index[raw]]])
-                label_index[raw] = label_index[raw] + 1
-            elif "SILAC" in ",".join(file2label[raw]):
-                if len(label) == 3:
-                    label = str(self.silac3[label[label_index[raw]].lower()])
-                else:
-                    label = str(self.silac2[label[label_index[raw]].lower()])
-            elif "ITRAQ" in ",".join(file2label[raw]):
-                if (
-                    len(label) > 4
-                    or "ITRAQ113" in label
-                    or "ITRAQ118" in label
-                    or "ITRAQ119" in label
-                    or "ITRAQ121" in label
-                ):
-                    label = str(self.itraq8plex[label[label_index[raw]].lower()])
-                else:
-                    label = str(self.itraq4plex[label[label_index[raw]].lower()])
-                label_index[raw] = label_index[raw] + 1
-
-            out = get_openms_file_name(raw, extension_convert)
-
-            f += (
-                str(Fraction_group[raw])
-                + "\t"
-                + file2fraction[raw]
-                + "\t"
-                + out
-                + "\t"
-                + label
-                + "\t"
-                + str(sample)
-                + "\n"
-            )
+                writer.writerow([str(Fraction_group[raw]), file2fraction[raw], out, label, str(sample)])
 
-        # sample table
-        f += "\n"
-        if "tmt" in ",".join(
-            map(lambda x: x.lower(), file2label[sdrf["comment[data file]"].tolist()[0]])
-        ) or "itraq" in ",".join(map(lambda x: x.lower(), file2label[sdrf["comment[data file]"].tolist()[0]])):
-            openms_sample_header = ["Sample", "MSstats_Condition", "MSstats_BioReplicate", "MSstats_Mixture"]
-        else:
-            openms_sample_header = ["Sample", "MSstats_Condition", "MSstats_BioReplicate"]
-        f += "\t".join(openms_sample_header) + "\n"
-        sample_row_written = []
-        mixture_identifier = 1
-        mixture_raw_tag = {}
-        mixture_sample_tag = {}
-        BioReplicate = []
-
-        for _0, row in sdrf.iterrows():
-            raw = row["comment[data file]"]
-            source_name = row["source name"]
-            if re.search(sample_identifier_re, source_name) is not None:
-                sample = re.search(sample_identifier_re, source_name).group(1)
-
-                # MSstats BioReplicate column needs to be different for samples from different conditions.
-                # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
-                MSstatsBioReplicate = sample
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
+            # sample table
+            writer.writerow([])
+            if "tmt" in ",".join(
+                map(lambda x: x.lower(), file2label[sdrf["comment[data file]"].tolist()[0]])
+            ) or "itraq" in ",".join(map(lambda x: x.lower(), file2label[sdrf["comment[data file]"].tolist()[0]])):
+                openms_sample_header = ["Sample", "MSstats_Condition", "MSstats_BioReplicate", "MSstats_Mixture"]
             else:
-                warning_message = "No sample identifier"
-                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-
-                # Solve non-sample id expression models
-                sample = sample_id_map[source_name]
+                openms_sample_header = ["Sample", "MSstats_Condition", "MSstats_BioReplicate"]
+            writer.writerow(openms_sample_header)
+            sample_row_written = set()
+            mixture_identifier = 1
+            mixture_raw_tag = {}
+            mixture_sample_tag = {}
+            BioReplicate = {}
+
+            for _0, row in sdrf.iterrows():
+                raw = row["comment[data file]"]
+                source_name = row["source name"]
+                if re.search(sample_identifier_re, source_name) is not None:
+                    sample = re.search(sample_identifier_re, source_name).group(1)
+
+                    # MSstats BioReplicate column needs to be different for samples from different conditions.
+                    # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
+                    MSstatsBioReplicate = sample
+                    BioReplicate.setdefault(sample, len(BioReplicate))
+                else:
+                    warning_message = "No sample identifier"
+                    self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
 
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-                MSstatsBioReplicate = str(BioReplicate.index(sample) + 1)
-            if file2combined_factors[raw + row["comment[label]"]] is None:
-                # no factor defined use sample as condition
-                condition = source_name
-            else:
-                condition = file2combined_factors[raw + row["comment[label]"]]
-            if len(openms_sample_header) == 4:
-                if raw not in mixture_raw_tag.keys():
-                    if sample not in mixture_sample_tag.keys():
-                        mixture_raw_tag[raw] = mixture_identifier
-                        mixture_sample_tag[sample] = mixture_identifier
-                        mix_id = mixture_identifier
-                        mixture_identifier += 1
+                    # Solve non-sample id expression models
+                    sample = sample_id_map[source_name]
 
-                    else:
-                        mix_id = mixture_sample_tag[sample]
-                        mixture_raw_tag[raw] = mix_id
+                    BioReplicate.setdefault(sample, len(BioReplicate))
+                    MSstatsBioReplicate = str(BioReplicate[sample] + 1)
+                if file2combined_factors[raw + row["comment[label]"]] is None:
+                    # no factor defined use sample as condition
+                    condition = source_name
                 else:
-                    mix_id = mixture_raw_tag[raw]
-
-                if sample not in sample_row_written:
-                    f += str(sample) + "\t" + condition + "\t" + MSstatsBioReplicate + "\t" + str(mix_id) + "\n"
-                    sample_row_written.append(sample)
-            else:
-                if sample not in sample_row_written:
-                    f += str(sample) + "\t" + condition + "\t" + MSstatsBioReplicate + "\n"
-                    sample_row_written.append(sample)
+                    condition = file2combined_factors[raw + row["comment[label]"]]
+                if len(openms_sample_header) == 4:
+                    if raw not in mixture_raw_tag.keys():
+                        if sample not in mixture_sample_tag.keys():
+                            mixture_raw_tag[raw] = mixture_identifier
+                            mixture_sample_tag[sample] = mixture_identifier
+                            mix_id = mixture_identifier
+                            mixture_identifier += 1
+
+                        else:
+                            mix_id = mixture_sample_tag[sample]
+                            mixture_raw_tag[raw] = mix_id
+                    else:
+                        mix_id = mixture_raw_tag[raw]
 
-        with open(output_filename, "w+") as of:
-            of.write(f)
+                    if sample not in sample_row_written:
+                        writer.writerow([str(sample), condition, MSstatsBioReplicate, str(mix_id)])
+                        sample_row_written.add(sample)
+                else:
+                    if sample not in sample_row_written:
+                        writer.writerow([str(sample), condition, MSstatsBioReplicate])
+                        sample_row_written.add(sample)
 
     def writeOneTableExperimentalDesign(
         self,
@@ -728,7 +975,6 @@ class OpenMS:
         extension_convert,
         file2fraction,
     ):
-        f = ""
         if "tmt" in map(lambda x: x.lower(), file2label[sdrf["comment[data file]"].tolist()[0]]) or "itraq" in map(
             lambda x: x.lower(), file2label[sdrf["comment[data file]"].tolist()[0]]
         ):
@@ -774,212 +1020,258 @@ class OpenMS:
                     "MSstats_BioReplicate",
                 ]
 
-        f += "\t".join(open_ms_experimental_design_header) + "\n"
-        label_index = dict(zip(sdrf["comment[data file]"], [0] * len(sdrf["comment[data file]"])))
-        sample_identifier_re = re.compile(r"sample (\d+)$", re.IGNORECASE)
-        Fraction_group = {}
-        mixture_identifier = 1
-        mixture_raw_tag = {}
-        mixture_sample_tag = {}
-        BioReplicate = []
-        sample_id_map = {}
-        sample_id = 1
-        pre_frac_group = 1
-        raw_frac = {}
-        for _0, row in sdrf.iterrows():
-            raw = row["comment[data file]"]
-            source_name = row["source name"]
-            replicate = file2technical_rep[raw]
-
-            # calculate fraction group by counting all technical replicates of the preceeding source names
-            source_name_index = source_name_list.index(source_name)
-            offset = 0
-            for i in range(source_name_index):
-                offset = offset + int(source_name2n_reps[source_name_list[i]])
-
-            fraction_group = offset + int(replicate)
-
-            if fraction_group not in raw_frac:
-                raw_frac[fraction_group] = [raw]
-
-                if raw in Fraction_group.keys():
-                    if fraction_group < Fraction_group[raw]:
+        with self.open_writer(output_filename) as writer:
+            writer.writerow(open_ms_experimental_design_header)
+            label_index = dict(zip(sdrf["comment[data file]"], [0] * len(sdrf["comment[data file]"])))
+            sample_identifier_re = re.compile(r"sample (\d+)$", re.IGNORECASE)
+            Fraction_group = {}
+            mixture_identifier = 1
+            mixture_raw_tag = {}
+            mixture_sample_tag = {}
+            BioReplicate = {}
+            sample_id_map = {}
+            sample_id = 1
+            pre_frac_group = 1
+            raw_frac = {}
+            fraction_group_offsets = get_fraction_group_offsets(source_name_list, source_name2n_reps)
+            for _0, row in sdrf.iterrows():
+                raw = row["comment[data file]"]
+                source_name = row["source name"]
+                replicate = file2technical_rep[raw]
+
+                fraction_group = fraction_group_offsets[source_name] + int(replicate)
+
+                if fraction_group not in raw_frac:
+                    raw_frac[fraction_group] = [raw]
+
+                    if raw in Fraction_group.keys():
+                        if fraction_group < Fraction_group[raw]:
+                            Fraction_group[raw] = fraction_group
+                    else:
                         Fraction_group[raw] = fraction_group
-                else:
-                    Fraction_group[raw] = fraction_group
-
-                # make fraction group consecutive
-                if Fraction_group[raw] > pre_frac_group + 1:
-                    Fraction_group[raw] = pre_frac_group + 1
-                pre_frac_group = Fraction_group[raw]
 
-            else:
-                raw_frac[fraction_group].append(raw)
-                Fraction_group[raw] = Fraction_group[raw_frac[fraction_group][0]]
+                    # make fraction group consecutive
+                    if Fraction_group[raw] > pre_frac_group + 1:
+                        Fraction_group[raw] = pre_frac_group + 1
+                    pre_frac_group = Fraction_group[raw]
 
-            if re.search(sample_identifier_re, source_name) is not None:
-                sample = re.search(sample_identifier_re, source_name).group(1)
+                else:
+                    raw_frac[fraction_group].append(raw)
+                    Fraction_group[raw] = Fraction_group[raw_frac[fraction_group][0]]
 
-                # MSstats BioReplicate column needs to be different for samples from different conditions.
-                # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
-                MSstatsBioReplicate = sample
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-            else:
-                warning_message = "No sample number identifier"
-                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
+                if re.search(sample_identifier_re, source_name) is not None:
+                    sample = re.search(sample_identifier_re, source_name).group(1)
 
-                # Solve non-sample id expression models
-                if source_name in sample_id_map.keys():
-                    sample = sample_id_map[source_name]
+                    # MSstats BioReplicate column needs to be different for samples from different conditions.
+                    # so we can't just use the technical replicate identifier in sdrf but use the sample identifer
+                    MSstatsBioReplicate = sample
+                    BioReplicate.setdefault(sample, len(BioReplicate))
                 else:
-                    sample_id_map[source_name] = sample_id
-                    sample = sample_id
-                    sample_id += 1
-                if sample not in BioReplicate:
-                    BioReplicate.append(sample)
-                MSstatsBioReplicate = str(BioReplicate.index(sample) + 1)
-
-            if file2combined_factors[raw + row["comment[label]"]] is None:
-                # no factor defined -> use sample as condition
-                condition = source_name
-            else:
-                condition = file2combined_factors[raw + row["comment[label]"]]
-
-            # convert sdrf's label to openms's label
-            label = file2label[raw]
-            if "label free sample" in label:
-                label = "1"
-
-            elif "TMT" in ",".join(file2label[raw]):
-                if (
-                    len(label) > 11
-                    or "TMT134N" in label
-                    or "TMT133C" in label
-                    or "TMT133N" in label
-                    or "TMT132C" in label
-                    or "TMT132N" in label
-                ):
-                    choice = self.tmt16plex
-                elif len(label) == 11 or "TMT131C" in label:
-                    choice = self.tmt11plex
-                elif len(label) > 6:
-                    choice = self.tmt10plex
-                else:
-                    choice = self.tmt6plex
-                label = str(choice[label[label_index[raw]]])
-
-                #  This can be avoided the dicts are built based on file&label as key.
-                label_index[raw] = label_index[raw] + 1
-            elif "SILAC" in ",".join(file2label[raw]):
-                if len(label) == 3:
-                    label = str(self.silac3[label[label_index[raw]].lower()])
-                else:
-                    label = str(self.silac2[label[label_index[raw]].lower()])
-                label_index[raw] = label_index[raw] + 1
-            elif "ITRAQ" in ",".join(file2label[raw]):
-                if (
-                    len(label) > 4
-                    or "ITRAQ113" in label
-                    or "ITRAQ118" in label
-                    or "ITRAQ119" in label
-                    or "ITRAQ121" in label
-                ):
-                    label = str(self.itraq8plex[label[label_index[raw]].lower()])
+                    warning_message = "No sample number identifier"
+                    self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
+
+                    # Solve non-sample id expression models
+                    if source_name in sample_id_map.keys():
+                        sample = sample_id_map[source_name]
+                    else:
+                        sample_id_map[source_name] = sample_id
+                        sample = sample_id
+                        sample_id += 1
+                    BioReplicate.setdefault(sample, len(BioReplicate))
+                    MSstatsBioReplicate = str(BioReplicate[sample] + 1)
+
+                if file2combined_factors[raw + row["comment[label]"]] is None:
+                    # no factor defined -> use sample as condition
+                    condition = source_name
                 else:
-                    label = str(self.itraq4plex[label[label_index[raw]].lower()])
-                label_index[raw] = label_index[raw] + 1
-
-            out = get_openms_file_name(raw, extension_convert)
-
-            if "MSstats_Mixture" in open_ms_experimental_design_header:
-                if raw not in mixture_raw_tag.keys():
-                    if sample not in mixture_sample_tag.keys():
-                        mixture_raw_tag[raw] = mixture_identifier
-                        mixture_sample_tag[sample] = mixture_identifier
-                        mix_id = mixture_identifier
-                        mixture_identifier += 1
+                    condition = file2combined_factors[raw + row["comment[label]"]]
+
+                # convert sdrf's label to openms's label
+                label = file2label[raw]
+                if "label free sample" in label:
+                    label = "1"
+
+                elif "TMT" in ",".join(file2label[raw]):
+                    if (
+                        len(label) > 11
+                        or "TMT134N" in label
+                        or "TMT133C" in label
+                        or "TMT133N" in label
+                        or "TMT132C" in label
+                        or "TMT132N" in label
+                    ):
+                        choice = self.tmt16plex
+                    elif len(label) == 11 or "TMT131C" in label:
+                        choice = self.tmt11plex
+                    elif len(label) > 6:
+                        choice = self.tmt10plex
                     else:
-                        mix_id = mixture_sample_tag[sample]
-                        mixture_raw_tag[raw] = mix_id
+                        choice = self.tmt6plex
+                    label = str(choice[label[label_index[raw]]])
+
+                    #  This can be avoided the dicts are built based on file&label as key.
+                    label_index[raw] = label_index[raw] + 1
+                elif "SILAC" in ",".join(file2label[raw]):
+                    if len(label) == 3:
+                        label = str(self.silac3[label[label_index[raw]].lower()])
+                    else:
+                        label = str(self.silac2[label[label_index[raw]].lower()])
+                    label_index[raw] = label_index[raw] + 1
+                elif "ITRAQ" in ",".join(file2label[raw]):
+                    if (
+                        len(label) > 4
+                        or "ITRAQ113" in label
+                        or "ITRAQ118" in label
+                        or "ITRAQ119" in label
+                        or "ITRAQ121" in label
+                    ):
+                        label = str(self.itraq8plex[label[label_index[raw]].lower()])
+                    else:
+                        label = str(self.itraq4plex[label[label_index[raw]].lower()])
+                    label_index[raw] = label_index[raw] + 1
+
+                out = get_openms_file_name(raw, extension_convert)
+
+                if "MSstats_Mixture" in open_ms_experimental_design_header:
+                    if raw not in mixture_raw_tag.keys():
+                        if sample not in mixture_sample_tag.keys():
+                            mixture_raw_tag[raw] = mixture_identifier
+                            mixture_sample_tag[sample] = mixture_identifier
+                            mix_id = mixture_identifier
+                            mixture_identifier += 1
+                        else:
+                            mix_id = mixture_sample_tag[sample]
+                            mixture_raw_tag[raw] = mix_id
+                    else:
+                        mix_id = mixture_raw_tag[raw]
+
+                    if legacy:
+                        writer.writerow(
+                            [
+                                str(Fraction_group[raw]),
+                                file2fraction[raw],
+                                out,
+                                label,
+                                str(sample),
+                                condition,
+                                MSstatsBioReplicate,
+                                str(mix_id),
+                            ]
+                        )
+                    else:
+                        writer.writerow(
+                            [
+                                str(Fraction_group[raw]),
+                                file2fraction[raw],
+                                out,
+                                label,
+                                condition,
+                                MSstatsBioReplicate,
+                                str(mix_id),
+                            ]
+                        )
                 else:
-                    mix_id = mixture_raw_tag[raw]
-
-                if legacy:
-                    f += (
-                        str(Fraction_group[raw])
-                        + "\t"
-                        + file2fraction[raw]
-                        + "\t"
-                        + out
-                        + "\t"
-                        + label
-                        + "\t"
-                        + str(sample)
-                        + "\t"
-                        + condition
-                        + "\t"
-                        + MSstatsBioReplicate
-                        + "\t"
-                        + str(mix_id)
-                        + "\n"
-                    )
+                    if legacy:
+                        writer.writerow(
+                            [
+                                str(Fraction_group[raw]),
+                                file2fraction[raw],
+                                out,
+                                label,
+                                str(sample),
+                                condition,
+                                MSstatsBioReplicate,
+                            ]
+                        )
+                    else:
+                        writer.writerow(
+                            [str(Fraction_group[raw]), file2fraction[raw], out, label, condition, MSstatsBioReplicate]
+                        )
+
+    def get_search_settings_label(self, raw, f2c):
+        """
+        Return the label of a raw file in openms.tsv. The default modifications of the TMT and iTRAQ labels are added to
+        the variable modifications of the file if it has none of them.
+        :param raw: raw file name
+        :param f2c: the entries of the raw files
+        """
+        TMT_mod = {
+            "tmt6plex": ["TMT6plex (K)", "TMT6plex (N-term)"],
+            "tmt10plex": ["TMT6plex (K)", "TMT6plex (N-term)"],
+            "tmt11plex": ["TMT6plex (K)", "TMT6plex (N-term)"],
+            "tmt16plex": ["TMTpro (K)", "TMTpro (N-term)"],
+        }
+        ITRAQ_mod = {
+            "itraq4plex": ["iTRAQ4plex (K)", "iTRAQ4plex (N-term)"],
+            "itraq8plex": ["iTRAQ8plex (K)", "iTRAQ8plex (N-term)"],
+        }
+        labels = f2c.file2label[raw]
+        if "TMT" in ",".join(labels):
+            if (
+                len(labels) > 11
+                or "TMT134N" in labels
+                or "TMT133C" in labels
+                or "TMT133N" in labels
+                or "TMT132C" in labels
+                or "TMT132N" in labels
+            ):
+                label = "tmt16plex"
+            elif len(labels) == 11 or "TMT131C" in labels:
+                label = "tmt11plex"
+            elif len(labels) > 6:
+                label = "tmt10plex"
+            else:
+                label = "tmt6plex"
+            # add default TMT modification when sdrf with label not contains TMT modification
+            if "TMT" not in f2c.file2mods[raw][0] and "TMT" not in f2c.file2mods[raw][1]:
+                warning_message = (
+                    "The sdrf with TMT label doesn't contain TMT modification. Adding default "
+                    "variable modifications."
+                )
+                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
+                tmt_var_mod = TMT_mod[label]
+                if f2c.file2mods[raw][1]:
+                    VarMod = ",".join(f2c.file2mods[raw][1].split(",") + tmt_var_mod)
+                    f2c.file2mods[raw] = (f2c.file2mods[raw][0], VarMod)
                 else:
-                    f += (
-                        str(Fraction_group[raw])
-                        + "\t"
-                        + file2fraction[raw]
-                        + "\t"
-                        + out
-                        + "\t"
-                        + label
-                        + "\t"
-                        + condition
-                        + "\t"
-                        + MSstatsBioReplicate
-                        + "\t"
-                        + str(mix_id)
-                        + "\n"
-                    )
+                    f2c.file2mods[raw] = (f2c.file2mods[raw][0], ",".join(tmt_var_mod))
+        elif "label free sample" in labels:
+            label = "label free sample"
+        elif "silac" in ",".join(labels):
+            label = "SILAC"
+        elif "ITRAQ" in ",".join(labels):
+            if (
+                len(labels) > 4
+                or "ITRAQ113" in labels
+                or "ITRAQ118" in labels
+                or "ITRAQ119" in labels
+                or "ITRAQ121" in labels
+            ):
+                label = "itraq8plex"
             else:
-                if legacy:
-                    f += (
-                        str(Fraction_group[raw])
-                        + "\t"
-                        + file2fraction[raw]
-                        + "\t"
-                        + out
-                        + "\t"
-                        + label
-                        + "\t"
-                        + str(sample)
-                        + "\t"
-                        + condition
-                        + "\t"
-                        + MSstatsBioReplicate
-                        + "\n"
-                    )
+                label = "itraq4plex"
+            # add default ITRAQ modification when sdrf with label not contains ITRAQ modification
+            if "ITRAQ" not in f2c.file2mods[raw][0] and "ITRAQ" not in f2c.file2mods[raw][1]:
+                warning_message = (
+                    "The sdrf with ITRAQ label doesn't contain label modification. Adding default "
+                    "variable modifications."
+                )
+                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
+                itraq_var_mod = ITRAQ_mod[label]
+                if f2c.file2mods[raw][1]:
+                    VarMod = ",".join(f2c.file2mods[raw][1].split(",") + itraq_var_mod)
+                    f2c.file2mods[raw] = (f2c.file2mods[raw][0], VarMod)
                 else:
-                    f += (
-                        str(Fraction_group[raw])
-                        + "\t"
-                        + file2fraction[raw]
-                        + "\t"
-                        + out
-                        + "\t"
-                        + label
-                        + "\t"
-                        + condition
-                        + "\t"
-                        + MSstatsBioReplicate
-                        + "\n"
-                    )
+                    f2c.file2mods[raw] = (f2c.file2mods[raw][0], ",".join(itraq_var_mod))
 
-        with open(output_filename, "w+") as of:
-            of.write(f)
+        else:
+            raise Exception(
+                "Failed to find any supported labels. Supported labels are 'silac', 'label free "
+                "sample', 'ITRAQ', and tmt labels in the format 'TMT131C'"
+            )
+        return label
 
     def save_search_settings_to_file(self, output_filename, sdrf, f2c):
-        f = ""
         open_ms_search_settings_header = [
             "URI",
             "Filename",
@@ -994,131 +1286,46 @@ class OpenMS:
             "DissociationMethod",
             "Enzyme",
         ]
-        f += "\t".join(open_ms_search_settings_header) + "\n"
-        raws = []
-        TMT_mod = {
-            "tmt6plex": ["TMT6plex (K)", "TMT6plex (N-term)"],
-            "tmt10plex": ["TMT6plex (K)", "TMT6plex (N-term)"],
-            "tmt11plex": ["TMT6plex (K)", "TMT6plex (N-term)"],
-            "tmt16plex": ["TMTpro (K)", "TMTpro (N-term)"],
-        }
-        ITRAQ_mod = {
-            "itraq4plex": ["iTRAQ4plex (K)", "iTRAQ4plex (N-term)"],
-            "itraq8plex": ["iTRAQ8plex (K)", "iTRAQ8plex (N-term)"],
-        }
-        for _0, row in sdrf.iterrows():
-            URI = row["comment[file uri]"]
-            raw = row["comment[data file]"]
-            if "comment[proteomics data acquisition method]" not in row:
-                warning_message = (
-                    "The comment[proteomics data acquisition method] column is missing, "
-                    "default Data-Dependent Acquisition"
-                )
-                self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-                acquisition_method = "Data-Dependent Acquisition"
-            else:
-                acquisition_method = row["comment[proteomics data acquisition method]"]
-                if len(acquisition_method.split(";")) > 1:
-                    acquisition_method = acquisition_method.split(";")[0].split("=")[1]
-
-            if raw in raws:
-                continue
-            raws.append(raw)
-            labels = f2c.file2label[raw]
-            if "TMT" in ",".join(labels):
-                if (
-                    len(labels) > 11
-                    or "TMT134N" in labels
-                    or "TMT133C" in labels
-                    or "TMT133N" in labels
-                    or "TMT132C" in labels
-                    or "TMT132N" in labels
-                ):
-                    label = "tmt16plex"
-                elif len(labels) == 11 or "TMT131C" in labels:
-                    label = "tmt11plex"
-                elif len(labels) > 6:
-                    label = "tmt10plex"
-                else:
-                    label = "tmt6plex"
-                # add default TMT modification when sdrf with label not contains TMT modification
-                if "TMT" not in f2c.file2mods[raw][0] and "TMT" not in f2c.file2mods[raw][1]:
+        with self.open_writer(output_filename) as writer:
+            writer.writerow(open_ms_search_settings_header)
+            raws = set()
+            for _0, row in sdrf.iterrows():
+                URI = row["comment[file uri]"]
+                raw = row["comment[data file]"]
+                if "comment[proteomics data acquisition method]" not in row:
                     warning_message = (
-                        "The sdrf with TMT label doesn't contain TMT modification. Adding default "
-                        "variable modifications."
+                        "The comment[proteomics data acquisition method] column is missing, "
+                        "default Data-Dependent Acquisition"
                     )
                     self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-                    tmt_var_mod = TMT_mod[label]
-                    if f2c.file2mods[raw][1]:
-                        VarMod = ",".join(f2c.file2mods[raw][1].split(",") + tmt_var_mod)
-                        f2c.file2mods[raw] = (f2c.file2mods[raw][0], VarMod)
-                    else:
-                        f2c.file2mods[raw] = (f2c.file2mods[raw][0], ",".join(tmt_var_mod))
-            elif "label free sample" in labels:
-                label = "label free sample"
-            elif "silac" in ",".join(labels):
-                label = "SILAC"
-            elif "ITRAQ" in ",".join(labels):
-                if (
-                    len(labels) > 4
-                    or "ITRAQ113" in labels
-                    or "ITRAQ118" in labels
-                    or "ITRAQ119" in labels
-                    or "ITRAQ121" in labels
-                ):
-                    label = "itraq8plex"
+                    acquisition_method = "Data-Dependent Acquisition"
                 else:
-                    label = "itraq4plex"
-                # add default ITRAQ modification when sdrf with label not contains ITRAQ modification
-                if "ITRAQ" not in f2c.file2mods[raw][0] and "ITRAQ" not in f2c.file2mods[raw][1]:
-                    warning_message = (
-                        "The sdrf with ITRAQ label doesn't contain label modification. Adding default "
-                        "variable modifications."
-                    )
-                    self.warnings[warning_message] = self.warnings.get(warning_message, 0) + 1
-                    itraq_var_mod = ITRAQ_mod[label]
-                    if f2c.file2mods[raw][1]:
-                        VarMod = ",".join(f2c.file2mods[raw][1].split(",") + itraq_var_mod)
-                        f2c.file2mods[raw] = (f2c.file2mods[raw][0], VarMod)
-                    else:
-                        f2c.file2mods[raw] = (f2c.file2mods[raw][0], ",".join(itraq_var_mod))
-
-            else:
-                raise Exception(
-                    "Failed to find any supported labels. Supported labels are 'silac', 'label free "
-                    "sample', 'ITRAQ', and tmt labels in the format 'TMT131C'"
+                    acquisition_method = row["comment[proteomics data acquisition method]"]
+                    if len(acquisition_method.split(";")) > 1:
+                        acquisition_method = acquisition_method.split(";")[0].split("=")[1]
+
+                if raw in raws:
+                    continue
+                raws.add(raw)
+                label = self.get_search_settings_label(raw, f2c)
+
+                # Why is the file name modified on the experimental design but not in the openms.tsv?
+                # out_fname = get_openms_file_name(raw, extension_convert=extension_convert)
+                out_fname = raw
+
+                writer.writerow(
+                    [
+                        URI,
+                        out_fname,
+                        f2c.file2mods[raw][0],
+                        f2c.file2mods[raw][1],
+                        acquisition_method,
+                        label,
+                        f2c.file2pctol[raw],
+                        f2c.file2pctolunit[raw],
+                        f2c.file2fragtol[raw],
+                        f2c.file2fragtolunit[raw],
+                        f2c.file2diss[raw],
+                        f2c.file2enzyme[raw],
+                    ]
                 )
-
-            # Why is the file name modified on the experimental design but not in the openms.tsv?
-            # out_fname = get_openms_file_name(raw, extension_convert=extension_convert)
-            out_fname = raw
-
-            f += (
-                URI
-                + "\t"
-                + out_fname
-                + "\t"
-                + f2c.file2mods[raw][0]
-                + "\t"
-                + f2c.file2mods[raw][1]
-                + "\t"
-                + acquisition_method
-                + "\t"
-                + label
-                + "\t"
-                + f2c.file2pctol[raw]
-                + "\t"
-                + f2c.file2pctolunit[raw]
-                + "\t"
-                + f2c.file2fragtol[raw]
-                + "\t"
-                + f2c.file2fragtolunit[raw]
-                + "\t"
-                + f2c.file2diss[raw]
-                + "\t"
-                + f2c.file2enzyme[raw]
-                + "\n"
-            )
-        # openms.tsv
-        with open(output_filename, "w+") as of:
-            of.write(f)
@@ -1,24 +1,44 @@
 #!/usr/bin/env python3
 
-import csv
 import logging
 import os
-import re
 import sys
+from collections import Counter
 
 import click
-import pandas as pd
 
 from sdrf_pipelines import __version__
 from sdrf_pipelines.maxquant.maxquant import Maxquant
 from sdrf_pipelines.msstats.msstats import Msstats
 from sdrf_pipelines.normalyzerde.normalyzerde import NormalyzerDE
 from sdrf_pipelines.ols.ols import OlsClient
+from sdrf_pipelines.openms.batch import CONVERTED
+from sdrf_pipelines.openms.batch import FAILED as CONVERSION_FAILED
+from sdrf_pipelines.openms.batch import SUMMARY_COLUMNS as OPENMS_SUMMARY_COLUMNS
+from sdrf_pipelines.openms.batch import convert_batch
 from sdrf_pipelines.openms.openms import OpenMS
-from sdrf_pipelines.sdrf.sdrf import SdrfDataFrame
+from sdrf_pipelines.sdrf.batch import FAILED
+from sdrf_pipelines.sdrf.batch import INVALID
+from sdrf_pipelines.sdrf.batch import VALID
+from sdrf_pipelines.sdrf.batch import find_sdrf_files
+from sdrf_pipelines.sdrf.batch import validate_batch
+from sdrf_pipelines.sdrf.batch import validate_file
+from sdrf_pipelines.sdrf.batch import write_summary
+from sdrf_pipelines.sdrf.incremental import ErrorBudget
+from sdrf_pipelines.sdrf.incremental import ValidationProfile
+from sdrf_pipelines.sdrf.report import REPORT_FORMATS
+from sdrf_pipelines.sdrf.report import write_report
 from sdrf_pipelines.sdrf.sdrf_schema import ALL_TEMPLATES
 from sdrf_pipelines.sdrf.sdrf_schema import DEFAULT_TEMPLATE
-from sdrf_pipelines.sdrf.sdrf_schema import MASS_SPECTROMETRY
+from sdrf_pipelines.sdrf.snapshot import write_snapshot
+from sdrf_pipelines.sdrf.split import DEFAULT_MAX_OPEN_FILES
+from sdrf_pipelines.sdrf.split import split_sdrf_file
+from sdrf_pipelines.server import DEFAULT_HOST
+from sdrf_pipelines.server import DEFAULT_PORT
+from sdrf_pipelines.server import forward
+from sdrf_pipelines.server import serve
+from sdrf_pipelines.server import use_server
+from sdrf_pipelines.server import validation_response
 from sdrf_pipelines.utils.exceptions import AppConfigException
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
@@ -47,6 +67,36 @@ def cli():
     "-e",
     help="convert extensions of files from one type to other 'raw:mzML,mzml:MZML,mzML:mzML,d:d'",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of processes of a batch conversion, or of conditions written in parallel with --conditionsfromcolumns "
+    "(default: number of CPUs)",
+    type=int,
+)
+@click.option(
+    "--batch",
+    "-b",
+    help="Convert many SDRF files: a folder (files ending with sdrf.tsv or .sdrf), a text file with one SDRF path per "
+    "line or a glob pattern",
+)
+@click.option(
+    "--output",
+    "-o",
+    help="Directory of the files of a batch conversion, the files of every SDRF are written in a folder named after it",
+    default=".",
+)
+@click.option(
+    "--summary",
+    help="Summary of a batch conversion, one row per file (default: openms_conversion_summary.tsv)",
+    default="openms_conversion_summary.tsv",
+)
+@click.option(
+    "--server",
+    help="Convert the file on the running server (parse_sdrf serve, or $SDRF_PIPELINES_SERVER), not with --verbose "
+    "or --jobs",
+    is_flag=True,
+)
 @click.pass_context
 def openms_from_sdrf(
     ctx,
@@ -56,11 +106,57 @@ def openms_from_sdrf(
     verbose: bool,
     conditionsfromcolumns: str,
     extension_convert: str,
+    jobs: int,
+    batch: str,
+    output: str,
+    summary: str,
+    server: bool,
 ):
+    if batch is not None:
+        sdrf_files = find_sdrf_files(batch)
+        if not sdrf_files:
+            msg = f"No SDRF files found in {batch}"
+            logging.error(msg)
+            raise AppConfigException(msg)
+        results = convert_batch(
+            sdrf_files,
+            output,
+            jobs=jobs,
+            one_table=onetable,
+            legacy=legacy,
+            split_by_columns=conditionsfromcolumns,
+            extension_convert=extension_convert,
+        )
+        write_summary(results, summary, OPENMS_SUMMARY_COLUMNS)
+        counts = Counter(result["status"] for result in results)
+        print(
+            f"Converted {len(results)} files: {counts[CONVERTED]} converted, {counts[CONVERSION_FAILED]} failed. "
+            f"Summary written to {summary}"
+        )
+        sys.exit(counts[CONVERTED] != len(results))
+
     if sdrf is None:
         help()
+    if use_server(server) and not verbose and jobs is None:
+        # the server converts the file without loading the Unimod database again
+        response = forward(
+            "/convert-openms",
+            dict(
+                sdrf_file=os.path.abspath(sdrf),
+                output=os.getcwd(),
+                one_table=onetable,
+                legacy=legacy,
+                split_by_columns=conditionsfromcolumns,
+                extension_convert=extension_convert,
+            ),
+        )
+        if response is not None:
+            print(response["log"], end="")
+            if response["status"] != CONVERTED:
+                raise ValueError("Error: " + response["message"])
+            return
     try:
-        OpenMS().openms_convert(sdrf, onetable, legacy, verbose, conditionsfromcolumns, extension_convert)
+        OpenMS().openms_convert(sdrf, onetable, legacy, verbose, conditionsfromcolumns, extension_convert, jobs)
     except Exception as ex:
         msg = "Error: " + str(ex)
         raise ValueError(msg) from ex
@@ -148,6 +244,42 @@ def maxquant_from_sdrf(
 @click.option(
     "--use_ols_cache_only", help="Use ols cache for validation of the terms and not OLS internet service", is_flag=True
 )
+@click.option(
+    "--incremental",
+    help="Keep the validation results in a cache next to the SDRF (<sdrf_file>.validation-cache) and only validate "
+    "again the rows and columns that changed since the previous run",
+    is_flag=True,
+)
+@click.option(
+    "--batch",
+    "-b",
+    help="Validate many SDRF files: a folder (files ending with sdrf.tsv or .sdrf), a text file with one SDRF path "
+    "per line or a glob pattern",
+)
+@click.option("--jobs", "-j", help="Number of processes of a batch validation (default: number of CPUs)", type=int)
+@click.option(
+    "--summary",
+    help="Summary of a batch validation, one row per file (default: sdrf_validation_summary.tsv)",
+    default="sdrf_validation_summary.tsv",
+)
+@click.option(
+    "--report",
+    help="Write a report of the validation: the errors and the time spent in every phase of the validation",
+    type=click.Choice(REPORT_FORMATS, case_sensitive=False),
+)
+@click.option("--report_file", help="Report file (default: sdrf_validation_report.<report format>)")
+@click.option(
+    "--max_errors",
+    "--max-errors",
+    help="Stop the validation of a file after this number of errors, the remaining validations are skipped",
+    type=click.IntRange(min=1),
+)
+@click.option("--fail_fast", "--fail-fast", help="Stop the validation of a file at the first error", is_flag=True)
+@click.option(
+    "--server",
+    help="Validate the file on the running server (parse_sdrf serve, or $SDRF_PIPELINES_SERVER), not with --report",
+    is_flag=True,
+)
 @click.pass_context
 def validate_sdrf(
     ctx,
@@ -157,6 +289,15 @@ def validate_sdrf(
     skip_factor_validation: bool,
     skip_experimental_design_validation: bool,
     use_ols_cache_only: bool,
+    incremental: bool,
+    batch: str,
+    jobs: int,
+    summary: str,
+    report: str,
+    report_file: str,
+    max_errors: int,
+    fail_fast: bool,
+    server: bool,
 ):
     """
     Command to validate the SDRF file. The validation is based on the template provided by the user.
@@ -170,9 +311,18 @@ def validate_sdrf(
     @param skip_factor_validation: flag to skip the validation of factor values
     @param skip_experimental_design_validation: flag to skip the validation of experimental design
     @param use_ols_cache_only: flag to use the OLS cache for validation of the terms and not OLS internet service
+    @param incremental: flag to only validate the rows and columns that changed since the previous run
+    @param batch: folder, list file or glob pattern of the SDRF files of a batch validation
+    @param jobs: number of processes of a batch validation
+    @param summary: output file of the summary of a batch validation
+    @param report: format of the report of the validation (json, tsv or parquet)
+    @param report_file: output file of the report
+    @param max_errors: maximum number of errors of the validation of a file
+    @param fail_fast: flag to stop the validation of a file at the first error
+    @param server: flag to validate the file on the running server
     """
 
-    if sdrf_file is None:
+    if sdrf_file is None and batch is None:
         msg = "The config file for the pipeline is missing, please provide one "
         logging.error(msg)
         raise AppConfigException(msg)
@@ -180,21 +330,57 @@ def validate_sdrf(
     if template is None:
         template = DEFAULT_TEMPLATE
 
-    df = SdrfDataFrame.parse(sdrf_file)
-    errors = df.validate(template, use_ols_cache_only)
+    if fail_fast:
+        max_errors = 1
 
-    if not skip_ms_validation:
-        errors = errors + df.validate(MASS_SPECTROMETRY, use_ols_cache_only)
-
-    if not skip_factor_validation:
-        errors = errors + df.validate_factor_values()
-
-    if not skip_experimental_design_validation:
-        errors = errors + df.validate_experimental_design()
-
-    for error in errors:
-        print(error)
+    options = dict(
+        template=template,
+        skip_ms_validation=skip_ms_validation,
+        skip_factor_validation=skip_factor_validation,
+        skip_experimental_design_validation=skip_experimental_design_validation,
+        use_ols_cache_only=use_ols_cache_only,
+        incremental=incremental,
+    )
 
+    if batch is not None:
+        sdrf_files = find_sdrf_files(batch)
+        if not sdrf_files:
+            msg = f"No SDRF files found in {batch}"
+            logging.error(msg)
+            raise AppConfigException(msg)
+        results = validate_batch(sdrf_files, jobs=jobs, max_errors=max_errors, **options)
+        write_summary(results, summary)
+        counts = Counter(result["status"] for result in results)
+        print(
+            f"Validated {len(results)} files: {counts[VALID]} valid, {counts[INVALID]} with validation errors, "
+            f"{counts[FAILED]} failed. Summary written to {summary}"
+        )
+        sys.exit(counts[VALID] != len(results))
+
+    response = None
+    if use_server(server) and report is None:
+        # the server validates the file with the ontologies and templates already loaded
+        response = forward("/validate", dict(options, sdrf_file=os.path.abspath(sdrf_file), max_errors=max_errors))
+    if response is None:
+        profile = ValidationProfile() if report is not None else None
+        budget = ErrorBudget(max_errors) if max_errors is not None else None
+        errors = validate_file(sdrf_file, profile=profile, budget=budget, **options)
+        if report is not None:
+            report = report.lower()
+            write_report(report_file or f"sdrf_validation_report.{report}", report, sdrf_file, errors, profile)
+        response = validation_response(sdrf_file, errors, budget)
+
+    for message in response["messages"]:
+        print(message)
+
+    if response["exhausted"]:
+        counts = ", ".join(f"{code}: {count}" for code, count in response["counts"])
+        print(
+            f"The validation stopped after {response['max_errors']} errors, {response['skipped']} validations were "
+            f"skipped. Errors and warnings found per validator: {counts}"
+        )
+
+    errors = response["messages"]
     # provide some info to the user, as no info is confusing
     if not errors:
         print("Everything seems to be fine. Well done.")
@@ -207,33 +393,26 @@ def validate_sdrf(
 @click.option("--sdrf_file", "-s", help="SDRF file to be splited", required=True)
 @click.option("--attribute", "-a", help="property to split, Multiple attributes are separated by commas", required=True)
 @click.option("--prefix", "-p", help="file prefix to be added to the sdrf file name")
+@click.option("--jobs", "-j", help="Number of threads writing the files (default: number of CPUs)", type=int)
+@click.option(
+    "--max_open_files",
+    help=f"Maximum number of files open at once (default: {DEFAULT_MAX_OPEN_FILES})",
+    default=DEFAULT_MAX_OPEN_FILES,
+    type=int,
+)
 @click.pass_context
-def split_sdrf(ctx, sdrf_file: str, attribute: str, prefix: str):
-    pattern = re.compile(r"\]\.\d+\t")
-    df = pd.read_csv(sdrf_file, sep="\t", skip_blank_lines=False)
-    attributes = attribute.split(",")
-    d = dict(tuple(df.groupby(attributes)))
-    for key in d:
-        dataframe = d[key]
-        file_name = os.path.split(sdrf_file)[-1]
-        Path = os.path.split(sdrf_file)[0] + "/"
-        if prefix is None:
-            if len(file_name.split(".")) > 2:
-                prefix = ".".join(file_name.split(".")[:-2])
-            else:
-                prefix = file_name.split(".")[0]
-        if isinstance(key, tuple):
-            new_file = prefix + "-" + "-".join(key).replace(" ", "_") + ".sdrf.tsv"
-        else:
-            new_file = prefix + "-" + key.replace(" ", "_") + ".sdrf.tsv"
-        dataframe.to_csv(Path + new_file, sep="\t", quoting=csv.QUOTE_NONE, index=False)
-
-        # Handling duplicate column names
-        with open(Path + new_file, "r+") as f:
-            data = f.read()
-        data = pattern.sub("]\t", data)
-        with open(Path + new_file, "w") as f:
-            f.write(data)
+def split_sdrf(ctx, sdrf_file: str, attribute: str, prefix: str, jobs: int, max_open_files: int):
+    """
+    Split an SDRF file into one file per value of the given columns, the progress is written to the standard error.
+    """
+    split_sdrf_file(
+        sdrf_file,
+        attribute.split(","),
+        prefix,
+        max_open_files=max_open_files,
+        jobs=jobs,
+        progress=lambda status: click.echo(f"Split {status}", err=True),
+    )
 
 
 @click.command("convert-msstats", short_help="convert sdrf to msstats annotation file")
@@ -265,6 +444,55 @@ def normalyzerde_from_sdrf(ctx, sdrf, conditionsfromcolumns, outpath, outpathcom
     )
 
 
+@click.command("snapshot-sdrf", short_help="Write a binary snapshot of the sdrf file for fast reloads")
+@click.option("--sdrf_file", "-s", help="SDRF file", required=True)
+@click.option("--snapshot", "-o", help="Snapshot file (default: the SDRF file with the .sdrf.arrow extension)")
+@click.pass_context
+def snapshot_sdrf(ctx, sdrf_file: str, snapshot: str):
+    """
+    Write an Arrow IPC snapshot of an SDRF file. Every command accepts the snapshot in place of the SDRF file.
+
+    @param sdrf_file: SDRF file
+    @param snapshot: output snapshot file
+    """
+    snapshot = write_snapshot(sdrf_file, snapshot)
+    print(f"Snapshot of {sdrf_file} written to {snapshot}")
+
+
+@click.command("serve", short_help="Run a local service of validations and conversions with the resources loaded")
+@click.option("--host", help=f"Address of the service (default: {DEFAULT_HOST})", default=DEFAULT_HOST)
+@click.option(
+    "--port", "-p", help=f"Port of the service, 0 picks a free port (default: {DEFAULT_PORT})", default=DEFAULT_PORT
+)
+@click.option("--jobs", "-j", help="Number of requests run in parallel (default: number of CPUs)", type=int)
+@click.option(
+    "--allow-remote",
+    help="Listen on a --host other than the loopback interface, the requests can then read and write the files of "
+    "this user from other machines",
+    is_flag=True,
+)
+@click.pass_context
+def serve_sdrf(ctx, host: str, port: int, jobs: int, allow_remote: bool):
+    """
+    Run an HTTP service that keeps the ontology indexes, the templates and the Unimod database loaded, and validates
+    and converts SDRF files in a pool of processes. The requests must carry the token of the service, written with its
+    address to server.json in the cache folder. validate-sdrf and convert-openms forward their requests to the running
+    service with --server, or when SDRF_PIPELINES_SERVER is set to its address.
+
+    @param host: address of the service
+    @param port: port of the service
+    @param jobs: number of worker processes
+    @param allow_remote: flag to listen on an address other than the loopback interface
+    """
+    serve(
+        host,
+        port,
+        jobs,
+        ready=lambda server: print(f"Serving on {server.url} with {server.jobs} workers", flush=True),
+        allow_remote=allow_remote,
+    )
+
+
 @click.command("build-index-ontology", short_help="Convert an ontology file to an index file")
 @click.option("--ontology", "-in", help="ontology file")
 @click.option("--index", "-out", help="Output file in parquet format")
@@ -286,6 +514,8 @@ cli.add_command(split_sdrf)
 cli.add_command(msstats_from_sdrf)
 cli.add_command(normalyzerde_from_sdrf)
 cli.add_command(build_index_ontology)
+cli.add_command(snapshot_sdrf)
+cli.add_command(serve_sdrf)
 
 
 def main():
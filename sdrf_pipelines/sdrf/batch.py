@@ -0,0 +1,195 @@
+"""
+Validation of SDRF files, one file or a batch of files.
+
+A batch is validated in a pool of worker processes. Every worker creates the OLS client and loads the templates once,
+and keeps the memo of the ontology lookups (:data:`~sdrf_pipelines.sdrf.sdrf_schema.ontology_lookup`) for all the files
+it validates. The result of the batch is a summary with one row per file.
+"""
+
+import csv
+import glob
+import logging
+import os
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from sdrf_pipelines import __version__
+from sdrf_pipelines.sdrf.errors import ErrorTable
+from sdrf_pipelines.sdrf.incremental import COLUMN_VALUES
+from sdrf_pipelines.sdrf.incremental import ONTOLOGY_LOOKUPS
+from sdrf_pipelines.sdrf.incremental import PARSE
+from sdrf_pipelines.sdrf.incremental import ErrorBudget
+from sdrf_pipelines.sdrf.incremental import ValidationProfile
+from sdrf_pipelines.sdrf.incremental import get_cache_file
+from sdrf_pipelines.sdrf.sdrf import SdrfDataFrame
+from sdrf_pipelines.sdrf.sdrf_schema import DEFAULT_TEMPLATE
+from sdrf_pipelines.sdrf.sdrf_schema import MASS_SPECTROMETRY
+from sdrf_pipelines.sdrf.sdrf_schema import get_ols_client
+from sdrf_pipelines.sdrf.sdrf_schema import ontology_lookup
+from sdrf_pipelines.sdrf.snapshot import SNAPSHOT_SUFFIX
+from sdrf_pipelines.sdrf.templates import load_schemas
+from sdrf_pipelines.sdrf.templates import template_digest
+
+logger = logging.getLogger(__name__)
+
+SDRF_SUFFIXES = ("sdrf.tsv", ".sdrf", SNAPSHOT_SUFFIX)
+SUMMARY_COLUMNS = ["file", "status", "errors", "warnings", "seconds", "message"]
+VALID = "valid"
+INVALID = "invalid"
+FAILED = "failed"
+
+
+def find_sdrf_files(batch: str) -> typing.List[str]:
+    """
+    Return the SDRF files of a batch.
+    :param batch: a folder (every file ending with sdrf.tsv, .sdrf or .sdrf.arrow in it, recursively), a text file
+        with one SDRF path per line (relative paths are relative to the text file) or a glob pattern
+    """
+    if os.path.isdir(batch):
+        files = []
+        for root, _, names in os.walk(batch):
+            files.extend(os.path.join(root, name) for name in names if name.lower().endswith(SDRF_SUFFIXES))
+    elif os.path.isfile(batch):
+        directory = os.path.dirname(batch)
+        with open(batch, encoding="utf-8") as fh:
+            lines = [line.strip() for line in fh]
+        files = [os.path.join(directory, line) for line in lines if line and not line.startswith("#")]
+    else:
+        files = glob.glob(batch, recursive=True)
+    return sorted(files)
+
+
+def validate_file(
+    sdrf_file: str,
+    template: str = DEFAULT_TEMPLATE,
+    skip_ms_validation: bool = False,
+    skip_factor_validation: bool = False,
+    skip_experimental_design_validation: bool = False,
+    use_ols_cache_only: bool = False,
+    incremental: bool = False,
+    profile: ValidationProfile = None,
+    budget: ErrorBudget = None,
+) -> ErrorTable:
+    """
+    Validate an SDRF file.
+    :param sdrf_file: SDRF file to be validated
+    :param template: template to be used for the validation
+    :param skip_ms_validation: do not validate the mass spectrometry fields
+    :param skip_factor_validation: do not validate the factor values
+    :param skip_experimental_design_validation: do not validate the experimental design
+    :param use_ols_cache_only: look up the ontology terms in the local cache only
+    :param incremental: only validate the rows and columns that changed since the previous run
+    :param profile: if given, the time and number of errors of every phase are added to it
+    :param budget: if given, the validation stops once the budget is exhausted, e.g. before the ontology lookups
+    """
+    start = time.perf_counter()
+    df = SdrfDataFrame.parse(sdrf_file)
+    if profile is not None:
+        profile.add(PARSE, time.perf_counter() - start)
+    plan = df.validation_plan(
+        template,
+        skip_ms_validation=skip_ms_validation,
+        skip_factor_validation=skip_factor_validation,
+        skip_experimental_design_validation=skip_experimental_design_validation,
+        use_ols_cache_only=use_ols_cache_only,
+    )
+    lookups = (ontology_lookup.hits, ontology_lookup.misses, ontology_lookup.seconds)
+    if not incremental:
+        errors = plan.run(df, profile, budget)
+    else:
+        # anything that changes the validation other than the content of the SDRF invalidates the cache
+        templates = [template] if skip_ms_validation else [template, MASS_SPECTROMETRY]
+        key = (
+            __version__,
+            [template_digest(name) for name in templates],
+            skip_ms_validation,
+            skip_factor_validation,
+            skip_experimental_design_validation,
+            use_ols_cache_only,
+        )
+        errors = plan.run_incremental(df, get_cache_file(sdrf_file), key, profile, budget)
+
+    if profile is not None:
+        # the ontology lookups are done by the column validations, their time is reported apart
+        lookup_seconds = ontology_lookup.seconds - lookups[2]
+        profile.add(ONTOLOGY_LOOKUPS, lookup_seconds)
+        profile.add(COLUMN_VALUES, -lookup_seconds)
+        profile.ontology_hits += ontology_lookup.hits - lookups[0]
+        profile.ontology_misses += ontology_lookup.misses - lookups[1]
+    return errors
+
+
+def summarize(sdrf_file: str, max_errors: int = None, **options) -> dict:
+    """
+    Validate an SDRF file and return its row of the batch summary. Exceptions are reported as failed files.
+    :param sdrf_file: SDRF file to be validated
+    :param max_errors: if given, the validation of the file stops after this number of errors
+    :param options: options of :func:`validate_file`
+    """
+    start = time.perf_counter()
+    try:
+        budget = ErrorBudget(max_errors) if max_errors is not None else None
+        errors = validate_file(sdrf_file, budget=budget, **options)
+    except Exception as ex:
+        logger.debug("Validation of %s failed", sdrf_file, exc_info=True)
+        status, n_errors, n_warnings, message = FAILED, 0, 0, f"{type(ex).__name__}: {ex}"
+    else:
+        n_errors = int((errors.level >= logging.ERROR).sum())
+        n_warnings = len(errors) - n_errors
+        status = INVALID if errors else VALID
+        message = errors.get_message(0) if errors else ""
+    return {
+        "file": sdrf_file,
+        "status": status,
+        "errors": n_errors,
+        "warnings": n_warnings,
+        "seconds": round(time.perf_counter() - start, 3),
+        "message": message,
+    }
+
+
+def _init_worker(templates: typing.List[str]):
+    """
+    Create the OLS client and load the templates once per worker process.
+    """
+    get_ols_client()
+    for template in templates:
+        load_schemas(template)
+
+
+def validate_batch(sdrf_files: typing.List[str], jobs: int = None, **options) -> typing.List[dict]:
+    """
+    Validate SDRF files in a pool of processes.
+    :param sdrf_files: SDRF files to be validated
+    :param jobs: number of worker processes, the number of CPUs by default, 1 validates in this process
+    :param options: options of :func:`summarize`
+    :return: the summary, one row per file in the order of the files
+    """
+    jobs = jobs or os.cpu_count() or 1
+    validate = partial(summarize, **options)
+    templates = [options.get("template", DEFAULT_TEMPLATE)]
+    if not options.get("skip_ms_validation", False):
+        templates.append(MASS_SPECTROMETRY)
+    jobs = min(jobs, len(sdrf_files))
+    if jobs <= 1:
+        return [validate(sdrf_file) for sdrf_file in sdrf_files]
+
+    # files are sent to the workers in chunks, so that small files do not wait for the inter-process round trips
+    chunksize = max(1, min(16, len(sdrf_files) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(templates,)) as executor:
+        return list(executor.map(validate, sdrf_files, chunksize=chunksize))
+
+
+def write_summary(summary: typing.List[dict], output: str, columns: typing.List[str] = None):
+    """
+    Write the batch summary as a tab separated file.
+    :param summary: rows of the summary
+    :param output: output file
+    :param columns: columns of the summary, the ones of the validation by default
+    """
+    with open(output, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=columns or SUMMARY_COLUMNS, delimiter="\t", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(summary)
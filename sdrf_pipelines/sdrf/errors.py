@@ -0,0 +1,172 @@
+"""
+Columnar storage of validation errors.
+
+The validation rules report their errors as arrays (row, column, value, code, level, message) instead of creating
+one object per failing cell. :class:`LogicError` objects are only created when the errors are iterated, e.g. to print
+them.
+"""
+
+import logging
+import typing
+
+import numpy as np
+import pandas as pd
+
+from sdrf_pipelines.utils.exceptions import LogicError
+
+EMPTY_CELL = "empty_cell"
+
+# Messages that depend on the cell are formatted only when the error is materialized
+MESSAGE_TEMPLATES = {EMPTY_CELL: "Empty value found Row: {row}, Column: {column}"}
+
+
+def _object_array(values, size: int) -> np.ndarray:
+    """
+    Convert values to an object array of the given size, scalars are repeated.
+    """
+    if values is None or isinstance(values, str) or np.isscalar(values):
+        array = np.empty(size, dtype=object)
+        array[:] = [values] * size if size else []
+        return array
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+
+class ErrorTable:
+    """
+    Validation errors stored column-wise. Every error has a row (-1 when the error is not about a cell), a column,
+    the failing value, the code of the rule that failed, a logging level and a message (None when the message is
+    built from the template of the code).
+    """
+
+    def __init__(self, row=None, column=None, value=None, code=None, level=logging.ERROR, message=None):
+        self.row = np.asarray(row if row is not None else [], dtype=np.int64).reshape(-1)
+        size = len(self.row)
+        self.column = _object_array(column, size)
+        self.value = _object_array(value, size)
+        self.code = _object_array(code, size)
+        self.level = np.broadcast_to(np.asarray(level, dtype=np.int64), (size,)).copy()
+        self.message = _object_array(message, size)
+
+    @classmethod
+    def single(cls, message: str, code: str, level=logging.ERROR, column: str = None) -> "ErrorTable":
+        """
+        Create a table with a single error that is not about a cell.
+        :param message: message of the error
+        :param code: code of the rule that failed
+        :param level: logging level of the error
+        :param column: column the error is about, if any
+        """
+        return cls([-1], column=column, code=code, level=level, message=message)
+
+    @classmethod
+    def concat(cls, tables: typing.Iterable["ErrorTable"]) -> "ErrorTable":
+        """
+        Concatenate error tables, keeping the order of the errors.
+        """
+        tables = list(tables)
+        result = cls()
+        if not tables:
+            return result
+        result.row = np.concatenate([t.row for t in tables])
+        result.column = np.concatenate([t.column for t in tables])
+        result.value = np.concatenate([t.value for t in tables])
+        result.code = np.concatenate([t.code for t in tables])
+        result.level = np.concatenate([t.level for t in tables])
+        result.message = np.concatenate([t.message for t in tables])
+        return result
+
+    @classmethod
+    def from_logic_errors(cls, errors: typing.Iterable[LogicError], code: str = None) -> "ErrorTable":
+        """
+        Convert a list of LogicError into an error table.
+        """
+        errors = list(errors)
+        return cls(
+            row=[-1 if e.row is None else e.row for e in errors],
+            column=[e.column for e in errors],
+            value=[e.value for e in errors],
+            code=code,
+            level=[logging.ERROR if e.error_type is None else e.error_type for e in errors],
+            message=[e.message for e in errors],
+        )
+
+    def take(self, positions) -> "ErrorTable":
+        """
+        Return the errors at the given positions.
+        """
+        result = ErrorTable()
+        result.row = self.row[positions]
+        result.column = self.column[positions]
+        result.value = self.value[positions]
+        result.code = self.code[positions]
+        result.level = self.level[positions]
+        result.message = self.message[positions]
+        return result
+
+    def sort_by_row(self) -> "ErrorTable":
+        """
+        Return the errors sorted by row, errors of the same row keep their order.
+        """
+        return self.take(np.argsort(self.row, kind="stable"))
+
+    def get_message(self, position: int) -> str:
+        message = self.message[position]
+        if message is None:
+            message = MESSAGE_TEMPLATES[self.code[position]].format(
+                row=self.row[position], column=self.column[position], value=self.value[position]
+            )
+        return message
+
+    def to_logic_error(self, position: int) -> LogicError:
+        row = int(self.row[position])
+        return LogicError(
+            self.get_message(position),
+            value=self.value[position],
+            row=row,
+            column=self.column[position],
+            error_type=int(self.level[position]),
+        )
+
+    def to_logic_errors(self) -> typing.List[LogicError]:
+        return list(self)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Return the errors as a data frame with one row per error, the row is missing for errors that are not about
+        a cell.
+        """
+        return pd.DataFrame(
+            {
+                "row": pd.Series(self.row).where(self.row >= 0).astype("Int64"),
+                "column": self.column,
+                "value": self.value,
+                "level": [logging.getLevelName(level) for level in self.level],
+                "validator": self.code,
+                "message": [self.get_message(i) for i in range(len(self))],
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> typing.Iterator[LogicError]:
+        for position in range(len(self)):
+            yield self.to_logic_error(position)
+
+    def __getitem__(self, position: int) -> LogicError:
+        return self.to_logic_error(range(len(self))[position])
+
+    def __add__(self, other) -> "ErrorTable":
+        if not isinstance(other, ErrorTable):
+            other = ErrorTable.from_logic_errors(other)
+        return ErrorTable.concat([self, other])
+
+    def __radd__(self, other) -> "ErrorTable":
+        if not isinstance(other, ErrorTable):
+            other = ErrorTable.from_logic_errors(other)
+        return ErrorTable.concat([other, self])
@@ -0,0 +1,433 @@
+"""
+Validation plans and incremental re-validation of SDRF files.
+
+A validation is split into units, each one declaring what it reads:
+
+- ``HEADER`` units only depend on the column names (mandatory columns, column order, factor value lookup...).
+- ``CELLS`` units are row-local: the errors of a row only depend on the values of that row in the unit columns
+  (column rules, empty cells).
+- ``COLUMNS`` units are cross-row checks that depend on every row of the unit columns (factor values, experimental
+  design).
+
+Units are grouped in steps, the errors of a step are the errors of its units in order, optionally sorted by row.
+A validation can be given an error budget (:class:`ErrorBudget`): once enough errors are found the remaining units,
+e.g. the ontology lookups, are skipped.
+
+For the incremental mode the plan stores a hash of every row and of every column of the parsed SDRF, together with
+the errors of every unit, in a sidecar cache file. On the next run only the changed rows of the row-local units
+that read a changed column, and the cross-row units that read a changed column, are validated again. The sidecar
+travels with the SDRF, so it holds data only: an npz archive of numeric arrays and a JSON document, read without
+unpickling anything.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import typing
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from sdrf_pipelines.sdrf.errors import ErrorTable
+
+logger = logging.getLogger(__name__)
+
+HEADER = "header"
+CELLS = "cells"
+COLUMNS = "columns"
+
+# Phases of a validation, for the timings of the report
+PARSE = "parse"
+EMPTY_CELLS = "empty_cells"
+COLUMN_NAMES = "column_names"
+COLUMN_VALUES = "column_values"
+ONTOLOGY_LOOKUPS = "ontology_lookups"
+FACTOR_VALUES = "factor_values"
+EXPERIMENTAL_DESIGN = "experimental_design"
+PHASES = [PARSE, EMPTY_CELLS, COLUMN_NAMES, COLUMN_VALUES, ONTOLOGY_LOOKUPS, FACTOR_VALUES, EXPERIMENTAL_DESIGN]
+
+CACHE_SUFFIX = ".validation-cache"
+CACHE_FORMAT = 2
+_ROW_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+
+
+class ValidationUnit:
+    """
+    Part of a validation that can be cached on its own.
+    :param run: function receiving the SDRF and returning an ErrorTable
+    :param kind: what the errors depend on, HEADER, CELLS or COLUMNS
+    :param columns: columns read by CELLS and COLUMNS units, None for every column
+    :param phase: phase of the validation the unit belongs to
+    """
+
+    def __init__(
+        self,
+        run: typing.Callable[[pd.DataFrame], ErrorTable],
+        kind: str = HEADER,
+        columns=None,
+        phase: str = COLUMN_NAMES,
+    ):
+        self.run = run
+        self.kind = kind
+        self.columns = None if columns is None else list(columns)
+        self.phase = phase
+
+    def evaluate(self, sdrf: pd.DataFrame, profile: "ValidationProfile" = None) -> ErrorTable:
+        start = time.perf_counter()
+        errors = self.run(sdrf)
+        # row-local errors are kept in row order, so the errors of changed rows can be merged back
+        if self.kind == CELLS:
+            errors = errors.sort_by_row()
+        if profile is not None:
+            profile.add(self.phase, time.perf_counter() - start)
+        return errors
+
+    def reads(self, columns: typing.Set[str]) -> bool:
+        """
+        Return True if the unit reads any of the given columns.
+        """
+        if not columns:
+            return False
+        return self.columns is None or any(column in columns for column in self.columns)
+
+
+class ValidationProfile:
+    """
+    Wall time and number of errors of every phase of a validation, and the statistics of the ontology lookups.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.errors = dict.fromkeys(PHASES, 0)
+        self.ontology_hits = 0
+        self.ontology_misses = 0
+
+    def add(self, phase: str, seconds: float = 0.0, errors: int = 0):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.errors[phase] = self.errors.get(phase, 0) + errors
+
+    def to_records(self) -> typing.List[dict]:
+        """
+        Return one record (phase, seconds, errors, hits, misses) per phase, hits and misses are only set for the
+        ontology lookups.
+        """
+        records = []
+        for phase, seconds in self.seconds.items():
+            record = {"phase": phase, "seconds": round(seconds, 6), "errors": self.errors[phase]}
+            record["hits"] = self.ontology_hits if phase == ONTOLOGY_LOOKUPS else None
+            record["misses"] = self.ontology_misses if phase == ONTOLOGY_LOOKUPS else None
+            records.append(record)
+        return records
+
+
+class ErrorBudget:
+    """
+    Maximum number of errors (warnings are not counted) of a validation. Once the budget is exhausted the units that
+    are left are not evaluated and the errors are truncated to the budget.
+    :param max_errors: maximum number of errors
+    """
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.errors = 0
+        self.skipped = 0
+        self.counts = Counter()
+
+    @property
+    def exhausted(self) -> bool:
+        return self.errors >= self.max_errors
+
+    def spend(self, errors: ErrorTable):
+        """
+        Count the errors of an evaluated unit, and the errors and warnings found by every validator.
+        """
+        self.errors += int((errors.level >= logging.ERROR).sum())
+        self.counts.update(errors.code.tolist())
+
+    def truncate(self, errors: ErrorTable) -> ErrorTable:
+        """
+        Return the errors (and the warnings between them) up to the budget.
+        """
+        is_error = errors.level >= logging.ERROR
+        return errors.take(np.flatnonzero(np.cumsum(is_error) - is_error < self.max_errors))
+
+
+class ValidationStep:
+    """
+    Units whose errors are reported together, sorted by row if ``sort_by_row``.
+    """
+
+    def __init__(self, units: typing.Iterable[ValidationUnit], sort_by_row: bool = False):
+        self.units = list(units)
+        self.sort_by_row = sort_by_row
+
+
+class ValidationPlan:
+    """
+    Ordered validation steps of an SDRF.
+    """
+
+    def __init__(self, steps: typing.Iterable[ValidationStep] = None):
+        self.steps = list(steps) if steps is not None else []
+
+    def __add__(self, other: "ValidationPlan") -> "ValidationPlan":
+        return ValidationPlan(self.steps + other.steps)
+
+    @property
+    def units(self) -> typing.List[ValidationUnit]:
+        return [unit for step in self.steps for unit in step.units]
+
+    def _assemble(self, results: typing.List[ErrorTable], budget: ErrorBudget = None) -> ErrorTable:
+        errors = []
+        results = iter(results)
+        for step in self.steps:
+            # units skipped by the error budget have no result
+            step_results = [next(results) for _ in step.units]
+            step_errors = ErrorTable.concat([result for result in step_results if result is not None])
+            errors.append(step_errors.sort_by_row() if step.sort_by_row else step_errors)
+        errors = ErrorTable.concat(errors)
+        return errors if budget is None else budget.truncate(errors)
+
+    def _count_errors(self, results: typing.List[ErrorTable], profile: ValidationProfile = None):
+        if profile is not None:
+            for unit, errors in zip(self.units, results):
+                if errors is not None:
+                    profile.add(unit.phase, errors=len(errors))
+
+    @staticmethod
+    def _evaluate(
+        unit: ValidationUnit, sdrf: pd.DataFrame, profile: ValidationProfile = None, budget: ErrorBudget = None
+    ) -> typing.Optional[ErrorTable]:
+        if budget is None:
+            return unit.evaluate(sdrf, profile)
+        if budget.exhausted:
+            budget.skipped += 1
+            return None
+        errors = unit.evaluate(sdrf, profile)
+        budget.spend(errors)
+        return errors
+
+    def run(self, sdrf: pd.DataFrame, profile: ValidationProfile = None, budget: ErrorBudget = None) -> ErrorTable:
+        """
+        Validate the whole SDRF.
+        :param sdrf: parsed SDRF
+        :param profile: if given, the time and number of errors of every phase are added to it
+        :param budget: if given, the validation stops once the budget is exhausted
+        """
+        results = [self._evaluate(unit, sdrf, profile, budget) for unit in self.units]
+        self._count_errors(results, profile)
+        return self._assemble(results, budget)
+
+    def run_incremental(
+        self,
+        sdrf: pd.DataFrame,
+        cache_file: str,
+        key=None,
+        profile: ValidationProfile = None,
+        budget: ErrorBudget = None,
+    ) -> ErrorTable:
+        """
+        Validate the SDRF, reusing the errors stored in the cache file for the rows and columns that did not change
+        since the previous run. The cache is updated with the new errors, unless units were skipped by the budget.
+        :param sdrf: parsed SDRF
+        :param cache_file: sidecar cache file
+        :param key: anything that changes the validation (options, templates...), the cache is not used if it differs
+        :param profile: if given, the time and number of errors of every phase are added to it
+        :param budget: if given, the validation stops once the budget is exhausted
+        """
+        row_hashes, column_hashes = content_hashes(sdrf)
+        cache = read_cache(cache_file)
+        units = self.units
+        columns = list(sdrf.columns)
+
+        if (
+            cache is None
+            or cache["key"] != _json_key(key)
+            or cache["columns"] != columns
+            or len(cache["results"]) != len(units)
+            or not _same_prefix(cache["index"], sdrf.index.to_numpy())
+        ):
+            results = [self._evaluate(unit, sdrf, profile, budget) for unit in units]
+        else:
+            common = min(len(cache["row_hashes"]), len(row_hashes))
+            changed_positions = np.concatenate(
+                [
+                    np.flatnonzero(cache["row_hashes"][:common] != row_hashes[:common]),
+                    np.arange(common, len(row_hashes)),
+                ]
+            )
+            changed_columns = {
+                column for column, old, new in zip(columns, cache["column_hashes"], column_hashes) if old != new
+            }
+            same_rows = len(cache["row_hashes"]) == len(row_hashes)
+            logger.info("%s rows and %s columns changed", len(changed_positions), len(changed_columns))
+
+            subset = None
+            results = []
+            for unit, cached in zip(units, cache["results"]):
+                if budget is not None and budget.exhausted:
+                    budget.skipped += 1
+                    results.append(None)
+                elif unit.kind == HEADER or (same_rows and not unit.reads(changed_columns)):
+                    if budget is not None:
+                        budget.spend(cached)
+                    results.append(cached)
+                elif unit.kind == COLUMNS:
+                    results.append(self._evaluate(unit, sdrf, profile, budget))
+                else:
+                    if subset is None:
+                        subset = take_rows(sdrf, changed_positions)
+                    # errors of the unchanged rows are kept, the changed rows are validated again
+                    unchanged = np.delete(sdrf.index.to_numpy(), changed_positions)
+                    kept = cached.take(np.flatnonzero(np.isin(cached.row, unchanged)))
+                    if budget is not None:
+                        budget.spend(kept)
+                    changed = self._evaluate(unit, subset, profile, budget)
+                    results.append(None if changed is None else ErrorTable.concat([kept, changed]).sort_by_row())
+
+        self._count_errors(results, profile)
+        if any(errors is None for errors in results):
+            # the cache needs the errors of every unit
+            return self._assemble(results, budget)
+        write_cache(
+            cache_file,
+            {
+                "format": CACHE_FORMAT,
+                "key": _json_key(key),
+                "columns": columns,
+                "index": sdrf.index.to_numpy(),
+                "row_hashes": row_hashes,
+                "column_hashes": column_hashes,
+                "results": results,
+            },
+        )
+        return self._assemble(results, budget)
+
+
+def _same_prefix(old: np.ndarray, new: np.ndarray) -> bool:
+    common = min(len(old), len(new))
+    return np.array_equal(old[:common], new[:common])
+
+
+def content_hashes(sdrf: pd.DataFrame) -> typing.Tuple[np.ndarray, typing.List[bytes]]:
+    """
+    Hash the content of the SDRF.
+    :return: tuple (one hash per row, one hash per column)
+    """
+    row_hashes = np.zeros(len(sdrf), dtype=np.uint64)
+    column_hashes = []
+    for i in range(sdrf.shape[1]):
+        # categorical and object columns with the same values have the same hashes
+        cell_hashes = pd.util.hash_pandas_object(sdrf.iloc[:, i], index=False).to_numpy()
+        column_hashes.append(hashlib.blake2b(cell_hashes.tobytes(), digest_size=16).digest())
+        row_hashes = row_hashes * _ROW_HASH_MULTIPLIER + cell_hashes
+    return row_hashes, column_hashes
+
+
+def take_rows(sdrf: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    """
+    Return the rows at the given positions, keeping the index. Categories that are not used by these rows are
+    removed, so the column rules only look at the values of the rows.
+    """
+    subset = sdrf.iloc[positions]
+    for i in range(subset.shape[1]):
+        column = subset.iloc[:, i]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            subset.isetitem(i, column.cat.remove_unused_categories())
+    return subset
+
+
+def get_cache_file(sdrf_file: str) -> str:
+    """
+    Return the sidecar cache file of an SDRF file.
+    """
+    return sdrf_file + CACHE_SUFFIX
+
+
+def _json_key(key) -> str:
+    return json.dumps(key, default=str)
+
+
+def _json_value(value):
+    # numpy scalars are stored as the equivalent Python values, anything else as text
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def read_cache(cache_file: str) -> typing.Optional[dict]:
+    """
+    Read a sidecar cache file, None if there is none or it cannot be used.
+    """
+    try:
+        with np.load(cache_file, allow_pickle=False) as archive:
+            meta = json.loads(archive["meta"].tobytes().decode("utf-8"))
+            if not isinstance(meta, dict) or meta.get("format") != CACHE_FORMAT:
+                return None
+            arrays = {name: archive[name] for name in ("index", "row_hashes", "error_unit", "error_row", "error_level")}
+        results = []
+        for unit, errors in enumerate(meta["errors"]):
+            positions = np.flatnonzero(arrays["error_unit"] == unit)
+            results.append(
+                ErrorTable(
+                    row=arrays["error_row"][positions],
+                    column=errors["column"],
+                    value=errors["value"],
+                    code=errors["code"],
+                    level=arrays["error_level"][positions],
+                    message=errors["message"],
+                )
+            )
+        return {
+            "format": meta["format"],
+            "key": meta["key"],
+            "columns": meta["columns"],
+            "index": arrays["index"],
+            "row_hashes": arrays["row_hashes"],
+            "column_hashes": [bytes.fromhex(digest) for digest in meta["column_hashes"]],
+            "results": results,
+        }
+    except FileNotFoundError:
+        return None
+    except Exception as ex:  # a corrupted or incompatible cache is ignored
+        logger.warning("Ignoring the validation cache %s: %s", cache_file, ex)
+        return None
+
+
+def write_cache(cache_file: str, cache: dict):
+    """
+    Write a sidecar cache file: the arrays in an npz archive, the column names, the key and the text of the errors in
+    a JSON document stored in the archive.
+    """
+    if cache["index"].dtype == object:
+        # only numeric row labels are stored
+        return
+    results = cache["results"]
+    meta = {
+        "format": cache["format"],
+        "key": cache["key"],
+        "columns": cache["columns"],
+        "column_hashes": [digest.hex() for digest in cache["column_hashes"]],
+        "errors": [
+            {name: getattr(errors, name).tolist() for name in ("column", "value", "code", "message")}
+            for errors in results
+        ],
+    }
+    directory = os.path.dirname(os.path.abspath(cache_file))
+    try:
+        meta = json.dumps(meta, default=_json_value).encode("utf-8")
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as fh:
+            np.savez(
+                fh,
+                meta=np.frombuffer(meta, dtype=np.uint8),
+                index=cache["index"],
+                row_hashes=cache["row_hashes"],
+                error_unit=np.repeat(np.arange(len(results), dtype=np.int64), [len(errors) for errors in results]),
+                error_row=np.concatenate([errors.row for errors in results] + [np.empty(0, dtype=np.int64)]),
+                error_level=np.concatenate([errors.level for errors in results] + [np.empty(0, dtype=np.int64)]),
+            )
+        os.replace(fh.name, cache_file)
+    except (OSError, TypeError, ValueError) as ex:
+        logger.warning("The validation cache could not be written to %s: %s", cache_file, ex)
@@ -0,0 +1,77 @@
+"""
+Machine-readable reports of a validation: the errors (row, column, value, level, validator, message) and the wall time
+and number of errors of every phase of the validation.
+
+The JSON report contains both in one document. The TSV and parquet reports write the errors to the report file and
+the phases to a second file with the ``_phases`` suffix (e.g. ``report.tsv`` and ``report_phases.tsv``).
+"""
+
+import json
+import logging
+import os
+import typing
+
+import pandas as pd
+
+from sdrf_pipelines.sdrf.errors import ErrorTable
+from sdrf_pipelines.sdrf.incremental import ValidationProfile
+
+JSON = "json"
+TSV = "tsv"
+PARQUET = "parquet"
+REPORT_FORMATS = [JSON, TSV, PARQUET]
+
+
+def error_records(errors: ErrorTable) -> typing.List[dict]:
+    """
+    Return the errors as JSON serializable records, the row is None for the errors that are not about a cell.
+    """
+    records = []
+    for position in range(len(errors)):
+        row = int(errors.row[position])
+        records.append(
+            {
+                "row": row if row >= 0 else None,
+                "column": errors.column[position],
+                "value": errors.value[position],
+                "level": logging.getLevelName(int(errors.level[position])),
+                "validator": errors.code[position],
+                "message": errors.get_message(position),
+            }
+        )
+    return records
+
+
+def get_phases_file(output: str) -> str:
+    """
+    Return the file of the phases of a TSV or parquet report.
+    """
+    base, extension = os.path.splitext(output)
+    return f"{base}_phases{extension}"
+
+
+def write_report(output: str, report_format: str, sdrf_file: str, errors: ErrorTable, profile: ValidationProfile):
+    """
+    Write the report of the validation of an SDRF file.
+    :param output: report file
+    :param report_format: json, tsv or parquet
+    :param sdrf_file: the validated SDRF file
+    :param errors: errors of the validation
+    :param profile: timings of the validation
+    """
+    if report_format == JSON:
+        report = {"file": sdrf_file, "errors": error_records(errors), "phases": profile.to_records()}
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, default=str)
+        return
+
+    errors_frame = errors.to_frame()
+    phases_frame = pd.DataFrame(profile.to_records()).astype({"hits": "Int64", "misses": "Int64"})
+    if report_format == TSV:
+        errors_frame.to_csv(output, sep="\t", index=False)
+        phases_frame.to_csv(get_phases_file(output), sep="\t", index=False)
+    elif report_format == PARQUET:
+        errors_frame.to_parquet(output, index=False)
+        phases_frame.to_parquet(get_phases_file(output), index=False)
+    else:
+        raise ValueError(f"Unknown report format {report_format}, the formats are: {', '.join(REPORT_FORMATS)}")
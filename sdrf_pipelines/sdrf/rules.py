@@ -0,0 +1,396 @@
+"""
+Vectorized validation rules for SDRF files.
+
+There are three kinds of rules:
+
+- :class:`ColumnRule` checks the values of one column. Column rules are evaluated on the distinct values of the
+  column only and the result is broadcast back to the rows.
+- :class:`FrameRule` checks the SDRF as a whole: number of columns, mandatory columns, column order, empty cells...
+- :class:`CrossColumnRule` checks the relation between several columns of the SDRF.
+
+All the rules return their errors as an :class:`~sdrf_pipelines.sdrf.errors.ErrorTable`.
+"""
+
+import abc
+import logging
+import re
+import typing
+
+import numpy as np
+import pandas as pd
+
+from sdrf_pipelines.sdrf.errors import EMPTY_CELL
+from sdrf_pipelines.sdrf.errors import ErrorTable
+
+
+def distinct_values(series: pd.Series) -> typing.Tuple[np.ndarray, pd.Index]:
+    """
+    Return the codes and the distinct values of a column, so checks can be run once per distinct value and
+    broadcast back with ``distinct[codes]``. Categorical columns are not re-encoded.
+    :param series: column of the SDRF
+    :return: tuple (codes, distinct values)
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    return codes, pd.Index(uniques, dtype=object)
+
+
+class ColumnRule(abc.ABC):
+    """
+    Rule on the values of a single column. :meth:`validate` receives a series and returns a boolean series where
+    False marks the values that fail the rule.
+    """
+
+    code = "column_rule"
+
+    def __init__(self, message: str = None):
+        self._custom_message = message
+
+    @property
+    def message(self) -> str:
+        return self._custom_message or self.default_message
+
+    @property
+    @abc.abstractmethod
+    def default_message(self) -> str:
+        pass
+
+    @abc.abstractmethod
+    def validate(self, series: pd.Series) -> pd.Series:
+        pass
+
+
+class LeadingWhitespaceValidation(ColumnRule):
+    """
+    Checks that there is no leading whitespace in this column
+    """
+
+    code = "leading_whitespace"
+    _pattern = re.compile(r"^\s+")
+
+    @property
+    def default_message(self):
+        return "contains leading whitespace"
+
+    def validate(self, series: pd.Series) -> pd.Series:
+        return ~series.astype(str).str.contains(self._pattern)
+
+
+class TrailingWhitespaceValidation(ColumnRule):
+    """
+    Checks that there is no trailing whitespace in this column
+    """
+
+    code = "trailing_whitespace"
+    _pattern = re.compile(r"\s+$")
+
+    @property
+    def default_message(self):
+        return "contains trailing whitespace"
+
+    def validate(self, series: pd.Series) -> pd.Series:
+        return ~series.astype(str).str.contains(self._pattern)
+
+
+class MatchesPatternValidation(ColumnRule):
+    """
+    Checks that a regular expression matches somewhere in each value of this column
+    """
+
+    code = "pattern"
+
+    def __init__(self, pattern: str, case: bool = True, message: str = None):
+        super().__init__(message)
+        self.pattern = pattern
+        self._regex = re.compile(pattern, 0 if case else re.IGNORECASE)
+
+    @property
+    def default_message(self):
+        return f'does not match the pattern "{self.pattern}"'
+
+    def validate(self, series: pd.Series) -> pd.Series:
+        return series.astype(str).str.contains(self._regex)
+
+
+def validate_column(
+    series: pd.Series, rules: typing.Iterable[ColumnRule], allow_empty: bool = False, level=logging.ERROR
+) -> ErrorTable:
+    """
+    Run column rules on the distinct values of a column. The column is factorized once, every rule is evaluated on
+    the distinct values and the result is broadcast back to the rows with the codes.
+    :param series: column of the SDRF
+    :param rules: rules to run
+    :param allow_empty: if True, empty values do not fail the rules
+    :param level: logging level of the errors
+    :return: one error per failing cell
+    """
+    rules = list(rules)
+    if not rules:
+        return ErrorTable()
+
+    codes, uniques = distinct_values(series)
+    distinct = pd.Series(uniques, dtype=object)
+    uniques = np.asarray(distinct, dtype=object)
+    non_empty = distinct.astype(str).str.len().to_numpy() > 0
+
+    tables = []
+    for rule in rules:
+        failed = ~np.asarray(rule.validate(distinct), dtype=bool)
+        if allow_empty:
+            # empty cells are not errors for this column
+            failed &= non_empty
+        if not failed.any():
+            continue
+        positions = np.flatnonzero(failed[codes])
+        tables.append(
+            ErrorTable(
+                row=series.index[positions],
+                column=series.name,
+                value=uniques[codes[positions]],
+                code=rule.code,
+                level=level,
+                message=rule.message,
+            )
+        )
+    return ErrorTable.concat(tables)
+
+
+class FrameRule(abc.ABC):
+    """
+    Rule on the whole SDRF. :meth:`evaluate` returns the errors found in the data frame. Rules that only look at the
+    column names have ``row_local = False``, rules whose errors for a row only depend on that row ``row_local = True``.
+    """
+
+    code = "frame_rule"
+    row_local = False
+
+    @abc.abstractmethod
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        pass
+
+
+class CrossColumnRule(FrameRule):
+    """
+    Rule on the relation between several columns. :meth:`column_groups` selects the groups of columns to check and
+    :meth:`check` returns the errors of one group.
+    """
+
+    code = "cross_column_rule"
+
+    @abc.abstractmethod
+    def column_groups(self, sdrf: pd.DataFrame) -> typing.List[typing.Tuple[str, ...]]:
+        pass
+
+    def group_errors(self, sdrf: pd.DataFrame) -> ErrorTable:
+        """
+        Errors found while selecting the groups of columns, they only depend on the column names.
+        """
+        return ErrorTable()
+
+    @abc.abstractmethod
+    def check(self, sdrf: pd.DataFrame, columns: typing.Tuple[str, ...]) -> ErrorTable:
+        pass
+
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        errors = [self.group_errors(sdrf)]
+        errors.extend(self.check(sdrf, columns) for columns in self.column_groups(sdrf))
+        return ErrorTable.concat(errors)
+
+
+class MinimumColumns(FrameRule):
+    """
+    Checks that the SDRF has at least the number of mandatory fields of the template
+    """
+
+    code = "minimum_columns"
+
+    def __init__(self, min_columns: int = 0):
+        self.min_columns = min_columns
+
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        if len(sdrf.columns) >= self.min_columns:
+            return ErrorTable()
+        error_message = (
+            f"The number of columns in the SDRF ({len(sdrf.columns)}) is smaller than the number of mandatory fields "
+            f"({self.min_columns})"
+        )
+        return ErrorTable.single(error_message, self.code, level=logging.WARN)
+
+
+class EmptyCells(FrameRule):
+    """
+    Checks that there are no empty cells in the SDRF
+    """
+
+    code = EMPTY_CELL
+    row_local = True
+
+    @staticmethod
+    def validate_strings(values: pd.Series) -> np.ndarray:
+        """
+        Return a boolean array, False for the values that are missing, "nan" or only whitespace.
+        """
+        valid = values.notna() & (values != "nan") & (values.astype(str).str.strip().str.len() > 0)
+        return valid.to_numpy(dtype=bool)
+
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        if sdrf.shape[1] == 0:
+            return ErrorTable()
+
+        # Evaluate every distinct value of a column once and broadcast the result to the rows
+        validation_results = []
+        for i in range(sdrf.shape[1]):
+            codes, uniques = distinct_values(sdrf.iloc[:, i])
+            valid = self.validate_strings(pd.Series(uniques, dtype=object))
+            validation_results.append(valid[codes])
+
+        # Get the positions where the validation fails, row by row
+        failed_rows, failed_cols = np.nonzero(~np.column_stack(validation_results))
+        return ErrorTable(row=sdrf.index[failed_rows], column=sdrf.columns[failed_cols], code=self.code)
+
+
+class MandatoryColumns(FrameRule):
+    """
+    Checks that the mandatory columns of the template are present
+    """
+
+    code = "mandatory_columns"
+
+    def __init__(self, names: typing.Iterable[str]):
+        self.names = list(names)
+
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        missing = [name for name in self.names if name not in sdrf.columns]
+        if not missing:
+            return ErrorTable()
+        error_message = "The following columns are mandatory and not present in the SDRF: {}".format(", ".join(missing))
+        return ErrorTable.single(error_message, self.code)
+
+
+class ColumnOrder(FrameRule):
+    """
+    Checks that characteristics are before the assay name, comments after it and factor values at the end
+    """
+
+    code = "column_order"
+
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        cnames = list(sdrf.columns)
+        if "assay name" not in cnames:
+            return ErrorTable()
+
+        messages = []
+        index = cnames.index("assay name")
+        factor_index = None
+        for position, column in enumerate(cnames):
+            if ("comment" in column or "technology type" in column) and position < index:
+                messages.append("The column " + column + "cannot be before the assay name")
+            if (
+                "characteristics" in column or ("material type" in column and "factor value" not in column)
+            ) and position > index:
+                messages.append("The column " + column + "cannot be after the assay name")
+            if "factor value" in column and factor_index is None:
+                factor_index = position
+        if factor_index is not None:
+            temp = []
+            error = []
+            for column in cnames[factor_index:]:
+                if "comment" in column or "characteristics" in column:
+                    error.extend(temp)
+                    temp = []
+                elif "factor value" in column:
+                    temp.append(column)
+            if len(error):
+                messages.append("The following factor column should be last: {}".format(", ".join(error)))
+        return ErrorTable(row=[-1] * len(messages), code=self.code, message=messages)
+
+
+class ColumnNames(FrameRule):
+    """
+    Checks that the column names follow the SDRF conventions
+    """
+
+    code = "column_names"
+    special_columns = {"sourcename", "assayname", "materialtype", "technologytype"}
+    column_template = re.compile(r"^(characteristics|comment|factor value)\s*\[([^\]]+)\](?:\.\d+)?$")
+
+    def evaluate(self, sdrf: pd.DataFrame) -> ErrorTable:
+        errors = []
+        spaces = []
+        for cname in sdrf.columns:
+            if cname != cname.strip():
+                spaces.append(cname)
+                continue
+            if cname.replace(" ", "") in self.special_columns:
+                continue
+            if not self.column_template.match(cname):
+                errors.append(cname)
+
+        if not errors + spaces:
+            return ErrorTable()
+        error_message = (
+            "Invalid columns present: "
+            + ", ".join(errors)
+            + ", ".join(e + " (leading or trailing whitespace)" for e in spaces)
+        )
+        return ErrorTable.single(error_message, self.code)
+
+
+class FactorValues(CrossColumnRule):
+    """
+    Checks that every factor value column has one corresponding characteristics or comment column with the same
+    values
+    """
+
+    code = "factor_values"
+
+    def _match_factor_columns(self, sdrf: pd.DataFrame) -> typing.Tuple[typing.List[typing.Tuple[str, str]], list]:
+        """
+        Find the characteristics or comment column of each factor value column.
+        :return: tuple (list of (factor value column, column) pairs, list of errors)
+        """
+        errors = []
+        # Lowercase the column names once: the factor value columns, and the other columns they are looked up in
+        lowered = [(col, col.lower()) for col in sdrf.columns]
+        fv_values = [col for col, name in lowered if name.startswith("factor value")]
+        candidates = [(col, name) for col, name in lowered if "factor value" not in name]
+
+        if len(fv_values) == 0:
+            error_message = f"No factor values present in the following SDRF columns: {sdrf.columns}"
+            errors.append(ErrorTable.single(error_message, self.code))
+
+        # find the corresponding columns for the factor values
+        pairs = []
+        for fv in fv_values:
+            factor = fv.lower().replace("factor value[", "").replace("]", "")
+            cols = [col for col, name in candidates if factor in name]
+            if len(cols) == 0:
+                error_message = f"Make sure your SDRF have a sample characteristics or data comment '{factor}' for your factor value column '{fv}'"
+                errors.append(ErrorTable.single(error_message, self.code, column=fv))
+            elif len(cols) > 1:
+                error_message = f"Multiple columns found for factor '{factor}': {cols}"
+                errors.append(ErrorTable.single(error_message, self.code, column=fv))
+            else:
+                pairs.append((fv, cols[0]))
+        return pairs, errors
+
+    def column_groups(self, sdrf: pd.DataFrame) -> typing.List[typing.Tuple[str, ...]]:
+        pairs, _ = self._match_factor_columns(sdrf)
+        return pairs
+
+    def group_errors(self, sdrf: pd.DataFrame) -> ErrorTable:
+        _, errors = self._match_factor_columns(sdrf)
+        return ErrorTable.concat(errors)
+
+    def check(self, sdrf: pd.DataFrame, columns: typing.Tuple[str, ...]) -> ErrorTable:
+        factor, col = columns
+        # compare the values and not the encoding, both columns can have different categories
+        factor_values = sdrf[factor].astype(object)
+        column_values = sdrf[col].astype(object)
+        if factor_values.equals(column_values):
+            return ErrorTable()
+        # if factor value contains different values from corresponding columns, print the values
+        different_values = factor_values.index[(factor_values != column_values).to_numpy()].tolist()
+        error_message = f"Factor '{factor}' and column '{col}' do not have the same values for the following rows: {different_values}"
+        return ErrorTable.single(error_message, self.code, column=factor)
@@ -2,24 +2,45 @@ from __future__ import annotations
 
 import logging
 from typing import List
+from typing import Tuple
 
+import numpy as np
 import pandas as pd
 
-from sdrf_pipelines.sdrf.sdrf_schema import CELL_LINES_TEMPLATE
-from sdrf_pipelines.sdrf.sdrf_schema import HUMAN_TEMPLATE
+from sdrf_pipelines.sdrf.errors import ErrorTable
+from sdrf_pipelines.sdrf.incremental import COLUMNS
+from sdrf_pipelines.sdrf.incremental import EXPERIMENTAL_DESIGN
+from sdrf_pipelines.sdrf.incremental import FACTOR_VALUES
+from sdrf_pipelines.sdrf.incremental import ValidationPlan
+from sdrf_pipelines.sdrf.incremental import ValidationStep
+from sdrf_pipelines.sdrf.incremental import ValidationUnit
+from sdrf_pipelines.sdrf.rules import FactorValues
+from sdrf_pipelines.sdrf.rules import distinct_values
 from sdrf_pipelines.sdrf.sdrf_schema import MASS_SPECTROMETRY
-from sdrf_pipelines.sdrf.sdrf_schema import NON_VERTEBRATES_TEMPLATE
-from sdrf_pipelines.sdrf.sdrf_schema import PLANTS_TEMPLATE
-from sdrf_pipelines.sdrf.sdrf_schema import VERTEBRATES_TEMPLATE
-from sdrf_pipelines.sdrf.sdrf_schema import cell_lines_schema
-from sdrf_pipelines.sdrf.sdrf_schema import default_schema
-from sdrf_pipelines.sdrf.sdrf_schema import human_schema
-from sdrf_pipelines.sdrf.sdrf_schema import mass_spectrometry_schema
-from sdrf_pipelines.sdrf.sdrf_schema import nonvertebrates_chema
-from sdrf_pipelines.sdrf.sdrf_schema import plants_chema
-from sdrf_pipelines.sdrf.sdrf_schema import vertebrates_chema
+from sdrf_pipelines.sdrf.snapshot import is_snapshot
+from sdrf_pipelines.sdrf.snapshot import read_snapshot_codes
+from sdrf_pipelines.sdrf.templates import load_schemas
 from sdrf_pipelines.utils.exceptions import LogicError
 
+# Columns whose number of distinct values is at most this fraction of the rows are kept dictionary-encoded
+# (pandas ``category``); SDRF columns such as organism, instrument or modifications repeat heavily.
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+# The combination of these columns identifies a sample and a raw file
+SAMPLE_COLUMNS = [
+    "source name",
+    "comment[technical replicate]",
+    "characteristics[biological replicate]",
+    "comment[label]",
+    "comment[fraction identifier]",
+]
+# Columns that must contain positive integers
+INTEGER_COLUMNS = [
+    "comment[technical replicate]",
+    "characteristics[biological replicate]",
+    "comment[fraction identifier]",
+]
+
 
 def check_if_integer(x):
     """
@@ -34,6 +55,100 @@ def check_if_integer(x):
         return False
 
 
+def integer_masks(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the integers of a column, like :func:`check_if_integer` but on the distinct values of the column and without
+    an exception per bad value.
+    :param column: column of the SDRF
+    :return: tuple (mask of the integer values, mask of the integer values higher than 0)
+    """
+    codes, uniques = distinct_values(column)
+    uniques = pd.Series(uniques, dtype=object)
+    # int() accepts signs and surrounding whitespace but not decimals or exponents, which to_numeric accepts
+    integer_like = uniques.astype(str).str.fullmatch(r"\s*[+-]?\d+\s*").to_numpy(dtype=bool)
+    numbers = pd.to_numeric(uniques.where(integer_like), errors="coerce")
+    is_integer = integer_like & numbers.notna().to_numpy()
+    is_positive = is_integer & (numbers > 0).to_numpy()
+    return is_integer[codes], is_positive[codes]
+
+
+def multi_valued_rows(first: pd.Series, second: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the rows whose value in one column is paired with more than one distinct value of the other column, like
+    ``groupby(first)[second].nunique() > 1`` and the reverse, but on the factorized columns. Missing values are ignored.
+    :param first: first column
+    :param second: second column
+    :return: tuple (mask of the rows whose first value has many second values, and the reverse)
+    """
+    first_codes, first_uniques = pd.factorize(first)
+    second_codes, second_uniques = pd.factorize(second)
+    n_second = max(len(second_uniques), 1)
+    present = (first_codes >= 0) & (second_codes >= 0)
+    pairs = np.unique(first_codes[present].astype(np.int64) * n_second + second_codes[present])
+    # one more slot, always 0, for the missing values (code -1)
+    first_counts = np.bincount(pairs // n_second, minlength=len(first_uniques) + 1)
+    second_counts = np.bincount(pairs % n_second, minlength=len(second_uniques) + 1)
+    return first_counts[first_codes] > 1, second_counts[second_codes] > 1
+
+
+def lower_column(column: pd.Series, max_unique_ratio: float = CATEGORICAL_MAX_UNIQUE_RATIO) -> pd.Series:
+    """
+    Lowercase the values of a column, working on its distinct values only. If the column has few distinct values
+    compared to its length, it is returned dictionary-encoded as a pandas ``category``.
+    :param column: column of strings
+    :param max_unique_ratio: maximum ratio distinct values / rows to keep the column as a category
+    :return: lowercased column
+    """
+    codes, uniques = pd.factorize(column)
+    return lower_codes(codes, uniques, column.index, column.name, max_unique_ratio)
+
+
+def lower_codes(
+    codes: np.ndarray, uniques, index: pd.Index, name=None, max_unique_ratio: float = CATEGORICAL_MAX_UNIQUE_RATIO
+) -> pd.Series:
+    """
+    Build a lowercased column from the codes of its cells and its distinct strings, see :func:`lower_column`.
+    """
+    lowered, lowered_index = pd.factorize(pd.Index(uniques, dtype=object).str.lower())
+    codes = lowered[codes]
+    if len(lowered_index) <= max_unique_ratio * len(codes):
+        values = pd.Categorical.from_codes(codes, categories=lowered_index)
+    else:
+        values = np.asarray(lowered_index, dtype=object)[codes]
+    return pd.Series(values, index=index, name=name)
+
+
+def read_normalized_snapshot(snapshot_file: str) -> pd.DataFrame:
+    """
+    Read a snapshot like :meth:`SdrfDataFrame.parse` reads an SDRF: empty rows are dropped and the values are
+    converted to lowercase strings, on the distinct values of every column and not on the cells.
+    """
+    names, columns = read_snapshot_codes(snapshot_file)
+    n_rows = len(columns[0][0]) if columns else 0
+    empty = np.ones(n_rows, dtype=bool)
+    for codes, _ in columns:
+        empty &= codes < 0
+    if empty.any():
+        logging.warning("There were empty lines.")
+        index = pd.Index(np.flatnonzero(~empty))
+    else:
+        index = pd.RangeIndex(n_rows)
+
+    values = {}
+    for i, (codes, uniques) in enumerate(columns):
+        if empty.any():
+            codes = codes[index.to_numpy()]
+        # the missing values (code -1) take the last value, "nan" like astype(str)
+        uniques = np.append(pd.Series(uniques, dtype=object).astype(str).to_numpy(dtype=object), "nan")
+        codes = np.where(codes < 0, len(uniques) - 1, codes)
+        # only the values of the rows are kept, in the order they appear like pd.factorize of the cells
+        codes, used = pd.factorize(codes)
+        values[i] = lower_codes(codes, uniques[used], index)
+    df = pd.DataFrame(values, index=index)
+    df.columns = [name.lower() for name in names]
+    return df
+
+
 class SdrfDataFrame(pd.DataFrame):
     @property
     def _constructor(self):
@@ -54,83 +169,89 @@ class SdrfDataFrame(pd.DataFrame):
     def parse(sdrf_file: str):
         """
         Read an SDRF into a dataframe
-        :param sdrf_file:
+        :param sdrf_file: SDRF file (TSV) or its snapshot, see :mod:`sdrf_pipelines.sdrf.snapshot`
         :return:
         """
 
+        if is_snapshot(sdrf_file):
+            return SdrfDataFrame(read_normalized_snapshot(sdrf_file))
+
         df = pd.read_csv(sdrf_file, sep="\t", skip_blank_lines=False)
         nrows = df.shape[0]
         df = df.dropna(axis="index", how="all")
         if df.shape[0] < nrows:
             logging.warning("There were empty lines.")
-        # Convert all columns and values in the dataframe to lowercase
-        df = df.astype(str).apply(lambda x: x.str.lower())
+        # Convert all columns and values in the dataframe to lowercase, low-cardinality columns are kept as categories
+        df = df.astype(str)
+        for i in range(df.shape[1]):
+            df.isetitem(i, lower_column(df.iloc[:, i]))
         df.columns = map(str.lower, df.columns)
 
         return SdrfDataFrame(df)
 
-    def validate(self, template: str, use_ols_cache_only: bool = False) -> List[LogicError]:
+    def validate(self, template: str, use_ols_cache_only: bool = False) -> ErrorTable:
         """
         Validate a corresponding SDRF
-        :return:
+        :return: the errors found, LogicError objects are created when the table is iterated
         """
-        errors = []
-        if template != MASS_SPECTROMETRY:
-            errors = default_schema.validate(self, use_ols_cache_only=use_ols_cache_only)
-
-        if template == HUMAN_TEMPLATE:
-            errors = errors + human_schema.validate(self, use_ols_cache_only=use_ols_cache_only)
-        elif template == VERTEBRATES_TEMPLATE:
-            errors = errors + vertebrates_chema.validate(self, use_ols_cache_only=use_ols_cache_only)
-        elif template == NON_VERTEBRATES_TEMPLATE:
-            errors = errors + nonvertebrates_chema.validate(self, use_ols_cache_only=use_ols_cache_only)
-        elif template == PLANTS_TEMPLATE:
-            errors = errors + plants_chema.validate(self, use_ols_cache_only=use_ols_cache_only)
-        elif template == CELL_LINES_TEMPLATE:
-            errors = errors + cell_lines_schema.validate(self, use_ols_cache_only=use_ols_cache_only)
-        elif template == MASS_SPECTROMETRY:
-            errors = mass_spectrometry_schema.validate(self, use_ols_cache_only=use_ols_cache_only)
-
-        return errors
+        schemas = load_schemas(template)
+        return ErrorTable.concat(schema.validate(self, use_ols_cache_only=use_ols_cache_only) for schema in schemas)
+
+    def validation_plan(
+        self,
+        template: str,
+        skip_ms_validation: bool = False,
+        skip_factor_validation: bool = False,
+        skip_experimental_design_validation: bool = False,
+        use_ols_cache_only: bool = False,
+    ) -> ValidationPlan:
+        """
+        Return the validation of the SDRF as a plan, see :mod:`sdrf_pipelines.sdrf.incremental`. Running the plan gives
+        the errors of the template, mass spectrometry, factor values and experimental design validations in order.
+        :param template: template to validate the SDRF with
+        :param skip_ms_validation: do not validate the mass spectrometry fields
+        :param skip_factor_validation: do not validate the factor values
+        :param skip_experimental_design_validation: do not validate the experimental design
+        :param use_ols_cache_only: look up the ontology terms in the local cache only
+        """
+        schemas = load_schemas(template)
+        if not skip_ms_validation:
+            schemas += load_schemas(MASS_SPECTROMETRY)
+        plan = ValidationPlan()
+        for schema in schemas:
+            plan += schema.validation_plan(self, use_ols_cache_only=use_ols_cache_only)
+
+        if not skip_factor_validation:
+            rule = FactorValues()
+            units = [ValidationUnit(rule.group_errors, phase=FACTOR_VALUES)]
+            units.extend(
+                ValidationUnit(lambda sdrf, group=group: rule.check(sdrf, group), COLUMNS, group, phase=FACTOR_VALUES)
+                for group in rule.column_groups(self)
+            )
+            plan.steps.append(ValidationStep(units))
+
+        if not skip_experimental_design_validation:
+            columns = ["assay name", "comment[data file]"] + SAMPLE_COLUMNS + INTEGER_COLUMNS
+            units = [
+                ValidationUnit(
+                    lambda sdrf: ErrorTable.from_logic_errors(
+                        SdrfDataFrame.validate_experimental_design(sdrf), code=EXPERIMENTAL_DESIGN
+                    ),
+                    COLUMNS,
+                    columns,
+                    phase=EXPERIMENTAL_DESIGN,
+                )
+            ]
+            plan.steps.append(ValidationStep(units))
+        return plan
 
-    def validate_factor_values(self) -> List[LogicError]:
+    def validate_factor_values(self) -> ErrorTable:
         """
         Validate that factor values are present in the SDRF columns.
 
-        :return: A list of LogicError objects if any factor value columns are missing, otherwise an empty list.
+        :return: The errors found if any factor value columns are missing or do not match their column.
         """
-        errors = []
-        # Check if any column starts with 'factor value' (case-insensitive)
-        fv_values = [col for col in self.columns if col.lower().startswith("factor value")]
-
-        if len(fv_values) == 0:
-            error_message = f"No factor values present in the following SDRF columns: {self.columns}"
-            errors.append(LogicError(error_message, error_type=logging.ERROR))
-
-        # find the corresponding columns for the factor values
-        fv_dc = {}
-        for fv in fv_values:
-            factor = fv.lower().replace("factor value[", "").replace("]", "")
-            cols = [col for col in self.columns if (factor in col.lower() and "factor value" not in col.lower())]
-            if len(cols) == 0:
-                error_message = f"Make sure your SDRF have a sample characteristics or data comment '{factor}' for your factor value column '{fv}'"
-                errors.append(LogicError(error_message, error_type=logging.ERROR))
-            elif len(cols) > 1:
-                error_message = f"Multiple columns found for factor '{factor}': {cols}"
-                errors.append(LogicError(error_message, error_type=logging.ERROR))
-            else:
-                fv_dc[fv] = cols[0]
-
-        for factor, col in fv_dc.items():
-            equals_cols = self[factor].equals(self[col])
-            if not equals_cols:
-                # if factor value contains different values from corresponding columns, print the values
-                different_values = self[factor][self[factor] != self[col]]
-                different_values = different_values.index.tolist()
-                error_message = f"Factor '{factor}' and column '{col}' do not have the same values for the following rows: {different_values}"
-                errors.append(LogicError(error_message, error_type=logging.ERROR))
-
-        return errors
+        return FactorValues().evaluate(self)
 
     def validate_experimental_design(self) -> List[LogicError]:
         """
@@ -159,8 +280,12 @@ class SdrfDataFrame(pd.DataFrame):
         not unique, otherwise an empty list.
         """
 
+        # Only the rows of the inconsistent groups, found on the factorized columns, are grouped to report them
+        multiple_files, multiple_assays = multi_valued_rows(self["assay name"], self["comment[data file]"])
+
         # Group by col1 and check if each group has only one unique col2 value
-        col1_inconsistencies = self.groupby("assay name")["comment[data file]"].nunique()
+        inconsistent = self[multiple_files]
+        col1_inconsistencies = inconsistent.groupby("assay name", observed=True)["comment[data file]"].nunique()
         col1_inconsistent_groups = col1_inconsistencies[col1_inconsistencies > 1]
         if len(col1_inconsistent_groups) > 0:
             cell_index = col1_inconsistent_groups.index.tolist()
@@ -168,7 +293,8 @@ class SdrfDataFrame(pd.DataFrame):
             errors.append(LogicError(error_message, error_type=logging.ERROR))
 
         # Group by col2 and check if each group has only one unique col1 value
-        col2_inconsistencies = self.groupby("comment[data file]")["assay name"].nunique()
+        inconsistent = self[multiple_assays]
+        col2_inconsistencies = inconsistent.groupby("comment[data file]", observed=True)["assay name"].nunique()
         col2_inconsistent_groups = col2_inconsistencies[col2_inconsistencies > 1]
         if len(col2_inconsistent_groups) > 0:
             cell_index = col2_inconsistent_groups.index.tolist()
@@ -187,13 +313,7 @@ class SdrfDataFrame(pd.DataFrame):
         - comment[fraction identifier]
         :return: A list of LogicError objects if the source names are not unique, otherwise an empty list.
         """
-        cols = [
-            "source name",
-            "comment[technical replicate]",
-            "characteristics[biological replicate]",
-            "comment[label]",
-            "comment[fraction identifier]",
-        ]
+        cols = SAMPLE_COLUMNS
 
         for col in cols:
             if col not in self.columns:
@@ -220,35 +340,19 @@ class SdrfDataFrame(pd.DataFrame):
         """
         errors = []
 
-        def check_integer_columns(df, columns):
-            """
-            This method checks that all the values in the given columns are integers. Retrieve a dictionary with the
-            columns as keys and the list of row indexes that do not contain integer as values.
-            :param df: The dataframe to check
-            :param columns: The columns to check
-            :return: A dataframe containing the rows that do not contain only integers in the specified columns
-            """
-
-            non_integer_rows = {}
-            for column in columns:
-                # Check if the column contains only integers
-                non_integers = df[~df[column].apply(check_if_integer)].index.tolist()
-                if non_integers:
-                    non_integer_rows[column] = non_integers
-            return non_integer_rows
-
-        # Specify the columns to check
-        columns_to_check = [
-            "comment[technical replicate]",
-            "characteristics[biological replicate]",
-            "comment[fraction identifier]",
-        ]
-
-        ## Remove columns that are not present in the dataframe
-        columns_to_check = [col for col in columns_to_check if col in self.columns]
-
-        # Find rows that do not contain only integers in the specified columns
-        non_integer_rows = check_integer_columns(self, columns_to_check)
+        # Remove columns that are not present in the dataframe
+        columns_to_check = [col for col in INTEGER_COLUMNS if col in self.columns]
+
+        # Find the rows that do not contain integers, and the rows that do not contain integers higher than 0. The
+        # masks of a column are computed once and used by both checks.
+        non_integer_rows = {}
+        lower_than_one = {}
+        for column in columns_to_check:
+            is_integer, is_positive = integer_masks(self[column])
+            if not is_integer.all():
+                non_integer_rows[column] = self.index[~is_integer].tolist()
+            if not is_positive.all():
+                lower_than_one[column] = self.index[~is_positive].tolist()
 
         if len(non_integer_rows) > 0:
             errors.append(
@@ -258,22 +362,6 @@ class SdrfDataFrame(pd.DataFrame):
                 )
             )
 
-        def check_all_integers_higher_than_one(df, columns):
-            """
-            This method check that all the values in the columns (if they are numbers) are higher than 0.
-            :param df: The dataframe to check
-            :param columns: The columns to check
-            :return: A dataframe containing the rows that do not contain only integers in the specified columns
-            """
-            non_integer_rows = {}
-            for column in columns:
-                # Check if the column contains only integers
-                non_integers = df[~df[column].apply(lambda x: check_if_integer(x) and int(x) > 0)].index.tolist()
-                if non_integers:
-                    non_integer_rows[column] = non_integers
-            return non_integer_rows
-
-        lower_than_one = check_all_integers_higher_than_one(self, columns_to_check)
         if len(lower_than_one) > 0:
             errors.append(
                 LogicError(
@@ -1,23 +1,30 @@
 import logging
-import re
-import sys
+import time
 import typing
-from typing import Any
 
+import numpy as np
 import pandas as pd
-from pandas_schema import Column
-from pandas_schema import Schema
-from pandas_schema.validation import LeadingWhitespaceValidation
-from pandas_schema.validation import MatchesPatternValidation
-from pandas_schema.validation import TrailingWhitespaceValidation
-from pandas_schema.validation import _BaseValidation
-from pandas_schema.validation import _SeriesValidation
 
 from sdrf_pipelines.ols.ols import OlsClient
-from sdrf_pipelines.sdrf import sdrf
-from sdrf_pipelines.utils.exceptions import LogicError
-
-client = OlsClient()
+from sdrf_pipelines.sdrf.errors import ErrorTable
+from sdrf_pipelines.sdrf.incremental import CELLS
+from sdrf_pipelines.sdrf.incremental import COLUMN_NAMES
+from sdrf_pipelines.sdrf.incremental import COLUMN_VALUES
+from sdrf_pipelines.sdrf.incremental import EMPTY_CELLS
+from sdrf_pipelines.sdrf.incremental import HEADER
+from sdrf_pipelines.sdrf.incremental import ValidationPlan
+from sdrf_pipelines.sdrf.incremental import ValidationStep
+from sdrf_pipelines.sdrf.incremental import ValidationUnit
+from sdrf_pipelines.sdrf.rules import ColumnNames
+from sdrf_pipelines.sdrf.rules import ColumnOrder
+from sdrf_pipelines.sdrf.rules import ColumnRule
+from sdrf_pipelines.sdrf.rules import EmptyCells
+from sdrf_pipelines.sdrf.rules import MandatoryColumns
+from sdrf_pipelines.sdrf.rules import MinimumColumns
+from sdrf_pipelines.sdrf.rules import distinct_values
+from sdrf_pipelines.sdrf.rules import validate_column
+
+_client = None
 
 HUMAN_TEMPLATE = "human"
 DEFAULT_TEMPLATE = "default"
@@ -40,8 +47,96 @@ NOT_AVAILABLE = "not available"
 NOT_APPLICABLE = "not applicable"
 
 
-def check_minimum_columns(panda_sdrf=None, minimun_columns: int = 0):
-    return len(panda_sdrf.get_sdrf_columns()) < minimun_columns
+def get_ols_client() -> OlsClient:
+    """
+    Return the OLS client shared by the ontology validations, it is created the first time a term is looked up.
+    """
+    global _client
+    if _client is None:
+        _client = OlsClient()
+    return _client
+
+
+class OntologyLookup:
+    """
+    Memo of the ontology term lookups of the process. The validations of all the SDRF files validated by a process
+    share it, every term is searched in the OLS (or its local cache) once. The terms not found by the OLS service are
+    not kept, the service may have failed to answer, and they are searched again by the next validation.
+    :param max_terms: number of lookups kept, the oldest ones are forgotten first
+    """
+
+    def __init__(self, max_terms: int = 100_000):
+        self._labels = {}
+        self.max_terms = max_terms
+        self.hits = 0
+        self.misses = 0
+        # time spent searching the OLS service or its local cache
+        self.seconds = 0.0
+
+    def labels(self, term: str, use_ols_cache_only: bool = False, **kwargs) -> typing.FrozenSet[str]:
+        """
+        Return the lowercase labels of the ontology terms found for a term name.
+        :param term: term name
+        :param use_ols_cache_only: search the local cache only and not the OLS service
+        :param kwargs: arguments of the search, e.g. the ontology
+        """
+        key = (term, use_ols_cache_only, tuple(sorted(kwargs.items())))
+        if key in self._labels:
+            self.hits += 1
+            return self._labels[key]
+        self.misses += 1
+        start = time.perf_counter()
+        ontology_terms = get_ols_client().search(term, exact="true", use_ols_cache_only=use_ols_cache_only, **kwargs)
+        self.seconds += time.perf_counter() - start
+        labels = frozenset(o["label"].lower() for o in ontology_terms) if ontology_terms is not None else frozenset()
+        if labels or use_ols_cache_only:
+            self._remember(key, labels)
+        return labels
+
+    def labels_many(
+        self, terms: typing.List[str], use_ols_cache_only: bool = False, **kwargs
+    ) -> typing.List[typing.FrozenSet[str]]:
+        """
+        Return the lowercase labels of the ontology terms found for every term name, like :meth:`labels`. The names
+        that are not in the memo are searched together when only the local cache is used.
+        :param terms: term names
+        :param use_ols_cache_only: search the local cache only and not the OLS service
+        :param kwargs: arguments of the search, e.g. the ontology
+        """
+        if not use_ols_cache_only:
+            return [self.labels(term, use_ols_cache_only, **kwargs) for term in terms]
+
+        arguments = tuple(sorted(kwargs.items()))
+        labels = {}
+        for term in dict.fromkeys(terms):
+            if (term, True, arguments) in self._labels:
+                labels[term] = self._labels[(term, True, arguments)]
+        missing = [term for term in dict.fromkeys(terms) if term not in labels]
+        if missing:
+            start = time.perf_counter()
+            found = get_ols_client().cache_search_many(missing, kwargs.get("ontology"))
+            self.seconds += time.perf_counter() - start
+            for term in missing:
+                labels[term] = frozenset(o["label"].lower() for o in found[term])
+                self._remember((term, True, arguments), labels[term])
+        self.misses += len(missing)
+        self.hits += len(terms) - len(missing)
+        return [labels[term] for term in terms]
+
+    def _remember(self, key: tuple, labels: typing.FrozenSet[str]):
+        self._labels[key] = labels
+        while len(self._labels) > self.max_terms:
+            # the dict keeps the order of insertion
+            del self._labels[next(iter(self._labels))]
+
+    def clear(self):
+        self._labels.clear()
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+
+
+ontology_lookup = OntologyLookup()
 
 
 def ontology_term_parser(cell_value: str = None):
@@ -68,12 +163,12 @@ def ontology_term_parser(cell_value: str = None):
     return term
 
 
-class SDRFColumn(Column):
+class SDRFColumn:
     def __init__(
         self,
         name: str,
-        validations: typing.Iterable["_BaseValidation"] = None,
-        optional_validations: typing.Iterable["_BaseValidation"] = None,
+        validations: typing.Iterable[ColumnRule] = None,
+        optional_validations: typing.Iterable[ColumnRule] = None,
         allow_empty=False,
         optional_type=True,
     ):
@@ -82,17 +177,17 @@ class SDRFColumn(Column):
         if optional_validations is None:
             optional_validations = []
 
-        super().__init__(name, validations, allow_empty)
-        self.optional_validations = optional_validations
+        self.name = name
+        self.validations = list(validations)
+        self.optional_validations = list(optional_validations)
+        self.allow_empty = allow_empty
         self._optional = optional_type
 
-    def validate_optional(self, series):
-        warnings = []
-        for validation in self.optional_validations:
-            for error in validation.get_errors(series, self):
-                w = LogicError(error.message, error.value, error.row, error.column, error_type=logging.WARN)
-                warnings.append(w)
-        return warnings
+    def validate(self, series: pd.Series) -> ErrorTable:
+        return validate_column(series, self.validations, self.allow_empty, level=logging.ERROR)
+
+    def validate_optional(self, series: pd.Series) -> ErrorTable:
+        return validate_column(series, self.optional_validations, self.allow_empty, level=logging.WARN)
 
     def set_ols_strategy(self, use_ols_cache_only: bool = False):
         for validation in self.validations:
@@ -100,17 +195,23 @@ class SDRFColumn(Column):
                 validation.set_ols_strategy(use_ols_cache_only=use_ols_cache_only)
 
 
-class OntologyTerm(_SeriesValidation):
+class OntologyTerm(ColumnRule):
     """
-    Checks that there is no leading whitespace in this column
+    Checks that the term name of the values of this column can be found in an ontology
     """
 
-    def __init__(self, ontology_name: str = None, not_available: bool = False, not_applicable: bool = False, **kwargs):
-        super().__init__(**kwargs)
+    code = "ontology_term"
+
+    def __init__(
+        self, ontology_name: str = None, not_available: bool = False, not_applicable: bool = False, message: str = None
+    ):
+        super().__init__(message)
         self._use_ols_cache_only = False
         self._ontology_name = ontology_name
         self._not_available = not_available
         self._not_applicable = not_applicable
+        # the lookup arguments are bound once, when the template is compiled
+        self._search_kwargs = {"ontology": ontology_name} if ontology_name is not None else {}
 
     @property
     def default_message(self):
@@ -120,20 +221,6 @@ class OntologyTerm(_SeriesValidation):
         """
         return f"the term name or title can't be found in the ontology -- {self._ontology_name}"
 
-    @staticmethod
-    def validate_ontology_terms(cell_value, labels):
-        """
-        Check if a cell value is in a list of labels or list of string
-        :param cell_value: line in a cell
-        :param labels: list of labels
-        :return:
-        """
-        cell_value = cell_value.lower()
-        term = ontology_term_parser(cell_value)
-        if term.get(TERM_NAME) in labels:
-            return True
-        return False
-
     def validate(self, series: pd.Series) -> pd.Series:
         """
         Validate if the term is present in the provided ontology. This method looks in the provided
@@ -141,33 +228,22 @@ class OntologyTerm(_SeriesValidation):
         :param series: return series that do not match the criteria
         :return:
         """
-        terms = [ontology_term_parser(x) for x in series.unique()]
+        codes, uniques = distinct_values(series)
+        terms = [ontology_term_parser(x.lower()) for x in uniques]
+        names = [term[TERM_NAME] for term in terms if TERM_NAME in term]
         labels = []
-        for term in terms:
-            if TERM_NAME not in term:
-                ontology_terms = None
-            else:
-                if self._ontology_name is not None:
-                    ontology_terms = client.search(
-                        term[TERM_NAME],
-                        ontology=self._ontology_name,
-                        exact="true",
-                        use_ols_cache_only=self._use_ols_cache_only,
-                    )
-                else:
-                    ontology_terms = client.search(
-                        term=term[TERM_NAME], exact="true", use_cache_only=self._use_ols_cache_only
-                    )
-
-            if ontology_terms is not None:
-                query_labels = [o["label"].lower() for o in ontology_terms]
-                if term[TERM_NAME] in query_labels:
-                    labels.append(term[TERM_NAME])
+        found = ontology_lookup.labels_many(names, use_ols_cache_only=self._use_ols_cache_only, **self._search_kwargs)
+        for name, query_labels in zip(names, found):
+            if name in query_labels:
+                labels.append(name)
         if self._not_available:
             labels.append(NOT_AVAILABLE)
         if self._not_applicable:
             labels.append(NOT_APPLICABLE)
-        return series.apply(lambda cell_value: self.validate_ontology_terms(cell_value, labels))
+        # every distinct value is parsed only once, the parsed terms are reused for the check
+        labels = set(labels)
+        valid = np.array([term.get(TERM_NAME) in labels for term in terms], dtype=bool)
+        return pd.Series(valid[codes], index=series.index)
 
     def set_ols_strategy(self, use_ols_cache_only: bool = False):
         """
@@ -177,448 +253,84 @@ class OntologyTerm(_SeriesValidation):
         self._use_ols_cache_only = use_ols_cache_only
 
 
-class SDRFSchema(Schema):
-    _special_columns = {"sourcename", "assayname", "materialtype", "technologytype"}
-    _column_template = r"^(characteristics|comment|factor value)\s*\[([^\]]+)\](?:\.\d+)?$"
+class SDRFSchema:
+    """
+    Validation template: the columns of the template with their column rules, plus the frame and cross-column rules
+    that every template checks. Templates are defined in the templates folder, see :mod:`sdrf_pipelines.sdrf.templates`.
+    """
 
-    def __init__(self, columns: typing.Iterable[SDRFColumn], ordered: bool = False, min_columns: int = 0):
-        super().__init__(columns, ordered)
+    def __init__(
+        self, columns: typing.Iterable[SDRFColumn], min_columns: int = 0, name: str = None, extends: str = None
+    ):
+        self.name = name
+        self.extends = extends
+        self.columns = list(columns)
         self._min_columns = min_columns
+        mandatory = [column.name for column in self.columns if column._optional is False]
+        self.frame_rules = [MinimumColumns(min_columns), EmptyCells(), MandatoryColumns(mandatory), ColumnOrder()]
+        self.name_rules = [ColumnNames()]
 
-    def __new__(cls, ordered: bool = False, min_columns: int = 0) -> Any:
-        obj = super().__new__(cls)
-        obj._min_columns = min_columns
-        return obj
+    def validate(self, panda_sdrf: pd.DataFrame = None, use_ols_cache_only: bool = False) -> ErrorTable:
+        return self.validation_plan(panda_sdrf, use_ols_cache_only=use_ols_cache_only).run(panda_sdrf)
 
-    def validate(self, panda_sdrf: sdrf = None, use_ols_cache_only: bool = False) -> typing.List[LogicError]:
-        errors = []
-
-        # Check the minimum number of columns
-        if check_minimum_columns(panda_sdrf, self._min_columns):
-            error_message = (
-                "The number of columns in the SDRF ({}) is smaller than the number of mandatory fields ({})".format(
-                    len(panda_sdrf.get_sdrf_columns()), self._min_columns
-                )
-            )
-            errors.append(LogicError(error_message, error_type=logging.WARN))
-
-        empty_cells_errors = self.validate_empty_cells(panda_sdrf)
-        if empty_cells_errors:
-            errors.extend(empty_cells_errors)
-
-        # Check the mandatory fields
-        error_mandatory = self.validate_mandatory_columns(panda_sdrf)
-        if error_mandatory is not None:
-            errors.append(error_mandatory)
-
-        # Check the column order
-        error_columns_order = self.validate_columns_order(panda_sdrf)
-        if error_columns_order is not None:
-            errors.extend(error_columns_order)
-
-        # Check that the term is present in ontology
-        error_ontology_terms = self.validate_columns(panda_sdrf, use_ols_cache_only=use_ols_cache_only)
-        if error_ontology_terms is not None:
-            for error in error_ontology_terms:
-                errors.append(error)
-
-        error_names = self.validate_column_names(panda_sdrf)
-        if error_names:
-            errors.extend(error_names)
-
-        errors.extend(self.check_recommendations(panda_sdrf))
+    def validation_plan(self, panda_sdrf: pd.DataFrame, use_ols_cache_only: bool = False) -> ValidationPlan:
+        """
+        Return the validation of the SDRF as a plan, one unit per rule and per column of the template.
+        :param panda_sdrf: SDRF to validate, only its column names are used to build the plan
+        :param use_ols_cache_only: look up the ontology terms in the local cache only
+        """
+        column_pairs, missing_columns = self._get_column_pairs(panda_sdrf)
+        for _, column in column_pairs:
+            column.set_ols_strategy(use_ols_cache_only=use_ols_cache_only)
 
-        return errors
+        def frame_unit(rule):
+            if rule.row_local:
+                return ValidationUnit(rule.evaluate, CELLS, phase=EMPTY_CELLS)
+            return ValidationUnit(rule.evaluate, HEADER, phase=COLUMN_NAMES)
 
-    def validate_column_names(self, panda_sdrf):
-        errors = []
-        spaces = []
-        logerror = []
-        for cname in panda_sdrf.columns:
-            if cname != cname.strip():
-                spaces.append(cname)
-                continue
-            if cname.replace(" ", "") in self._special_columns:
-                continue
-            m = re.match(self._column_template, cname)
-            if not m:
-                errors.append(cname)
-            elif m.group().startswith("factor value"):
-                if (
-                    m.group().replace("factor value", "comment") not in panda_sdrf.columns
-                    and m.group().replace("factor value", "characteristics") not in panda_sdrf.columns
-                    and m.group() not in panda_sdrf.columns
-                ):
-                    error_message = "The " + cname + " column should also be in the characteristics or comment"
-                    logerror.append(LogicError(error_message, error_type=logging.ERROR))
-
-        if errors + spaces:
-            logerror.append(
-                LogicError(
-                    "Invalid columns present: "
-                    + ", ".join(errors)
-                    + ", ".join(e + " (leading or trailing whitespace)" for e in spaces),
-                    error_type=logging.ERROR,
-                )
-            )
-        return logerror
+        def column_unit(validate, name):
+            return ValidationUnit(lambda sdrf: validate(sdrf[name]), CELLS, [name], phase=COLUMN_VALUES)
 
-    def validate_mandatory_columns(self, panda_sdrf):
-        error_mandatory = []
-        for column in self.columns:
-            if column._optional is False and column.name not in panda_sdrf.get_sdrf_columns():
-                error_mandatory.append(column.name)
-        if len(error_mandatory):
-            error_message = "The following columns are mandatory and not present in the SDRF: {}".format(
-                ", ".join(error_mandatory)
-            )
-            return LogicError(error_message, error_type=logging.ERROR)
-        return None
-
-    @staticmethod
-    def validate_columns_order(panda_sdrf):
-        error_columns_order = []
-        if "assay name" in list(panda_sdrf):
-            cnames = list(panda_sdrf)
-            index = cnames.index("assay name")
-            factor_tag = False
-            for column in cnames:
-                if ("comment" in column or "technology type" in column) and cnames.index(column) < index:
-                    error_message = "The column " + column + "cannot be before the assay name"
-                    error_columns_order.append(LogicError(error_message, error_type=logging.ERROR))
-                if (
-                    "characteristics" in column or ("material type" in column and "factor value" not in column)
-                ) and cnames.index(column) > index:
-                    error_message = "The column " + column + "cannot be after the assay name"
-                    error_columns_order.append(LogicError(error_message, error_type=logging.ERROR))
-                if "factor value" in column and not factor_tag:
-                    factor_index = cnames.index(column)
-                    factor_tag = True
-            if factor_tag:
-                temp = []
-                error = []
-                for column in cnames[factor_index:]:
-                    if "comment" in column or "characteristics" in column:
-                        error.extend(temp)
-                        temp = []
-                    elif "factor value" in column:
-                        temp.append(column)
-                if len(error):
-                    error_message = "The following factor column should be last: {}".format(", ".join(error))
-                    error_columns_order.append(LogicError(error_message, error_type=logging.ERROR))
-            if error_columns_order:
-                return error_columns_order
-        return None
+        return ValidationPlan(
+            [
+                # Check the number of columns, empty cells, mandatory fields and column order
+                ValidationStep(frame_unit(rule) for rule in self.frame_rules),
+                # Check the values of the columns, e.g. that the term is present in ontology
+                ValidationStep(
+                    [ValidationUnit(lambda sdrf: ErrorTable.concat(missing_columns))]
+                    + [column_unit(column.validate, column.name) for _, column in column_pairs],
+                    sort_by_row=True,
+                ),
+                # Check the column names
+                ValidationStep(frame_unit(rule) for rule in self.name_rules),
+                ValidationStep(
+                    [column_unit(column.validate_optional, column.name) for _, column in column_pairs],
+                    sort_by_row=True,
+                ),
+            ]
+        )
 
     def _get_column_pairs(self, panda_sdrf):
         column_pairs = []
-        columns_to_pair = self.columns
         errors = []
 
-        for column in columns_to_pair:
+        for column in self.columns:
             if column.name not in panda_sdrf and column._optional is False:
                 message = f"The column {column.name} is not present in the SDRF"
-                errors.append(LogicError(message, error_type=logging.ERROR))
+                errors.append(ErrorTable.single(message, MandatoryColumns.code, column=column.name))
             elif column.name in panda_sdrf:
                 column_pairs.append((panda_sdrf[column.name], column))
         return column_pairs, errors
 
-    def validate_columns(self, panda_sdrf, use_ols_cache_only: bool = False):
+    def validate_columns(self, panda_sdrf, use_ols_cache_only: bool = False) -> ErrorTable:
         # Iterate over each pair of schema columns and data frame series and run validations
         column_pairs, errors = self._get_column_pairs(panda_sdrf)
         for series, column in column_pairs:
             column.set_ols_strategy(use_ols_cache_only=use_ols_cache_only)
-            errors += column.validate(series)
-        return sorted(errors, key=lambda e: e.row)
-
-    def check_recommendations(self, panda_sdrf):
-        column_pairs, errors = self._get_column_pairs(panda_sdrf)
-        warnings = []
-        for series, column in column_pairs:
-            warnings += column.validate_optional(series)
-        return sorted(warnings, key=lambda e: e.row)
+            errors.append(column.validate(series))
+        return ErrorTable.concat(errors).sort_by_row()
 
-    def validate_empty_cells(self, panda_sdrf):
-        """
-        Check for empty cells in the SDRF. This method will return a list of errors if any empty cell is found.
-        :param panda_sdrf: SDRF dataframe
-        :return: List of errors
-        """
-        errors = []
-
-        def validate_string(cell_value):
-            return cell_value is not None and cell_value != "nan" and len(cell_value.strip()) > 0
-
-        if sys.version_info <= (3, 8):
-            # Use map for Python versions less than 3.8
-            validation_results = panda_sdrf.map(validate_string)
-        else:
-            # Use applymap for Python versions 3.8 and above
-            validation_results = panda_sdrf.applymap(validate_string)
-
-        # Get the indices where the validation fails
-        failed_indices = [
-            (row, col)
-            for row in validation_results.index
-            for col in validation_results.columns
-            if not validation_results.at[row, col]
-        ]
-
-        for row, col in failed_indices:
-            message = f"Empty value found Row: {row}, Column: {col}"
-            errors.append(LogicError(message, error_type=logging.ERROR))
-        return errors
-
-
-default_schema = SDRFSchema(
-    [
-        SDRFColumn(
-            "source name",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[organism part]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[disease]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[organism]",
-            [
-                LeadingWhitespaceValidation(),
-                TrailingWhitespaceValidation(),
-                OntologyTerm("ncbitaxon", not_applicable=True),
-            ],
-            allow_empty=False,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[cell type]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=False,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[biological replicate]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "assay name",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=False,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[technical replicate]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[fraction identifier]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[data file]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-    ],
-    min_columns=7,
-)
-
-human_schema = SDRFSchema(
-    [
-        SDRFColumn(
-            "characteristics[cell type]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[ancestry category]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[age]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            [
-                MatchesPatternValidation(
-                    r"(?:^(?:\d+y)?(?:\d+m)?(?:\d+d)?$)|(?:not available)|(?:not applicable)", case=False
-                )
-            ],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[sex]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[developmental stage]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-        SDRFColumn(
-            "characteristics[individual]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-    ],
-    min_columns=7,
-)
-
-vertebrates_chema = SDRFSchema(
-    [
-        SDRFColumn(
-            "characteristics[developmental stage]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        )
-    ],
-    min_columns=7,
-)
-
-nonvertebrates_chema = SDRFSchema(
-    [
-        SDRFColumn(
-            "characteristics[developmental stage]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-        SDRFColumn(
-            "characteristics[strain/breed]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-    ],
-    min_columns=7,
-)
-
-plants_chema = SDRFSchema(
-    [
-        SDRFColumn(
-            "characteristics[developmental stage]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-        SDRFColumn(
-            "characteristics[strain/breed]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-    ],
-    min_columns=7,
-)
-
-cell_lines_schema = SDRFSchema(
-    [
-        SDRFColumn(
-            "characteristics[cell type]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "characteristics[cell line]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-    ],
-    min_columns=7,
-)
-
-mass_spectrometry_schema = SDRFSchema(
-    [
-        SDRFColumn(
-            "assay name",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "technology type",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-        SDRFColumn(
-            "comment[fraction identifier]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[label]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation(), OntologyTerm("pride")],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[technical replicate]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[instrument]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation(), OntologyTerm("ms")],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[modification parameters]",
-            [
-                LeadingWhitespaceValidation(),
-                TrailingWhitespaceValidation(),
-                OntologyTerm(ontology_name="unimod", not_available=True),
-            ],
-            allow_empty=True,
-            optional_type=True,
-        ),
-        SDRFColumn(
-            "comment[cleavage agent details]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation(), OntologyTerm("ms", not_applicable=True)],
-            allow_empty=True,
-            optional_type=False,
-        ),
-        SDRFColumn(
-            "comment[fragment mass tolerance]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-        SDRFColumn(
-            "comment[precursor mass tolerance]",
-            [LeadingWhitespaceValidation(), TrailingWhitespaceValidation()],
-            allow_empty=True,
-            optional_type=True,
-        ),
-    ],
-    min_columns=7,
-)
+    def check_recommendations(self, panda_sdrf) -> ErrorTable:
+        column_pairs, _ = self._get_column_pairs(panda_sdrf)
+        warnings = [column.validate_optional(series) for series, column in column_pairs]
+        return ErrorTable.concat(warnings).sort_by_row()
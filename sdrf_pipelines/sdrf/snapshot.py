@@ -0,0 +1,161 @@
+"""
+Binary snapshots of SDRF files.
+
+A snapshot is an Arrow IPC (Feather V2) file with the cells of the SDRF as they are read from the TSV: text columns are
+dictionary-encoded, numeric columns keep the types inferred by pandas, and the columns keep their original names and
+order, duplicated names included. The snapshot is not compressed, so it is memory-mapped when it is read and a reload
+costs milliseconds instead of parsing the TSV text again.
+
+Every command reading an SDRF accepts a snapshot in place of the TSV file: :func:`read_sdrf` returns the same
+dataframe as ``pd.read_csv(sdrf_file, sep="\\t")`` for both, with the duplicated column names renamed like pandas does
+(``comment[modification parameters].1``...). :meth:`SdrfDataFrame.parse` reads the snapshot without building the
+cells: the distinct values of every column are lowercased and the column is built from the codes.
+"""
+
+import json
+import typing
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from sdrf_pipelines import __version__
+
+SNAPSHOT_SUFFIX = ".sdrf.arrow"
+# Magic bytes at the start of an Arrow IPC file
+ARROW_MAGIC = b"ARROW1"
+METADATA_KEY = b"sdrf-pipelines"
+COLUMNS_KEY = b"sdrf-pipelines.columns"
+
+
+def is_snapshot(sdrf_file: str) -> bool:
+    """
+    Return True if the file is an SDRF snapshot (an Arrow IPC file), whatever its extension.
+    """
+    try:
+        with open(sdrf_file, "rb") as fh:
+            return fh.read(len(ARROW_MAGIC)) == ARROW_MAGIC
+    except (OSError, TypeError):
+        return False
+
+
+def get_snapshot_file(sdrf_file: str) -> str:
+    """
+    Return the default snapshot file of an SDRF file, e.g. PXD000001.sdrf.tsv -> PXD000001.sdrf.arrow
+    """
+    base = sdrf_file
+    for suffix in (".sdrf.tsv", ".tsv", ".sdrf"):
+        if base.lower().endswith(suffix):
+            base = base[: -len(suffix)]
+            break
+    return base + SNAPSHOT_SUFFIX
+
+
+def _to_arrow(column: pd.Series) -> pa.Array:
+    array = pa.array(column, from_pandas=True)
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        # SDRF columns repeat heavily, the dictionary keeps the snapshot small and the reload fast
+        array = array.dictionary_encode()
+    return array
+
+
+def write_snapshot(sdrf_file: str, snapshot_file: str = None) -> str:
+    """
+    Write the snapshot of an SDRF file.
+    :param sdrf_file: SDRF file (TSV)
+    :param snapshot_file: output file, by default the SDRF file with the .sdrf.arrow extension
+    :return: the snapshot file
+    """
+    if snapshot_file is None:
+        snapshot_file = get_snapshot_file(sdrf_file)
+    # the empty lines are kept, for the row numbers of the validation errors
+    df = pd.read_csv(sdrf_file, sep="\t", skip_blank_lines=False)
+    # the header as it is in the file, pandas renames the duplicated and empty names
+    header = pd.read_csv(sdrf_file, sep="\t", header=None, nrows=1, dtype=str, keep_default_na=False)
+    names = header.iloc[0].tolist() if header.shape[1] == df.shape[1] else list(df.columns)
+
+    arrays = [_to_arrow(df.iloc[:, i]) for i in range(df.shape[1])]
+    # the names given by pandas are kept with the snapshot, to read it back with the same names
+    metadata = {METADATA_KEY: __version__.encode(), COLUMNS_KEY: json.dumps(list(df.columns)).encode()}
+    schema = pa.schema([pa.field(name, array.type) for name, array in zip(names, arrays)], metadata=metadata)
+    table = pa.Table.from_arrays(arrays, schema=schema)
+    with pa.OSFile(snapshot_file, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+    return snapshot_file
+
+
+def read_snapshot_table(snapshot_file: str) -> pa.Table:
+    """
+    Read a snapshot as an Arrow table, memory-mapped.
+    """
+    with pa.memory_map(snapshot_file, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _column_names(table: pa.Table) -> typing.List[str]:
+    """
+    Return the column names of a snapshot as pandas gives them, duplicated names renamed.
+    """
+    return json.loads(table.schema.metadata[COLUMNS_KEY])
+
+
+def _column_codes(column: pa.ChunkedArray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the codes (-1 for the missing values) and the distinct values of a column of a snapshot.
+    """
+    if column.num_chunks != 1:
+        column = pa.chunked_array([column.combine_chunks()]) if column.num_chunks else pa.chunked_array([], column.type)
+        if pa.types.is_dictionary(column.type):
+            column = column.unify_dictionaries()
+    array = column.chunk(0) if column.num_chunks else pa.array([], column.type)
+    if pa.types.is_dictionary(array.type):
+        codes = array.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.intp, copy=False)
+        return codes, array.dictionary.to_numpy(zero_copy_only=False)
+    return pd.factorize(array.to_numpy(zero_copy_only=False))
+
+
+def read_snapshot_codes(snapshot_file: str) -> typing.Tuple[typing.List[str], typing.List[tuple]]:
+    """
+    Read the columns of a snapshot as codes and distinct values, without building the values of every cell.
+    :return: tuple (column names renamed like ``pd.read_csv`` does, list of (codes, distinct values) per column)
+    """
+    table = read_snapshot_table(snapshot_file)
+    return _column_names(table), [_column_codes(column) for column in table.columns]
+
+
+def read_snapshot(snapshot_file: str) -> pd.DataFrame:
+    """
+    Read a snapshot into a dataframe, the same as ``pd.read_csv`` of the SDRF file.
+    """
+    table = read_snapshot_table(snapshot_file)
+    columns = {}
+    for i, column in enumerate(table.columns):
+        if pa.types.is_dictionary(column.type):
+            codes, uniques = _column_codes(column)
+            # the missing values (code -1) are the last value, NaN like in pd.read_csv
+            columns[i] = np.append(uniques.astype(object), np.nan)[codes]
+        else:
+            columns[i] = column.to_numpy()
+    df = pd.DataFrame(columns, index=pd.RangeIndex(table.num_rows))
+    df.columns = _column_names(table)
+    # the rows without any value are the empty lines, that pd.read_csv skips
+    if any(column.null_count for column in table.columns):
+        empty = df.isna().all(axis=1)
+        if empty.any():
+            df = df[~empty].reset_index(drop=True)
+    return df
+
+
+def read_sdrf(sdrf_file: typing.Union[str, pd.DataFrame], **kwargs) -> pd.DataFrame:
+    """
+    Read an SDRF file or its snapshot into a dataframe.
+    :param sdrf_file: SDRF file (TSV) or snapshot. A dataframe, e.g. the SDRF of a previous step of a pipeline, is
+        returned as a copy, so the converters can change it
+    :param kwargs: options of ``pd.read_csv`` for the TSV files
+    """
+    if isinstance(sdrf_file, pd.DataFrame):
+        return sdrf_file.copy()
+    if is_snapshot(sdrf_file):
+        return read_snapshot(sdrf_file)
+    return pd.read_csv(sdrf_file, sep="\t", **kwargs)
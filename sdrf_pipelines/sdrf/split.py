@@ -0,0 +1,405 @@
+"""
+Splitting of an SDRF file into one file per value of some of its columns.
+
+The SDRF is read once, line by line: every row is routed to the file of its group as it is read, without parsing the
+file into a dataframe, and the header and the rows are written as they are in the SDRF (with ``\\n`` line endings),
+quoted cells included. The cells are separated by tabs and the rows by new lines, the quoted cells cannot contain them.
+The rows of every group are buffered and the buffers are written by a pool of writer threads, every file by the same
+thread. At most ``max_open_files`` files are open at once: the least recently written one is closed, and reopened to
+append, when another one is needed. The files are written to temporary files that are renamed once the whole SDRF is
+split, so that partial files are never visible.
+"""
+
+import contextlib
+import csv
+import io
+import os
+import queue
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from sdrf_pipelines.sdrf.snapshot import is_snapshot
+from sdrf_pipelines.sdrf.snapshot import read_snapshot
+from sdrf_pipelines.sdrf.snapshot import read_snapshot_table
+
+DEFAULT_MAX_OPEN_FILES = 256
+# rows of a group buffered before they are written, and of all the groups together
+GROUP_BUFFER_SIZE = 1 << 16
+MAX_BUFFERED_SIZE = 1 << 24
+# batches of buffers waiting for every writer thread, and maximum number of buffers of a batch
+WRITE_QUEUE_SIZE = 16
+WRITE_BATCH_SIZE = 1024
+# message of the writer threads to close their files
+CLOSE = object()
+# the progress is reported every few seconds, the time is checked every few rows
+PROGRESS_INTERVAL = 5.0
+PROGRESS_ROWS = 10000
+
+
+def column_names(header: typing.List[str]) -> typing.List[str]:
+    """
+    Return the names of the columns of an SDRF header as pandas gives them: the duplicated names get a number
+    (``comment[modification parameters].1``...) and the empty ones are ``Unnamed: <position>``.
+    """
+    names = []
+    seen = {}
+    for i, name in enumerate(header):
+        if not name:
+            name = f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def unquote(cell: str) -> str:
+    """
+    Return the value of a cell, without the quotes of a quoted cell ("TA=S,T,Y" -> TA=S,T,Y).
+    """
+    if len(cell) > 1 and cell[0] == '"' and cell[-1] == '"':
+        return cell[1:-1].replace('""', '"')
+    return cell
+
+
+def get_prefix(sdrf_file: str) -> str:
+    """
+    Return the default prefix of the files of a split, the name of the SDRF file without its extensions
+    (PXD000001.sdrf.tsv -> PXD000001).
+    """
+    file_name = os.path.basename(sdrf_file)
+    if len(file_name.split(".")) > 2:
+        return ".".join(file_name.split(".")[:-2])
+    return file_name.split(".")[0]
+
+
+def get_split_file_name(prefix: str, key: typing.Tuple[str, ...]) -> str:
+    """
+    Return the name of the file of a group, e.g. PXD000001-Homo_sapiens.sdrf.tsv
+    """
+    return prefix + "-" + "-".join(key).replace(" ", "_") + ".sdrf.tsv"
+
+
+def read_sdrf_lines(sdrf_file: str) -> typing.Tuple[typing.List[str], str, typing.TextIO]:
+    """
+    Read an SDRF file line by line.
+    :param sdrf_file: SDRF file (TSV) or snapshot. The rows of a snapshot are written like pandas writes them
+    :return: tuple (cells of the header, header line, open file of the rows after the header). The header line ends
+        with ``\\n``, the last row may not
+    """
+    if is_snapshot(sdrf_file):
+        header = read_snapshot_table(sdrf_file).schema.names
+        rows = read_snapshot(sdrf_file).to_csv(sep="\t", header=False, index=False, quoting=csv.QUOTE_NONE)
+        return header, "\t".join(header) + "\n", io.StringIO(rows)
+
+    # universal newlines, the lines of the output end with \n whatever the line endings of the SDRF
+    fh = open(sdrf_file, encoding="utf-8-sig")
+    header_line = fh.readline().rstrip("\n") + "\n"
+    return header_line[:-1].split("\t"), header_line, fh
+
+
+class SplitProgress:
+    """
+    Rows read, files and bytes written and wall time of a split.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.rows = 0
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def update(self, rows: int, files: int, written: int):
+        self.rows = rows
+        self.files = files
+        self.bytes = written
+        self.seconds = time.perf_counter() - self.start
+
+    def __str__(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        megabytes = self.bytes / 1e6
+        return (
+            f"{self.rows} rows, {self.files} files, {megabytes:.1f} MB in {self.seconds:.1f} s "
+            f"({self.rows / seconds:.0f} rows/s, {megabytes / seconds:.1f} MB/s)"
+        )
+
+
+def temporary_path(path: str) -> str:
+    """
+    Return the temporary file of a file of a split, renamed to the file once the split is complete.
+    """
+    return f"{path}.{os.getpid()}.tmp"
+
+
+class _FileShard:
+    """
+    Files of some of the groups of a split, written by one thread with a bounded number of open files. The thread
+    receives batches of (file, lines), then :data:`CLOSE` and, once all the writers have closed their files, whether
+    the split is complete: the temporary files are then renamed to the files, or removed.
+    """
+
+    def __init__(self, max_open_files: int):
+        self.max_open_files = max(1, max_open_files)
+        # open files, the least recently written first
+        self.handles = OrderedDict()
+        self.paths = set()
+        self.bytes = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.thread = None
+
+    def write(self, path: str, lines: typing.List[str]):
+        data = "".join(lines).encode("utf-8")
+        handle = self.handles.pop(path, None)
+        if handle is None:
+            if len(self.handles) >= self.max_open_files:
+                _, oldest = self.handles.popitem(last=False)
+                oldest.close()
+            handle = open(temporary_path(path), "ab" if path in self.paths else "wb")
+            self.paths.add(path)
+        self.handles[path] = handle
+        handle.write(data)
+        self.bytes += len(data)
+
+    def write_batch(self, batch: typing.List[tuple]):
+        if self.error is None:
+            try:
+                for path, lines in batch:
+                    self.write(path, lines)
+            except BaseException as ex:
+                self.error = ex
+
+    def close_files(self):
+        try:
+            while self.handles:
+                self.handles.popitem()[1].close()
+        except BaseException as ex:
+            self.error = self.error or ex
+
+    def finish(self, complete: bool):
+        for path in self.paths:
+            if complete:
+                os.replace(temporary_path(path), path)
+            else:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(temporary_path(path))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is CLOSE:
+                    self.close_files()
+                elif isinstance(item, bool):
+                    try:
+                        self.finish(item)
+                    except BaseException as ex:
+                        self.error = self.error or ex
+                    break
+                else:
+                    # after an error the batches are still taken, so that the split is not blocked
+                    self.write_batch(item)
+            finally:
+                self.queue.task_done()
+
+    def submit(self, batch: typing.List[tuple]):
+        if self.error is not None:
+            raise self.error
+        if self.thread is None:
+            self.write_batch(batch)
+        else:
+            self.queue.put(batch)
+
+    def request_close(self):
+        if self.thread is None:
+            self.close_files()
+        else:
+            self.queue.put(CLOSE)
+
+    def wait(self):
+        if self.thread is not None:
+            self.queue.join()
+
+    def request_finish(self, complete: bool):
+        if self.thread is None:
+            self.finish(complete)
+        else:
+            self.queue.put(complete)
+
+
+class GroupFiles:
+    """
+    Buffered files of the groups of a split. The buffers are written by a pool of writer threads, every file by the
+    same thread, to temporary files that are renamed once the split is complete, so that partial files are never
+    visible.
+    :param header_line: first line of every file
+    :param max_open_files: maximum number of files open at once, shared by the writers
+    :param jobs: number of writer threads, 1 writes in the thread of the split, at most one per open file
+    """
+
+    def __init__(self, header_line: str, max_open_files: int = DEFAULT_MAX_OPEN_FILES, jobs: int = 1):
+        self.header_line = header_line
+        max_open_files = max(1, max_open_files)
+        jobs = max(1, min(jobs, max_open_files))
+        # the open files are shared out between the writers, the first ones get the remainder
+        quota, remainder = divmod(max_open_files, jobs)
+        self.shards = [_FileShard(quota + (i < remainder)) for i in range(jobs)]
+        if jobs > 1:
+            for shard in self.shards:
+                shard.start()
+        self.buffers = {}
+        self.sizes = {}
+        self.rows = {}
+        # shard of every file, the files are given to the shards in turn
+        self.file_shards = {}
+        self.buffered = 0
+
+    @property
+    def bytes(self) -> int:
+        return sum(shard.bytes for shard in self.shards)
+
+    def write(self, path: str, line: str):
+        buffer = self.buffers.get(path)
+        if buffer is None:
+            buffer = self.buffers[path] = [self.header_line]
+            self.sizes[path] = len(self.header_line)
+            self.rows[path] = 0
+            self.file_shards[path] = len(self.file_shards) % len(self.shards)
+        buffer.append(line)
+        self.sizes[path] += len(line)
+        self.rows[path] += 1
+        self.buffered += len(line)
+        if self.sizes[path] >= GROUP_BUFFER_SIZE:
+            self.shards[self.file_shards[path]].submit([(path, self.take(path))])
+        elif self.buffered >= MAX_BUFFERED_SIZE:
+            self.flush_all()
+
+    def take(self, path: str) -> typing.List[str]:
+        buffer = self.buffers[path]
+        self.buffered -= self.sizes[path]
+        self.buffers[path] = []
+        self.sizes[path] = 0
+        return buffer
+
+    def flush_all(self):
+        # the buffers are sent to every writer in batches, many groups have a few rows
+        batches = [[] for _ in self.shards]
+        for path, buffer in self.buffers.items():
+            if buffer:
+                batch = batches[self.file_shards[path]]
+                batch.append((path, self.take(path)))
+                if len(batch) >= WRITE_BATCH_SIZE:
+                    self.shards[self.file_shards[path]].submit(batch)
+                    batches[self.file_shards[path]] = []
+        for shard, batch in zip(self.shards, batches):
+            if batch:
+                shard.submit(batch)
+        self.buffered = 0
+
+    def close(self, complete: bool = True):
+        """
+        Write the buffers and close the files. The temporary files are renamed to the files of the groups if the split
+        is complete, and removed otherwise.
+        """
+        try:
+            if complete:
+                self.flush_all()
+        except BaseException:
+            complete = False
+            raise
+        finally:
+            # the files are renamed once all the writers have written and closed theirs
+            for shard in self.shards:
+                shard.request_close()
+            for shard in self.shards:
+                shard.wait()
+            errors = [shard.error for shard in self.shards if shard.error is not None]
+            for shard in self.shards:
+                shard.request_finish(complete and not errors)
+            for shard in self.shards:
+                shard.wait()
+            errors = [shard.error for shard in self.shards if shard.error is not None]
+            if errors:
+                raise errors[0]
+
+
+def split_sdrf_file(
+    sdrf_file: str,
+    attributes: typing.List[str],
+    prefix: str = None,
+    output_directory: str = None,
+    max_open_files: int = DEFAULT_MAX_OPEN_FILES,
+    jobs: int = None,
+    progress: typing.Callable[[SplitProgress], None] = None,
+) -> typing.Dict[str, int]:
+    """
+    Split an SDRF file into one file per distinct value of the given columns. The rows with an empty value in any of
+    the columns are not written.
+    :param sdrf_file: SDRF file (TSV) or snapshot
+    :param attributes: columns of the groups, the duplicated columns are named like pandas does
+        (``comment[modification parameters].1``)
+    :param prefix: prefix of the names of the files, by default the name of the SDRF file without its extensions
+    :param output_directory: directory of the files, by default the directory of the SDRF file
+    :param max_open_files: maximum number of files open at once
+    :param jobs: number of writer threads, the number of CPUs by default (at most max_open_files), 1 writes in the
+        thread of the split
+    :param progress: if given, called with the progress of the split every few seconds and at the end
+    :return: the number of rows written to every file, by file path
+    """
+    header, header_line, lines = read_sdrf_lines(sdrf_file)
+    with lines:
+        names = column_names(header)
+        positions = []
+        for attribute in attributes:
+            if attribute not in names:
+                raise KeyError(attribute)
+            positions.append(names.index(attribute))
+        # the cells after the last column of the groups are not split
+        max_split = max(positions) + 1
+        if prefix is None:
+            prefix = get_prefix(sdrf_file)
+        if output_directory is None:
+            output_directory = os.path.dirname(sdrf_file)
+
+        status = SplitProgress()
+        next_report = status.start + PROGRESS_INTERVAL
+        files = GroupFiles(header_line, max_open_files, jobs or os.cpu_count() or 1)
+        paths = {}
+        n_rows = 0
+        complete = False
+        try:
+            for line in lines:
+                n_rows += 1
+                if not line.endswith("\n"):
+                    line += "\n"
+                cells = line[:-1].split("\t", max_split)
+                if len(cells) < max_split:
+                    # the empty lines, and the rows missing the columns of the groups
+                    continue
+                key = tuple([unquote(cells[position]) for position in positions])
+                if "" in key:
+                    continue
+                path = paths.get(key)
+                if path is None:
+                    path = paths[key] = os.path.join(output_directory, get_split_file_name(prefix, key))
+                files.write(path, line)
+                if progress is not None and not n_rows % PROGRESS_ROWS and time.perf_counter() >= next_report:
+                    status.update(n_rows, len(paths), files.bytes)
+                    progress(status)
+                    next_report = time.perf_counter() + PROGRESS_INTERVAL
+            complete = True
+        finally:
+            files.close(complete)
+    if progress is not None:
+        status.update(n_rows, len(paths), files.bytes)
+        progress(status)
+    return dict(files.rows)
@@ -0,0 +1,199 @@
+"""
+Loading of the validation templates.
+
+The templates are declared in YAML (or JSON) files in the ``templates`` folder, one file per template. A definition is
+compiled into a :class:`SDRFSchema` (regexes compiled, ontology lookups bound). Parsing the YAML is the slow part, so
+the parsed definition is cached on disk as JSON, keyed by the hash of the definition file, and later runs only build the
+schema from it. Only plain data is cached, the rules are always created by the installed code. Templates are loaded on
+request, a template that is not used is never read.
+
+A definition looks like::
+
+    name: human
+    extends: default
+    min_columns: 7
+    columns:
+    - name: characteristics[age]
+      optional: false
+      allow_empty: true
+      validations: [leading_whitespace, trailing_whitespace]
+      optional_validations:
+      - pattern: {pattern: '^\\d+y$', case: false}
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import typing
+
+import pkg_resources
+import yaml
+
+from sdrf_pipelines import __version__
+from sdrf_pipelines.sdrf.rules import ColumnRule
+from sdrf_pipelines.sdrf.rules import LeadingWhitespaceValidation
+from sdrf_pipelines.sdrf.rules import MatchesPatternValidation
+from sdrf_pipelines.sdrf.rules import TrailingWhitespaceValidation
+from sdrf_pipelines.sdrf.sdrf_schema import OntologyTerm
+from sdrf_pipelines.sdrf.sdrf_schema import SDRFColumn
+from sdrf_pipelines.sdrf.sdrf_schema import SDRFSchema
+from sdrf_pipelines.utils.cache import get_cache_home
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = pkg_resources.resource_filename(__name__, "templates")
+TEMPLATE_EXTENSIONS = (".yml", ".yaml", ".json")
+
+# Column rules that can be used in the definitions, by code
+COLUMN_RULES = {
+    rule.code: rule
+    for rule in (LeadingWhitespaceValidation, TrailingWhitespaceValidation, MatchesPatternValidation, OntologyTerm)
+}
+
+_loaded_templates: typing.Dict[typing.Tuple[str, str], SDRFSchema] = {}
+
+
+def get_cache_dir() -> str:
+    """
+    Folder of the compiled templates, $SDRF_PIPELINES_CACHE or the user cache folder.
+    """
+    return os.path.join(get_cache_home(), "templates")
+
+
+def find_template_file(name: str, templates_dir: str = TEMPLATES_DIR) -> str:
+    """
+    Return the definition file of a template.
+    :param name: name of the template
+    :param templates_dir: folder with the template definitions
+    """
+    for extension in TEMPLATE_EXTENSIONS:
+        path = os.path.join(templates_dir, name + extension)
+        if os.path.isfile(path):
+            return path
+    raise ValueError(f"The template {name} is not defined in {templates_dir}")
+
+
+def compile_rule(definition) -> ColumnRule:
+    """
+    Create a column rule from its definition, either the code of the rule or a mapping {code: arguments}.
+    """
+    if isinstance(definition, str):
+        code, arguments = definition, {}
+    elif isinstance(definition, dict) and len(definition) == 1:
+        code, arguments = next(iter(definition.items()))
+        arguments = arguments or {}
+    else:
+        raise ValueError(f"Invalid rule definition: {definition}")
+    if code not in COLUMN_RULES:
+        raise ValueError(f"Unknown rule {code}, the available rules are: {', '.join(COLUMN_RULES)}")
+    return COLUMN_RULES[code](**arguments)
+
+
+def compile_template(definition: dict) -> SDRFSchema:
+    """
+    Compile the definition of a template into a schema.
+    :param definition: the parsed YAML/JSON definition
+    """
+    columns = []
+    for column in definition.get("columns", []):
+        columns.append(
+            SDRFColumn(
+                column["name"],
+                [compile_rule(rule) for rule in column.get("validations", [])],
+                [compile_rule(rule) for rule in column.get("optional_validations", [])],
+                allow_empty=column.get("allow_empty", False),
+                optional_type=column.get("optional", True),
+            )
+        )
+    return SDRFSchema(
+        columns,
+        min_columns=definition.get("min_columns", 0),
+        name=definition.get("name"),
+        extends=definition.get("extends"),
+    )
+
+
+def _read_cached_definition(cache_file: str) -> typing.Optional[dict]:
+    try:
+        with open(cache_file, "rb") as fh:
+            definition = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except ValueError as ex:  # a corrupted cache is parsed again
+        logger.debug("Ignoring the cached template %s: %s", cache_file, ex)
+        return None
+    return definition if isinstance(definition, dict) else None
+
+
+def _write_cached_definition(cache_file: str, definition: dict):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(cache_file), suffix=".tmp", delete=False) as fh:
+            json.dump(definition, fh)
+        os.replace(fh.name, cache_file)
+    except (OSError, TypeError, ValueError) as ex:
+        logger.debug("The template could not be cached in %s: %s", cache_file, ex)
+
+
+def read_definition(name: str, templates_dir: str = TEMPLATES_DIR) -> typing.Tuple[bytes, str]:
+    """
+    Read the definition file of a template.
+    :return: the content of the file and its hash
+    """
+    with open(find_template_file(name, templates_dir), "rb") as fh:
+        content = fh.read()
+    digest = hashlib.sha256(__version__.encode() + b"\0" + content).hexdigest()
+    return content, digest
+
+
+def load_template(name: str, templates_dir: str = TEMPLATES_DIR, use_cache: bool = True) -> SDRFSchema:
+    """
+    Return the compiled schema of a template, only the template itself (not the templates it extends).
+    :param name: name of the template
+    :param templates_dir: folder with the template definitions
+    :param use_cache: read and write the parsed definition from the disk cache
+    """
+    key = (templates_dir, name)
+    if key in _loaded_templates:
+        return _loaded_templates[key]
+
+    content, digest = read_definition(name, templates_dir)
+    definition = None
+    cache_file = os.path.join(get_cache_dir(), f"{name}-{digest}.json")
+    if use_cache:
+        definition = _read_cached_definition(cache_file)
+    if definition is None:
+        # the YAML is only parsed when there is no cached version of it
+        definition = yaml.safe_load(content)
+        if use_cache:
+            _write_cached_definition(cache_file, definition)
+    schema = compile_template(definition)
+    schema.digest = digest
+    _loaded_templates[key] = schema
+    return schema
+
+
+def load_schemas(name: str, templates_dir: str = TEMPLATES_DIR, use_cache: bool = True) -> typing.List[SDRFSchema]:
+    """
+    Return the schemas to validate a template with: the templates it extends first, then the template.
+    :param name: name of the template
+    :param templates_dir: folder with the template definitions
+    :param use_cache: read and write the parsed definitions from the disk cache
+    """
+    schemas = []
+    while name is not None:
+        schema = load_template(name, templates_dir, use_cache)
+        if schema in schemas:
+            raise ValueError(f"The template {name} extends itself")
+        schemas.insert(0, schema)
+        name = schema.extends
+    return schemas
+
+
+def template_digest(name: str, templates_dir: str = TEMPLATES_DIR) -> str:
+    """
+    Return the hashes of the definitions of a template and of the templates it extends.
+    """
+    return "-".join(schema.digest for schema in load_schemas(name, templates_dir))
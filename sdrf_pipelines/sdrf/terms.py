@@ -0,0 +1,132 @@
+"""
+Parser of the key-value terms of the SDRF cells, e.g. ``NT=Oxidation;AC=UNIMOD:35;MT=Variable;TA=M``.
+
+The cells of a column repeat a handful of distinct values, every distinct value is parsed once. :func:`parse_term`
+returns an immutable and hashable :class:`Term` and is memoized, :func:`extract_keys` extracts the keys of the cells of
+a column with one pass of a regular expression over the distinct values.
+
+The keys are read like the expressions the converters used (``NT=(.+?)(;|$)``): the value of a key runs until the next
+``;``, the first value of a key is kept, and a key without a value is missing. Keys are case-sensitive.
+"""
+
+import functools
+import re
+import typing
+
+import numpy as np
+import pandas as pd
+
+NAME = "NT"
+ACCESSION = "AC"
+MODIFICATION_TYPE = "MT"
+POSITION = "PP"
+TARGET = "TA"
+FORMULA = "CF"
+
+_key_value = re.compile(r"(?:^|;)\s*([A-Za-z]+)=([^;]+)")
+
+
+class Term:
+    """
+    The keys and values of an SDRF cell, read-only.
+    """
+
+    __slots__ = ("_values", "_hash")
+
+    def __init__(self, values: typing.Mapping[str, str]):
+        object.__setattr__(self, "_values", dict(values))
+        object.__setattr__(self, "_hash", hash(frozenset(self._values.items())))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Term is read-only")
+
+    def __getitem__(self, key: str) -> str:
+        return self._values[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Term) and self._values == other._values
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"Term({format_term(self._values)!r})"
+
+    def __reduce__(self):
+        return Term, (self._values,)
+
+    def get(self, key: str, default: str = None) -> typing.Optional[str]:
+        return self._values.get(key, default)
+
+    def items(self):
+        return self._values.items()
+
+    @property
+    def name(self) -> typing.Optional[str]:
+        return self._values.get(NAME)
+
+    @property
+    def accession(self) -> typing.Optional[str]:
+        return self._values.get(ACCESSION)
+
+
+def _first_values(pairs: typing.Iterable[typing.Tuple[str, str]]) -> typing.Dict[str, str]:
+    values = {}
+    for key, value in pairs:
+        values.setdefault(key, value)
+    return values
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def parse_term(cell: str) -> Term:
+    """
+    Parse an SDRF cell into its keys and values, e.g. NT=Oxidation;AC=UNIMOD:35 -> Term(NT=Oxidation, AC=UNIMOD:35).
+    The cells without any key, e.g. "label free sample", give an empty term.
+    """
+    return Term(_first_values(_key_value.findall(cell)))
+
+
+def format_term(values: typing.Mapping[str, str]) -> str:
+    """
+    Return the SDRF cell of keys and values, e.g. {"NT": "Oxidation", "AC": "UNIMOD:35"} -> NT=Oxidation;AC=UNIMOD:35
+    """
+    return ";".join(f"{key}={value}" for key, value in values.items())
+
+
+def parse_column(column: pd.Series) -> pd.Series:
+    """
+    Parse the cells of a column into terms, every distinct cell is parsed once.
+    """
+    codes, uniques = pd.factorize(column)
+    terms = [parse_term(str(value)) for value in uniques]
+    return pd.Series([terms[code] if code >= 0 else None for code in codes], index=column.index, dtype=object)
+
+
+def extract_keys(column: pd.Series, keys: typing.Iterable[str] = (NAME, ACCESSION)) -> pd.DataFrame:
+    """
+    Extract keys from the cells of a column, with one regular expression pass over the distinct cells.
+    :param column: cells of an SDRF column
+    :param keys: the keys to extract
+    :return: one column per key, None where the cell does not have the key
+    """
+    keys = list(keys)
+    codes, uniques = pd.factorize(column)
+    # one row per distinct cell, the last one (code -1) for the missing cells
+    values = np.full((len(uniques) + 1, len(keys)), None, dtype=object)
+    if len(uniques):
+        found = pd.Series(uniques, dtype=object).astype(str).str.extractall(_key_value.pattern)
+        found = found[found[0].isin(keys)].droplevel("match").reset_index()
+        # the first value of every key of a cell
+        found = found.drop_duplicates(["index", 0])
+        columns = found[0].map({key: position for position, key in enumerate(keys)}).to_numpy(dtype=np.intp)
+        values[found["index"].to_numpy(dtype=np.intp), columns] = found[1].to_numpy()
+    return pd.DataFrame(values[codes], index=column.index, columns=keys)
@@ -7,6 +7,13 @@ import yaml
 from sdrf_pipelines.ols.ols import OlsClient
 from sdrf_pipelines.openms.unimod import UnimodDatabase
 from sdrf_pipelines.sdrf.sdrf import SdrfDataFrame
+from sdrf_pipelines.sdrf.terms import ACCESSION
+from sdrf_pipelines.sdrf.terms import MODIFICATION_TYPE
+from sdrf_pipelines.sdrf.terms import NAME
+from sdrf_pipelines.sdrf.terms import POSITION
+from sdrf_pipelines.sdrf.terms import TARGET
+from sdrf_pipelines.sdrf.terms import extract_keys
+from sdrf_pipelines.sdrf.terms import format_term
 
 # Accessing ontologies and CVs
 unimod = UnimodDatabase()
@@ -70,7 +77,7 @@ value!!\nWe found '
 https://bioportal.bioontology.org/ontologies/MS/?p=classes&conceptid=http%3A%2F%2Fpurl.obolibrary.org%2Fobo%2FMS_1001045 \
 for available terms"
             )
-        pvalue = "NT=" + pvalue + ";AC=" + ols_out[0]["short_form"]
+        pvalue = format_term({NAME: pvalue, ACCESSION: ols_out[0]["short_form"]})
     return pvalue
 
 
@@ -106,15 +113,12 @@ Note that it should be single residues"
 used space between the comma separated modifications'
             )
         modtype = pname.replace("_mods", "")
+        term = {NAME: modname, ACCESSION: found[0].get_accession(), MODIFICATION_TYPE: modtype}
         if re.fullmatch("[A-Z]", modpos):
             print(modpos)
-            mod_columns[len(mod_columns.columns) + 1] = (
-                "NT=" + modname + ";AC=" + found[0].get_accession() + ";MT=" + modtype + ";TA=" + modpos
-            )
+            mod_columns[len(mod_columns.columns) + 1] = format_term({**term, TARGET: modpos})
         elif modpos in ["Protein N-term", "Protein C-term", "Any N-term", "Any C-term"]:
-            mod_columns[len(mod_columns.columns) + 1] = (
-                "NT=" + modname + ";AC=" + found[0].get_accession() + ";MT=" + modtype + ";PP=" + modpos
-            )
+            mod_columns[len(mod_columns.columns) + 1] = format_term({**term, POSITION: modpos})
         else:
             exit(
                 "ERROR: Wrong residue given: "
@@ -152,13 +156,14 @@ if has_sdrf:
     mod_columns = sdrf_content.filter(like="comment[modification parameters]")
     sdrf_content = sdrf_content.drop(columns=mod_columns.columns)
     sdrf_content["comment[modification parameters]"] = None
+    modification_types = {x: extract_keys(mod_columns[x], [MODIFICATION_TYPE])[MODIFICATION_TYPE] for x in mod_columns}
     # delete columns with fixed/variable modification info
     if "fixed_mods" in params_in.keys():
-        ttt = [x for x in mod_columns.columns if any(mod_columns[x].str.contains("MT=fixed"))]
+        ttt = [x for x in mod_columns.columns if any(modification_types[x] == "fixed")]
         mod_columns.drop(ttt, axis=1, inplace=True)
         overwritten.add("fixed_mods")
     if "variable_mods" in params_in.keys():
-        ttt = [x for x in mod_columns.columns if any(mod_columns[x].str.contains("MT=variable"))]
+        ttt = [x for x in mod_columns.columns if any(modification_types[x] == "variable")]
         mod_columns.drop(ttt, axis=1, inplace=True)
         overwritten.add("variable_mods")
 else:
@@ -0,0 +1,415 @@
+"""
+Resident service of validations and conversions, and its client.
+
+``parse_sdrf serve`` starts an HTTP server on the local machine that keeps the OLS client with the memory-mapped
+ontology indexes, the compiled templates and the OpenMS converter with the Unimod database loaded. They are loaded once
+in the server process and the pool of worker processes is forked from it, so a request only pays for its own SDRF; the
+workers also keep the memo of the ontology lookups from one request to the next, but for the terms that the OLS service
+did not find, which are searched again. The requests are run concurrently, one per worker.
+
+The requests and responses are JSON documents, the files are paths on the machine of the server:
+
+- ``GET /health``: the service, its version and its number of workers
+- ``POST /validate``: ``{"sdrf_file": ..., "template": ..., "max_errors": ..., ...}``, the options of
+  :func:`~sdrf_pipelines.sdrf.batch.validate_file`. The response has the errors as records and as the messages printed
+  by validate-sdrf
+- ``POST /convert-openms``: ``{"sdrf_file": ..., "output": ..., "one_table": ..., ...}``, the options of
+  :meth:`~sdrf_pipelines.openms.openms.OpenMS.convert_tables`. The files are written to the output directory and the
+  response is the row of the conversion in the summary of a batch, with the messages of the conversion in ``log``
+
+Every request must carry the token of the server, ``Authorization: Bearer <token>``, or it is answered with 401. The
+token is ``$SDRF_PIPELINES_SERVER_TOKEN`` if it is set when the server starts, and a random one otherwise.
+
+The address and the token of a running server are written to ``server.json`` in the cache folder, readable only by
+its user. validate-sdrf and convert-openms forward their requests to it when asked to, with ``--server`` or by setting
+``$SDRF_PIPELINES_SERVER`` to the address of a server, and only if it runs the same version of sdrf-pipelines;
+otherwise they run in their own process.
+
+Trust model: the server reads any SDRF file and writes the OpenMS files to any directory that the user running it can
+read and write, so a client with the token can do everything that user can do with files. The token is what keeps the
+other users of the machine out, and the server listens on the loopback interface only, unless ``allow_remote`` is
+given (``--allow-remote``), in which case the requests and the token travel unencrypted over the network.
+"""
+
+import hmac
+import io
+import ipaddress
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import typing
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from sdrf_pipelines import __version__
+from sdrf_pipelines.openms.batch import convert_file
+from sdrf_pipelines.openms.batch import get_converter
+from sdrf_pipelines.sdrf.batch import validate_file
+from sdrf_pipelines.sdrf.errors import ErrorTable
+from sdrf_pipelines.sdrf.incremental import ErrorBudget
+from sdrf_pipelines.sdrf.report import error_records
+from sdrf_pipelines.sdrf.sdrf_schema import ALL_TEMPLATES
+from sdrf_pipelines.sdrf.sdrf_schema import MASS_SPECTROMETRY
+from sdrf_pipelines.sdrf.sdrf_schema import get_ols_client
+from sdrf_pipelines.sdrf.templates import load_schemas
+from sdrf_pipelines.utils.cache import get_cache_home
+
+logger = logging.getLogger(__name__)
+
+SERVICE = "sdrf-pipelines"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SERVER_ENV = "SDRF_PIPELINES_SERVER"
+TOKEN_ENV = "SDRF_PIPELINES_SERVER_TOKEN"
+# seconds to wait for the answer of a server to the health check of a client
+HEALTH_TIMEOUT = 1.0
+
+VALIDATE_OPTIONS = {
+    "template",
+    "skip_ms_validation",
+    "skip_factor_validation",
+    "skip_experimental_design_validation",
+    "use_ols_cache_only",
+    "incremental",
+    "max_errors",
+}
+CONVERT_OPENMS_OPTIONS = {"output", "one_table", "legacy", "split_by_columns", "extension_convert"}
+
+
+class RequestError(Exception):
+    """
+    Request that the service cannot run, e.g. without an SDRF file or with unknown options.
+    """
+
+
+def get_server_file() -> str:
+    """
+    Return the file with the address of the running server, in the cache folder.
+    """
+    return os.path.join(get_cache_home(), "server.json")
+
+
+def read_server_file() -> dict:
+    """
+    Return the address, the pid and the token of the running server, empty if there is none.
+    """
+    try:
+        with open(get_server_file(), encoding="utf-8") as fh:
+            info = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    return info if isinstance(info, dict) else {}
+
+
+def write_server_file(info: dict):
+    """
+    Write the server file, readable and writable by the user only since it holds the token of the server.
+    """
+    server_file = get_server_file()
+    os.makedirs(os.path.dirname(server_file), exist_ok=True)
+    fd = os.open(server_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # the mode of os.open only applies to a new file
+    os.chmod(server_file, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(info, fh)
+
+
+def is_loopback(host: str) -> bool:
+    """
+    Return whether a host is an address of the loopback interface, e.g. 127.0.0.1, ::1 or localhost.
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def warm_up():
+    """
+    Load the OLS client, the templates and the OpenMS converter of the process.
+    """
+    get_ols_client()
+    for template in ALL_TEMPLATES + [MASS_SPECTROMETRY]:
+        load_schemas(template)
+    get_converter()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def validation_response(sdrf_file: str, errors: ErrorTable, budget: ErrorBudget = None) -> dict:
+    """
+    Return the response of the validation of an SDRF file: the errors as records and as messages and, if the budget
+    was exhausted, the numbers of skipped validations and of errors and warnings found per validator.
+    """
+    response = {
+        "file": sdrf_file,
+        "errors": error_records(errors),
+        "messages": [str(error) for error in errors],
+        "exhausted": False,
+    }
+    if budget is not None and budget.exhausted:
+        response["exhausted"] = True
+        response["max_errors"] = budget.max_errors
+        response["skipped"] = budget.skipped
+        response["counts"] = budget.counts.most_common()
+    return response
+
+
+def validate_request(request: dict) -> dict:
+    """
+    Validate the SDRF file of a request, in a worker.
+    """
+    options = dict(request)
+    sdrf_file = options.pop("sdrf_file")
+    max_errors = options.pop("max_errors", None)
+    budget = ErrorBudget(max_errors) if max_errors is not None else None
+    errors = validate_file(sdrf_file, budget=budget, **options)
+    return validation_response(sdrf_file, errors, budget)
+
+
+def convert_openms_request(request: dict) -> dict:
+    """
+    Convert the SDRF file of a request to OpenMS, in a worker.
+    """
+    options = dict(request)
+    sdrf_file = options.pop("sdrf_file")
+    output = options.pop("output", ".")
+    log = io.StringIO()
+    response = convert_file(sdrf_file, output, log=log, **options)
+    response["log"] = log.getvalue()
+    return response
+
+
+ENDPOINTS = {
+    "/validate": (validate_request, VALIDATE_OPTIONS),
+    "/convert-openms": (convert_openms_request, CONVERT_OPENMS_OPTIONS),
+}
+
+
+def parse_request(body: bytes, options: typing.Set[str]) -> dict:
+    """
+    Return the request of a body, a JSON object with the SDRF file and the options of the endpoint.
+    """
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError as ex:
+        raise RequestError(f"The request is not valid JSON: {ex}") from ex
+    if not isinstance(request, dict):
+        raise RequestError("The request must be a JSON object")
+    if not isinstance(request.get("sdrf_file"), str):
+        raise RequestError("The request has no sdrf_file")
+    unknown = set(request) - options - {"sdrf_file"}
+    if unknown:
+        raise RequestError(f"Unknown options: {', '.join(sorted(unknown))}")
+    return request
+
+
+class SdrfRequestHandler(BaseHTTPRequestHandler):
+    server: "SdrfServer"
+
+    def send_json(self, status: int, document: dict):
+        body = json.dumps(document, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self) -> bool:
+        """
+        Return whether the request carries the token of the server, and answer 401 if it does not.
+        """
+        expected = f"Bearer {self.server.token}".encode("utf-8")
+        if hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), expected):
+            return True
+        self.send_json(HTTPStatus.UNAUTHORIZED, {"error": "The request does not carry the token of the server"})
+        return False
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path != "/health":
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        self.send_json(HTTPStatus.OK, {"service": SERVICE, "version": self.server.version, "jobs": self.server.jobs})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        endpoint = ENDPOINTS.get(self.path)
+        if endpoint is None:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        run, options = endpoint
+        try:
+            request = parse_request(self.rfile.read(int(self.headers.get("Content-Length") or 0)), options)
+        except RequestError as ex:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(ex)})
+            return
+        try:
+            response = self.server.executor.submit(run, request).result()
+        except Exception as ex:
+            logger.debug("Request %s %s failed", self.path, request, exc_info=True)
+            self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(ex).__name__}: {ex}"})
+            return
+        self.send_json(HTTPStatus.OK, response)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+class SdrfServer(ThreadingHTTPServer):
+    """
+    HTTP server of the validations and conversions, with a pool of worker processes forked from the warm server.
+    :param address: host and port, port 0 picks a free port
+    :param jobs: number of worker processes, the number of CPUs by default
+    :param token: token of the requests, a random one by default
+    :param allow_remote: listen on an address other than the loopback interface
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: typing.Tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT),
+        jobs: int = None,
+        token: str = None,
+        allow_remote: bool = False,
+    ):
+        if not allow_remote and not is_loopback(address[0]):
+            raise ValueError(
+                f"The server would accept requests from other machines on {address[0]}, listen on {DEFAULT_HOST} or "
+                "allow it with --allow-remote"
+            )
+        self.jobs = jobs or os.cpu_count() or 1
+        self.token = token or secrets.token_urlsafe(32)
+        self.version = __version__
+        warm_up()
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        mp_context = multiprocessing.get_context("fork") if fork else None
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs, mp_context=mp_context, initializer=warm_up)
+        # the workers are started before the threads of the server
+        self.executor.submit(_ping).result()
+        try:
+            super().__init__(address, SdrfRequestHandler)
+        except BaseException:
+            self.executor.shutdown(wait=False)
+            raise
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def server_close(self):
+        super().server_close()
+        # the requests still running are not waited for, the workers exit once they are done
+        self.executor.shutdown(wait=False)
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    jobs: int = None,
+    ready: typing.Callable = None,
+    allow_remote: bool = False,
+):
+    """
+    Run the service until it is interrupted. Its address and token are written to the server file while it runs.
+    :param ready: if given, called with the server once it accepts requests
+    :param allow_remote: listen on an address other than the loopback interface
+    """
+    with SdrfServer((host, port), jobs, token=os.environ.get(TOKEN_ENV), allow_remote=allow_remote) as server:
+        server_file = get_server_file()
+        write_server_file({"url": server.url, "pid": os.getpid(), "token": server.token})
+        try:
+            if ready is not None:
+                ready(server)
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # another server may have been started since
+            if read_server_file().get("pid") == os.getpid():
+                try:
+                    os.unlink(server_file)
+                except OSError:
+                    pass
+
+
+def call_server(url: str, path: str, request: dict = None, timeout: float = None, token: str = None) -> dict:
+    """
+    Send a request to a server and return its response.
+    :param url: address of the server
+    :param path: endpoint, e.g. /validate
+    :param request: JSON object of a POST request, None for a GET request
+    :param timeout: seconds to wait for the response, no limit by default
+    :param token: token of the server
+    """
+    data = json.dumps(request).encode("utf-8") if request is not None else None
+    headers = {"Content-Type": "application/json"}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    http_request = urllib.request.Request(url + path, data=data, headers=headers)
+    with urllib.request.urlopen(http_request, timeout=timeout) as response:
+        return json.load(response)
+
+
+def use_server(requested: bool = False) -> bool:
+    """
+    Return whether the requests are forwarded to a server: asked for by a command (--server) or by
+    $SDRF_PIPELINES_SERVER.
+    """
+    return requested or bool(os.environ.get(SERVER_ENV))
+
+
+def find_server() -> typing.Optional[typing.Tuple[str, str]]:
+    """
+    Return the address and the token of the server if it answers and runs the same version of sdrf-pipelines. The
+    address is $SDRF_PIPELINES_SERVER or the one of the server file, the token $SDRF_PIPELINES_SERVER_TOKEN or the one
+    of the server file if it has the same address.
+    """
+    info = read_server_file()
+    url = os.environ.get(SERVER_ENV) or info.get("url")
+    if not isinstance(url, str) or not url:
+        return None
+    url = url.rstrip("/")
+    token = os.environ.get(TOKEN_ENV)
+    if not token and isinstance(info.get("url"), str) and info["url"].rstrip("/") == url:
+        token = info.get("token")
+    try:
+        health = call_server(url, "/health", timeout=HEALTH_TIMEOUT, token=token)
+    except (OSError, ValueError):
+        return None
+    if health.get("service") != SERVICE:
+        return None
+    if health.get("version") != __version__:
+        logger.warning("The server %s runs sdrf-pipelines %s, not %s", url, health.get("version"), __version__)
+        return None
+    return url, token
+
+
+def forward(path: str, request: dict) -> typing.Optional[dict]:
+    """
+    Run a request on the server. None if there is no server or it cannot run the request, the request is then run in
+    this process.
+    """
+    server = find_server()
+    if server is None:
+        logger.warning("No server of sdrf-pipelines %s is running, the request is run in this process", __version__)
+        return None
+    url, token = server
+    try:
+        return call_server(url, path, request, token=token)
+    except (OSError, ValueError) as ex:
+        logger.warning("The request could not be run by the server %s, it is run in this process: %s", url, ex)
+        return None
@@ -0,0 +1,12 @@
+import os
+
+
+def get_cache_home() -> str:
+    """
+    Folder of the files cached by sdrf-pipelines, $SDRF_PIPELINES_CACHE or the user cache folder.
+    """
+    cache_dir = os.environ.get("SDRF_PIPELINES_CACHE")
+    if cache_dir is None:
+        cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+        cache_dir = os.path.join(cache_home, "sdrf-pipelines")
+    return cache_dir
@@ -1,7 +1,5 @@
 import logging
 
-from pandas_schema import ValidationWarning
-
 
 class AppException(Exception):
     def __init__(self, value):
@@ -14,11 +12,18 @@ class AppException(Exception):
 __all__ = ["LogicError"]
 
 
-class LogicError(ValidationWarning):
+class LogicError:
     def __init__(self, message: str, value: str = None, row: int = -1, column: str = None, error_type: logging = None):
-        super().__init__(message, value, row, column)
+        self.message = message
+        self.value = value
+        self.row = row
+        self.column = column
         self._error_type = error_type
 
+    @property
+    def error_type(self):
+        return self._error_type
+
     def __str__(self) -> str:
         if self.row is not None and self.column is not None and self.value is not None:
             return '{{row: {}, column: "{}"}}: "{}" {} -- {}'.format(
@@ -34,20 +34,18 @@ setup(
     data_files=[("", ["LICENSE", "sdrf_pipelines/openms/unimod.xml", "sdrf_pipelines/sdrf_merge/param2sdrf.yml"])],
     package_data={
         "sdrf-pipelines": ["*.xml", "*.parquet", "*.yml"],
-        "sdrf_pipelines": ["*.xml", "*.parquet", "*.yml"],
+        "sdrf_pipelines": ["*.xml", "*.parquet", "*.yml", "sdrf/templates/*.yml"],
     },
     url="https://github.com/bigbio/sdrf-pipelines",
     packages=find_packages(),
     install_requires=[
         "click",
         "pandas",
-        "pandas_schema",
         "requests",
         "pytest",
         "pyyaml",
         "defusedxml",
         "pyarrow",
-        "duckdb",
         "rdflib",
         "setuptools",
     ],
@@ -4,6 +4,15 @@ from pathlib import Path
 import pytest
 
 
+@pytest.fixture(scope="session", autouse=True)
+def cache_home(tmp_path_factory):
+    # the indexes of the ontologies and the templates are cached for the session, not in the user cache folder
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        cache_dir = tmp_path_factory.mktemp("cache")
+        monkeypatch.setenv("SDRF_PIPELINES_CACHE", str(cache_dir))
+        yield cache_dir
+
+
 @pytest.fixture(scope="function")
 def on_tmpdir(monkeypatch):
     with tempfile.TemporaryDirectory() as tmp_path:
@@ -0,0 +1,77 @@
+import csv
+
+import pandas as pd
+import pytest
+
+from sdrf_pipelines.msstats.msstats import Msstats
+from sdrf_pipelines.normalyzerde.normalyzerde import NormalyzerDE
+from sdrf_pipelines.parse_sdrf import cli
+
+from .helpers import run_and_check_status_code
+
+
+def test_msstats_annotation_table(shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "PXD001819/PXD001819.sdrf.tsv"
+    run_and_check_status_code(cli, ["convert-msstats", "-s", test_sdrf, "-o", "annotation.csv"])
+
+    msstats = Msstats()
+    annotation = msstats.annotation_table(pd.read_csv(test_sdrf, sep="\t"))
+    assert annotation.astype(str).equals(pd.read_csv("annotation.csv", dtype=str))
+    # the warnings are the ones of the last conversion
+    warnings = dict(msstats.warnings)
+    assert msstats.annotation_table(str(test_sdrf)).equals(annotation)
+    assert msstats.warnings == warnings
+
+
+def test_msstats_bio_replicates():
+    # the samples without a sample number are numbered in the order they appear, with the sample numbers
+    sdrf = pd.DataFrame(
+        {
+            "source name": ["A", "sample 3", "B", "Sample 1", "A", "x sample 2", "C"],
+            "comment[data file]": [f"{i}.raw" for i in range(7)],
+            "comment[technical replicate]": [1, 1, 1, 1, 2, 1, 1],
+            "factor value[disease]": ["normal", "cancer", "", "normal", "normal", "", "cancer"],
+        }
+    )
+    msstats = Msstats()
+    annotation = msstats.annotation_table(sdrf, maxqtomsstats=True)
+    assert annotation["BioReplicate"].tolist() == ["1", "3", "3", "1", "1", "2", "6"]
+    assert annotation["Condition"].tolist() == ["normal", "cancer", "B", "normal", "normal", "x sample 2", "cancer"]
+    assert annotation["Experiment"].tolist() == ["A_1", "sample 3_1", "B_1", "Sample 1_1", "A_2", "x sample 2_1", "C_1"]
+    assert msstats.warnings == {
+        "No factors specified. Adding Source Name as factor. Will be used as condition. ": 2,
+        "No sample number identifier": 4,
+    }
+
+
+def test_normalyzerde_design_table(shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "PXD001819/PXD001819.sdrf.tsv"
+    cmd = ["convert-normalyzerde", "-s", test_sdrf, "-o", "design.tsv", "-oc", "comparisons.csv"]
+    run_and_check_status_code(cli, cmd)
+
+    normalyzerde = NormalyzerDE()
+    design = normalyzerde.design_table(str(test_sdrf))
+    assert design.equals(pd.read_csv("design.tsv", sep="\t", dtype=str))
+    with open("comparisons.csv") as fh:
+        assert normalyzerde.get_comparisons(design) == next(csv.reader(fh))
+
+
+def test_normalyzerde_groups_and_maxquant_samples(on_tmpdir):
+    sdrf = pd.DataFrame(
+        {
+            "source name": ["Sample 1", "Sample 2", "Sample 3"],
+            "comment[data file]": ["a.raw", "b.raw", "c.raw"],
+            "factor value[spiked compound]": ["CN=UPS1;QY=25 fmol;", "CN=UPS1;QY=50-fmol;", "normal tissue"],
+        }
+    )
+    pd.DataFrame({"Name": ["c", "b", "a", "a"], "Experiment": ["s 3", "s-2", "s 1", "other"]}).to_csv(
+        "exp_design.txt", sep="\t", index=False
+    )
+    design = NormalyzerDE().design_table(sdrf, maxquant_exp_design_file="exp_design.txt")
+    assert design["group"].tolist() == ["25.fmol", "50_fmol", "normal.tissue"]
+    assert design["sample"].tolist() == ["s.1", "s.2", "s.3"]
+    assert design["technical_replicate"].tolist() == ["1", "1", "1"]
+
+    missing = sdrf.assign(**{"comment[data file]": ["a.raw", "b.raw", "d.raw"]})
+    with pytest.raises(ValueError, match="'d' is not in the MaxQuant experimental design"):
+        NormalyzerDE().design_table(missing, maxquant_exp_design_file="exp_design.txt")
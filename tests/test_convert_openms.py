@@ -1,7 +1,15 @@
+import contextlib
+import io
+import pickle
 from pathlib import Path
 
+import pandas as pd
 import pytest
 
+from sdrf_pipelines.openms.batch import get_output_directories
+from sdrf_pipelines.openms.openms import FileToColumnEntries
+from sdrf_pipelines.openms.openms import OpenMS
+from sdrf_pipelines.openms.openms import write_tables
 from sdrf_pipelines.parse_sdrf import cli
 
 from .helpers import compare_files
@@ -135,3 +143,127 @@ def test_on_reference_sdrf(file_subpath, two_files, shared_datadir, on_tmpdir):
     result = run_and_check_status_code(cli, cmd + ["-s", str(test_sdrf)])
     assert "ERROR" not in result.output.upper(), result.output
     _check_output_existance(on_tmpdir, two_files=two_files)
+
+
+def test_convert_openms_from_snapshot(shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "PXD001819/PXD001819.sdrf.tsv"
+    run_and_check_status_code(cli, ["convert-openms", "-t2", "-s", test_sdrf])
+    expected = {name: (on_tmpdir / name).read_text() for name in ("openms.tsv", "experimental_design.tsv")}
+
+    run_and_check_status_code(cli, ["snapshot-sdrf", "-s", test_sdrf, "-o", "PXD001819.sdrf.arrow"])
+    run_and_check_status_code(cli, ["convert-openms", "-t2", "-s", "PXD001819.sdrf.arrow"])
+    for name, content in expected.items():
+        assert (on_tmpdir / name).read_text() == content
+
+
+def test_convert_openms_with_a_tab_in_a_quoted_cell(shared_datadir, on_tmpdir):
+    lines = (shared_datadir / "PXD001819/PXD001819.sdrf.tsv").read_text().splitlines(keepends=True)
+    uri = lines[0].split("\t").index("comment[file uri]")
+    cells = lines[1].split("\t")
+    cells[uri] = f'"{cells[uri]}\tmirror"'
+    lines[1] = "\t".join(cells)
+    (on_tmpdir / "tab.sdrf.tsv").write_text("".join(lines))
+
+    run_and_check_status_code(cli, ["convert-openms", "-s", "tab.sdrf.tsv"])
+    # the value of the cell is written as it is, like before the rows were streamed
+    assert f"{cells[uri][1:-1]}\t" in (on_tmpdir / "openms.tsv").read_text()
+
+
+@pytest.mark.parametrize("one_table", [True, False])
+def test_convert_openms_conditions_from_columns(one_table, shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "reference/PXD004684/PXD004684.sdrf.tsv"
+    cmd = [
+        "convert-openms",
+        "-t1" if one_table else "-t2",
+        "-s",
+        test_sdrf,
+        "-c",
+        "[characteristics[biological replicate]]",
+    ]
+    result = run_and_check_status_code(cli, cmd + ["-j", "1"])
+    names = sorted(path.name for path in on_tmpdir.iterdir())
+    assert names == [f"experimental_design.tsv.{i}" for i in range(4)] + [f"openms.tsv.{i}" for i in range(4)]
+    expected = {name: (on_tmpdir / name).read_text() for name in names}
+    # every condition has the rows of its files only
+    assert sum(len(expected[f"openms.tsv.{i}"].splitlines()) - 1 for i in range(4)) == 15
+
+    # the conditions written in parallel are numbered the same
+    parallel = run_and_check_status_code(cli, cmd + ["-j", "4"])
+    for name, content in expected.items():
+        assert (on_tmpdir / name).read_text() == content
+    assert parallel.output == result.output
+
+
+def test_convert_openms_in_a_loop(shared_datadir):
+    sdrf = pd.read_csv(shared_datadir / "generic/quantms_dia_dotd_sample.sdrf", sep="\t")
+    openms = OpenMS()
+    converter_size = len(pickle.dumps(openms))
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = openms.convert_tables(sdrf)
+        for i in range(30):
+            # every file has its own raw files, the entries of the previous files must not be kept
+            context = openms.convert_tables(sdrf.assign(**{"comment[data file]": sdrf["comment[data file]"] + f".{i}"}))
+            assert context.warnings == first.warnings
+            assert set(context.f2c.file2mods) == {raw + f".{i}" for raw in first.f2c.file2mods}
+
+    # the state of the converter does not grow with the conversions
+    assert openms.warnings == {}
+    assert len(pickle.dumps(openms)) == converter_size
+    assert FileToColumnEntries().file2mods == {}
+
+
+@pytest.mark.parametrize("one_table", [True, False])
+def test_convert_tables(one_table, shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "PXD001819/PXD001819.sdrf.tsv"
+    run_and_check_status_code(cli, ["convert-openms", "-t1" if one_table else "-t2", "-s", test_sdrf])
+    expected = {name: (on_tmpdir / name).read_text() for name in ("openms.tsv", "experimental_design.tsv")}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        context = OpenMS().convert_tables(pd.read_csv(test_sdrf, sep="\t"), one_table=one_table)
+    assert sorted(context.tables) == ["experimental_design.tsv", "openms.tsv"]
+    assert context.warnings
+    (search_settings,) = context.tables["openms.tsv"]
+    assert search_settings.equals(pd.read_csv(on_tmpdir / "openms.tsv", sep="\t", dtype=str, keep_default_na=False))
+    # the two-table experimental design has a table of files and a table of samples
+    assert len(context.tables["experimental_design.tsv"]) == (1 if one_table else 2)
+
+    (on_tmpdir / "tables").mkdir()
+    write_tables(context.tables, on_tmpdir / "tables")
+    for name, content in expected.items():
+        assert (on_tmpdir / "tables" / name).read_text() == content
+
+
+def test_convert_openms_batch(shared_datadir, on_tmpdir):
+    assert get_output_directories(["a/X.sdrf.tsv", "b/X.sdrf.tsv", "c/X-2.sdrf.tsv", "d/x.sdrf"], "out") == [
+        "out/X",
+        "out/X-2",
+        "out/X-2-2",
+        "out/x-3",
+    ]
+
+    batch = on_tmpdir / "batch"
+    (batch / "other").mkdir(parents=True)
+    (batch / "other2").mkdir()
+    for file_subpath, name in [
+        ("PXD001819/PXD001819.sdrf.tsv", "PXD001819.sdrf.tsv"),
+        ("reference/PXD004684/PXD004684.sdrf.tsv", "other/PXD001819.sdrf.tsv"),
+        ("PXD001819/PXD001819.sdrf.tsv", "other2/PXD001819-2.sdrf.tsv"),
+        ("generic/sdrf.tsv", "invalid.sdrf.tsv"),
+    ]:
+        (batch / name).write_bytes((shared_datadir / file_subpath).read_bytes())
+
+    result = run_and_check_status_code(cli, ["convert-openms", "-b", str(batch), "-o", "out", "-j", "2"], 1)
+    assert "4 files: 3 converted, 1 failed" in result.output
+    summary = pd.read_csv("openms_conversion_summary.tsv", sep="\t", keep_default_na=False)
+    assert summary["status"].tolist() == ["converted", "failed", "converted", "converted"]
+    # a file named like the numbered directory of another one gets a directory of its own
+    assert summary["output"].tolist() == ["out/PXD001819", "out/invalid", "out/PXD001819-2", "out/PXD001819-2-2"]
+    assert summary["message"][1].startswith("Exception: Encountered empty cells")
+    assert not (on_tmpdir / "out" / "invalid").exists()
+
+    # the files of every SDRF are the ones of a conversion on its own
+    converted = summary[summary["status"] == "converted"]
+    for sdrf_file, output in zip(converted["file"], converted["output"]):
+        run_and_check_status_code(cli, ["convert-openms", "-s", sdrf_file])
+        for name in ("openms.tsv", "experimental_design.tsv"):
+            assert (on_tmpdir / output / name).read_text() == (on_tmpdir / name).read_text()
@@ -1,4 +1,18 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pkg_resources
+import pyarrow as pa
+import pyarrow.parquet as pq
+
 from sdrf_pipelines.ols.ols import OlsClient
+from sdrf_pipelines.ols.ontology_index import OntologyIndex
+from sdrf_pipelines.ols.ontology_index import get_index_file
+from sdrf_pipelines.ols.ontology_index import read_index
+from sdrf_pipelines.ols.ontology_index import to_index_table
+from sdrf_pipelines.ols.ontology_index import write_index
 
 
 def test_ontology():
@@ -23,3 +37,75 @@ def test_ontology_from_cache():
     ontology_list = ols.cache_search("homo sapiens", ontology="NCBITaxon")
     print(ontology_list)
     assert len(ontology_list) > 0
+
+
+def test_ontology_index_matches_parquet(tmp_path):
+    parquet_file = pkg_resources.resource_filename("sdrf_pipelines.ols", "pato.parquet")
+    terms = pd.read_parquet(parquet_file)
+    index_file = write_index(to_index_table(pq.read_table(parquet_file)), str(tmp_path / "pato.arrow"))
+    index = OntologyIndex(read_index(index_file))
+    assert len(index) == len(terms)
+    assert index.ontologies == ["pato"]
+    labels = index.table["label"].to_pylist()
+    assert labels == sorted(labels)
+    queries = terms["label"].sample(50, random_state=0).tolist() + ["not a pato term"]
+    for label in queries:
+        found = index.search(label.upper(), "PATO")
+        expected = terms[terms["label"] == label]
+        assert sorted(term["accession"] for term in found) == sorted(expected["accession"])
+    assert index.search_many(queries, "pato") == {label: index.search(label, "pato") for label in queries}
+    assert index.search(queries[0], "efo") == []
+
+
+def test_cached_index_is_rebuilt_when_the_parquet_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("SDRF_PIPELINES_CACHE", str(tmp_path / "cache"))
+    parquet_file = tmp_path / "pato.parquet"
+    parquet_file.write_bytes(Path(pkg_resources.resource_filename("sdrf_pipelines.ols", "pato.parquet")).read_bytes())
+    legacy = tmp_path / "cache" / "ontologies" / "pato-0123456789abcdef-v1.arrow"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"")
+
+    index_file = get_index_file(str(parquet_file))
+    assert not legacy.exists()
+    written = os.stat(index_file).st_mtime_ns
+    assert get_index_file(str(parquet_file)) == index_file
+    assert os.stat(index_file).st_mtime_ns == written
+
+    # a changed parquet file replaces its index
+    os.utime(parquet_file, ns=(written + 10**9, written + 10**9))
+    assert get_index_file(str(parquet_file)) == index_file
+    assert os.stat(index_file).st_mtime_ns != written
+    assert os.listdir(tmp_path / "cache" / "ontologies") == [os.path.basename(index_file)]
+
+
+def test_ontology_index_normalized_labels_and_prefixes():
+    table = pa.table(
+        {
+            "accession": ["x:3", "x:1", "x:2", "y:1"],
+            "label": ["Liver  Cell", "liver", "lung", "liver"],
+            "ontology": ["X", "x", "x", "y"],
+        }
+    )
+    index = OntologyIndex(to_index_table(table))
+    assert index.ontologies == ["x", "y"]
+    assert index.search(" liver cell\t", "x") == [{"accession": "x:3", "label": "liver  cell", "ontology": "x"}]
+    assert [term["accession"] for term in index.search("liver")] == ["x:1", "y:1"]
+    assert [term["label"] for term in index.search_prefix("liv", "x")] == ["liver", "liver  cell"]
+    assert [term["label"] for term in index.search_prefix("l", "x", limit=2)] == ["liver", "liver  cell"]
+    assert index.search_prefix("m") == []
+
+
+def test_cache_search_from_threads():
+    ols = OlsClient()
+    queries = [("liver", "uberon"), ("orbitrap fusion lumos", "ms"), ("homo sapiens", "ncbitaxon"), ("heart", None)]
+    expected = [ols.cache_search(term, ontology, full_search=True) for term, ontology in queries]
+    assert expected[1] and expected[1] == ols.search(
+        "orbitrap fusion lumos", "ms", exact=False, use_ols_cache_only=True
+    )
+
+    def search(query):
+        term, ontology = query
+        return ols.cache_search(term, ontology, full_search=True)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(search, queries * 25)) == expected * 25
@@ -1,6 +1,10 @@
+import os
+
 import pytest
 
+from sdrf_pipelines.openms.openms import OpenMS
 from sdrf_pipelines.openms.openms import get_openms_file_name
+from sdrf_pipelines.openms.openms import open_tsv_writer
 
 test_functions = [
     ("file.raw", "file.mzML", "raw:mzML"),
@@ -18,3 +22,39 @@ test_functions = [
 @pytest.mark.parametrize("input_file,expected_file,extension", test_functions)
 def test_get_openms_file_name(input_file, expected_file, extension):
     assert get_openms_file_name(input_file, extension) == expected_file
+
+
+def test_openms_ify_mod_set():
+    mods = (
+        "NT=Oxidation;MT=Variable;TA=M;AC=UNIMOD:35",
+        "NT=Carbamidomethyl;AC=UNIMOD:4;TA=C;MT=Fixed",
+        "NT=Acetyl;AC=UNIMOD:1;PP=Protein N-term;MT=variable",
+    )
+    openms = OpenMS()
+    fixed, variable = openms.openms_ify_mod_set(mods, occurrences=3)
+    assert fixed == "Carbamidomethyl (C)"
+    assert variable == "Acetyl (Protein N-term),Oxidation (M)"
+    # the warnings of the conversion are counted for every row with the modifications
+    assert openms.warnings == {"Warning no TA= specified. Setting to N-term or C-term if possible.": 3}
+
+
+def test_open_tsv_writer(tmp_path):
+    output = tmp_path / "openms.tsv"
+    with open_tsv_writer(output) as writer:
+        writer.writerow(["URI", "Filename", "FixedModifications"])
+        writer.writerow(["ftp://a/b.raw", 'b".raw', ""])
+        writer.writerow([])
+    assert output.read_text() == 'URI\tFilename\tFixedModifications\nftp://a/b.raw\tb".raw\t\n\n'
+
+    # the output is only replaced once all the rows are written
+    with pytest.raises(ValueError):
+        with open_tsv_writer(output) as writer:
+            writer.writerow(["Sample"])
+            raise ValueError("no sample")
+    assert output.read_text().startswith("URI")
+    assert os.listdir(tmp_path) == ["openms.tsv"]
+
+    # the values are written as they are, the tabs and new lines of a quoted SDRF cell included
+    with open_tsv_writer(output) as writer:
+        writer.writerow(["ftp://a/b\tc.raw", "b\nc.raw", None])
+    assert output.read_text() == "ftp://a/b\tc.raw\tb\nc.raw\t\n"
@@ -1,6 +1,27 @@
+import json
+import logging
+import pickle
+
+import pandas as pd
 import pytest
 
 from sdrf_pipelines.parse_sdrf import cli
+from sdrf_pipelines.sdrf.batch import validate_file
+from sdrf_pipelines.sdrf.errors import EMPTY_CELL
+from sdrf_pipelines.sdrf.errors import ErrorTable
+from sdrf_pipelines.sdrf.incremental import PHASES
+from sdrf_pipelines.sdrf.incremental import ErrorBudget
+from sdrf_pipelines.sdrf.incremental import ValidationPlan
+from sdrf_pipelines.sdrf.rules import ColumnRule
+from sdrf_pipelines.sdrf.sdrf import SdrfDataFrame
+from sdrf_pipelines.sdrf.sdrf import check_if_integer
+from sdrf_pipelines.sdrf.sdrf import integer_masks
+from sdrf_pipelines.sdrf.sdrf_schema import OntologyLookup
+from sdrf_pipelines.sdrf.sdrf_schema import SDRFColumn
+from sdrf_pipelines.sdrf.snapshot import is_snapshot
+from sdrf_pipelines.sdrf.snapshot import read_sdrf
+from sdrf_pipelines.sdrf.snapshot import write_snapshot
+from sdrf_pipelines.utils.exceptions import LogicError
 
 from .helpers import run_and_check_status_code
 
@@ -62,3 +83,210 @@ def test_on_reference_sdrf(file_subpath, shared_datadir, on_tmpdir):
     test_sdrf = shared_datadir / file_subpath
     result = run_and_check_status_code(cli, ["validate-sdrf", "--sdrf_file", str(test_sdrf)])
     assert "ERROR" not in result.output.upper(), result.output
+
+
+def test_parse_keeps_repetitive_columns_as_categories(shared_datadir):
+    test_sdrf = shared_datadir / "reference/PXD002137/PXD002137.sdrf.tsv"
+    df = SdrfDataFrame.parse(str(test_sdrf))
+
+    assert isinstance(df["characteristics[organism]"].dtype, pd.CategoricalDtype)
+    assert df["characteristics[organism]"].unique().tolist() == ["homo sapiens"]
+    assert not isinstance(df["comment[data file]"].dtype, pd.CategoricalDtype)
+    assert df["comment[data file]"].str.lower().equals(df["comment[data file]"])
+
+
+def test_column_validations_run_on_distinct_values():
+    evaluated = []
+
+    class NotRunValidation(ColumnRule):
+        code = "not_run"
+        default_message = "is a run"
+
+        def validate(self, series: pd.Series) -> pd.Series:
+            evaluated.extend(series.tolist())
+            return ~series.str.startswith("run")
+
+    column = SDRFColumn("comment[label]", [NotRunValidation()], allow_empty=True)
+    series = pd.Series(["label free sample", "run 1", "label free sample", "run 1", ""], name="comment[label]")
+    errors = column.validate(series)
+
+    assert sorted(evaluated) == ["", "label free sample", "run 1"]
+    assert [(e.row, e.value) for e in errors] == [(1, "run 1"), (3, "run 1")]
+
+
+def test_incomplete_rules_fail_when_created():
+    class NoValidation(ColumnRule):
+        default_message = "is never checked"
+
+    with pytest.raises(TypeError, match="validate"):
+        NoValidation()
+
+
+def test_error_table_materializes_errors_in_row_order():
+    table = ErrorTable([3, 1], column="comment[label]", value=["", ""], code=EMPTY_CELL)
+    table = table + [LogicError("Not a cell error", error_type=logging.WARN)]
+    errors = table.sort_by_row().to_logic_errors()
+
+    assert [e.row for e in errors] == [-1, 1, 3]
+    assert errors[1].message == "Empty value found Row: 1, Column: comment[label]"
+    assert errors[0].error_type == logging.WARN
+    assert table.to_frame()["validator"].tolist() == [EMPTY_CELL, EMPTY_CELL, None]
+
+
+def test_incremental_validation_matches_full_validation(shared_datadir, on_tmpdir, monkeypatch):
+    test_sdrf = on_tmpdir / "PXD000288.sdrf.tsv"
+    test_sdrf.write_text((shared_datadir / "erroneous/PXD000288/PXD000288.sdrf.tsv").read_text())
+    args = ["validate-sdrf", "--sdrf_file", str(test_sdrf), "--use_ols_cache_only"]
+
+    first = run_and_check_status_code(cli, args + ["--incremental"], 1)
+    assert (on_tmpdir / "PXD000288.sdrf.tsv.validation-cache").exists()
+    assert first.output == run_and_check_status_code(cli, args, 1).output
+
+    # edit one cell, the next run only validates the changed row and column again
+    lines = test_sdrf.read_text().split("\n")
+    cells = lines[3].split("\t")
+    cells[0] = " " + cells[0]
+    lines[3] = "\t".join(cells)
+    test_sdrf.write_text("\n".join(lines))
+
+    second = run_and_check_status_code(cli, args + ["--incremental"], 1)
+    assert second.output == run_and_check_status_code(cli, args, 1).output
+    assert second.output != first.output
+
+    # nothing changed, every error comes from the cache
+    with monkeypatch.context() as patch:
+        patch.setattr(ValidationPlan, "_evaluate", lambda *args: pytest.fail("the cache should be used"))
+        assert run_and_check_status_code(cli, args + ["--incremental"], 1).output == second.output
+
+    # the cache is never unpickled: a pickle in its place is ignored, not run
+    class Payload:
+        def __reduce__(self):
+            return open, (str(on_tmpdir / "pwned"), "w")
+
+    (on_tmpdir / "PXD000288.sdrf.tsv.validation-cache").write_bytes(pickle.dumps(Payload()))
+    assert run_and_check_status_code(cli, args + ["--incremental"], 1).output == second.output
+    assert not (on_tmpdir / "pwned").exists()
+
+
+def test_validate_batch_writes_summary(shared_datadir, on_tmpdir):
+    batch = on_tmpdir / "batch"
+    (batch / "nested").mkdir(parents=True)
+    erroneous = (shared_datadir / "erroneous/example.sdrf.tsv").read_text()
+    (batch / "first.sdrf.tsv").write_text(erroneous)
+    (batch / "nested" / "second.sdrf.tsv").write_text(erroneous)
+    (batch / "notes.txt").write_text("not an SDRF")
+
+    args = ["validate-sdrf", "--batch", str(batch), "--use_ols_cache_only", "--jobs", "2", "--summary", "summary.tsv"]
+    result = run_and_check_status_code(cli, args, 1)
+    assert "Validated 2 files: 0 valid, 2 with validation errors, 0 failed" in result.output
+
+    summary = pd.read_csv(on_tmpdir / "summary.tsv", sep="\t")
+    assert summary["file"].tolist() == [str(batch / "first.sdrf.tsv"), str(batch / "nested" / "second.sdrf.tsv")]
+    assert summary["status"].tolist() == ["invalid", "invalid"]
+    assert summary["errors"].iloc[0] == summary["errors"].iloc[1] > 0
+
+
+@pytest.mark.parametrize("report_format", ["json", "tsv", "parquet"])
+def test_validate_sdrf_writes_report(shared_datadir, on_tmpdir, report_format):
+    test_sdrf = shared_datadir / "erroneous/example.sdrf.tsv"
+    report_file = on_tmpdir / f"report.{report_format}"
+    args = ["validate-sdrf", "--sdrf_file", str(test_sdrf), "--use_ols_cache_only"]
+    run_and_check_status_code(cli, args + ["--report", report_format, "--report_file", str(report_file)], 1)
+    n_errors = len(validate_file(str(test_sdrf), use_ols_cache_only=True))
+
+    if report_format == "json":
+        with open(report_file, encoding="utf-8") as fh:
+            report = json.load(fh)
+        errors, phases = pd.DataFrame(report["errors"]), pd.DataFrame(report["phases"])
+    elif report_format == "tsv":
+        errors = pd.read_csv(report_file, sep="\t")
+        phases = pd.read_csv(on_tmpdir / "report_phases.tsv", sep="\t")
+    else:
+        errors = pd.read_parquet(report_file)
+        phases = pd.read_parquet(on_tmpdir / "report_phases.parquet")
+
+    assert len(errors) == n_errors
+    assert list(errors.columns) == ["row", "column", "value", "level", "validator", "message"]
+    assert set(errors["level"]) <= {"ERROR", "WARNING"}
+    phases = phases.set_index("phase")
+    assert list(phases.index) == PHASES
+    assert phases["errors"].sum() == n_errors
+    assert phases.loc["factor_values", "errors"] > 0
+    assert (phases["seconds"] >= 0).all()
+    lookups = phases.loc["ontology_lookups"]
+    assert lookups["hits"] + lookups["misses"] > 0
+
+
+def test_validate_sdrf_stops_at_max_errors(shared_datadir, on_tmpdir):
+    test_sdrf = str(shared_datadir / "erroneous/example.sdrf.tsv")
+    all_errors = [str(error) for error in validate_file(test_sdrf, use_ols_cache_only=True)]
+
+    budget = ErrorBudget(5)
+    errors = validate_file(test_sdrf, use_ols_cache_only=True, budget=budget, incremental=True)
+    assert int((errors.level >= logging.ERROR).sum()) == 5
+    assert set(str(error) for error in errors) <= set(all_errors)
+    assert budget.exhausted and budget.skipped > 0
+    assert sum(budget.counts.values()) >= 5
+    # units were skipped, the incremental cache is not written
+    assert not (shared_datadir / "erroneous/example.sdrf.tsv.validation-cache").exists()
+
+    args = ["validate-sdrf", "--sdrf_file", test_sdrf, "--use_ols_cache_only", "--fail-fast"]
+    result = run_and_check_status_code(cli, args, 1)
+    assert result.output.count("-- ERROR") == 1
+    assert "The validation stopped after 1 errors" in result.output
+
+
+def test_integer_masks_match_check_if_integer():
+    values = pd.Series(["1", "0", "-1", " 2 ", "+3", "3.0", "1e3", "", "not available", "007", None] * 2, dtype=object)
+    is_integer, is_positive = integer_masks(values)
+    assert is_integer.tolist() == [isinstance(x, str) and check_if_integer(x) for x in values]
+    assert is_positive.tolist() == [isinstance(x, str) and check_if_integer(x) and int(x) > 0 for x in values]
+
+
+def test_ontology_lookup_searches_again_the_terms_not_found_by_ols(monkeypatch):
+    answers = {"homo sapiens": [[], [{"label": "Homo sapiens"}]]}
+
+    class FlakyOlsClient:
+        # the first search of a term fails like OlsClient.ols_search on a network error
+        def search(self, term, use_ols_cache_only=False, **kwargs):
+            return answers[term].pop(0)
+
+    monkeypatch.setattr("sdrf_pipelines.sdrf.sdrf_schema._client", FlakyOlsClient())
+    lookup = OntologyLookup(max_terms=1)
+    assert lookup.labels("homo sapiens", ontology="ncbitaxon") == frozenset()
+    assert lookup.labels("homo sapiens", ontology="ncbitaxon") == {"homo sapiens"}
+    assert lookup.labels("homo sapiens", ontology="ncbitaxon") == {"homo sapiens"}
+    assert (lookup.hits, lookup.misses) == (1, 2)
+
+    # the oldest lookups are forgotten beyond max_terms
+    answers["mus musculus"] = [[{"label": "Mus musculus"}]]
+    lookup.labels("mus musculus", ontology="ncbitaxon")
+    assert len(lookup._labels) == 1
+
+
+def test_experimental_design_reports_inconsistent_assays():
+    df = SdrfDataFrame(
+        {
+            "assay name": ["run 1", "run 1", "run 2", "run 3"],
+            "comment[data file]": ["a.raw", "b.raw", "c.raw", "c.raw"],
+        }
+    )
+    messages = [error.message for error in df.check_inconsistencies_assay_file([])]
+    assert messages == [
+        "Multiple assays with the same raw files: ['run 1'], the combination assay name and comment[data file] should "
+        "be unique",
+        "Multiple raw files with the same assay: ['c.raw'], the combination assay name and comment[data file] should "
+        "be unique",
+    ]
+
+
+def test_validate_snapshot_like_sdrf(shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "erroneous/example.sdrf.tsv"
+    snapshot = write_snapshot(str(test_sdrf), str(on_tmpdir / "example.sdrf.arrow"))
+    assert is_snapshot(snapshot) and not is_snapshot(str(test_sdrf))
+    pd.testing.assert_frame_equal(read_sdrf(snapshot), pd.read_csv(test_sdrf, sep="\t"))
+    pd.testing.assert_frame_equal(SdrfDataFrame.parse(snapshot), SdrfDataFrame.parse(str(test_sdrf)))
+
+    args = ["validate-sdrf", "--use_ols_cache_only", "--sdrf_file"]
+    expected = run_and_check_status_code(cli, args + [str(test_sdrf)], 1).output
+    assert run_and_check_status_code(cli, args + [snapshot], 1).output == expected
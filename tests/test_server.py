@@ -0,0 +1,87 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from sdrf_pipelines.parse_sdrf import cli
+from sdrf_pipelines.sdrf.batch import validate_file
+from sdrf_pipelines.server import SERVER_ENV
+from sdrf_pipelines.server import TOKEN_ENV
+from sdrf_pipelines.server import SdrfServer
+from sdrf_pipelines.server import call_server
+from sdrf_pipelines.server import find_server
+from sdrf_pipelines.server import get_server_file
+from sdrf_pipelines.server import use_server
+from sdrf_pipelines.server import write_server_file
+
+from .helpers import run_and_check_status_code
+
+
+@pytest.fixture
+def server():
+    server = SdrfServer(("127.0.0.1", 0), jobs=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_server_validates_and_converts(server, shared_datadir, on_tmpdir, monkeypatch):
+    test_sdrf = str(shared_datadir / "PXD001819/PXD001819.sdrf.tsv")
+    assert call_server(server.url, "/health", token=server.token)["jobs"] == 1
+    # the requests without the token of the server are refused
+    with pytest.raises(OSError, match="401"):
+        call_server(server.url, "/health")
+    with pytest.raises(OSError, match="401"):
+        call_server(server.url, "/validate", {"sdrf_file": test_sdrf}, token="not the token")
+
+    request = {"sdrf_file": test_sdrf, "use_ols_cache_only": True}
+    response = call_server(server.url, "/validate", request, token=server.token)
+    errors = validate_file(test_sdrf, use_ols_cache_only=True)
+    assert response["messages"] == [str(error) for error in errors]
+    assert len(response["errors"]) == len(errors) and not response["exhausted"]
+    response = call_server(server.url, "/validate", dict(request, max_errors=1), token=server.token)
+    assert response["exhausted"] and response["max_errors"] == 1
+    with pytest.raises(OSError, match="400"):
+        call_server(server.url, "/validate", {"sdrf_file": test_sdrf, "unknown": True}, token=server.token)
+
+    (on_tmpdir / "server").mkdir()
+    request = {"sdrf_file": test_sdrf, "output": str(on_tmpdir / "server")}
+    response = call_server(server.url, "/convert-openms", request, token=server.token)
+    assert response["status"] == "converted" and "SUCCESS" in response["log"]
+
+    # the server file gives the address and the token, and is readable by its user only
+    write_server_file({"url": server.url, "pid": os.getpid(), "token": server.token})
+    if os.name == "posix":
+        assert stat.S_IMODE(os.stat(get_server_file()).st_mode) == 0o600
+    assert find_server() == (server.url, server.token)
+    os.unlink(get_server_file())
+    monkeypatch.setenv(SERVER_ENV, server.url)
+    assert find_server() is None
+
+    # the commands forward their requests to the server when asked to
+    args = ["validate-sdrf", "-s", test_sdrf, "--use_ols_cache_only"]
+    local = run_and_check_status_code(cli, args, 1)
+    monkeypatch.setenv(TOKEN_ENV, server.token)
+    assert find_server() == (server.url, server.token)
+    with monkeypatch.context() as patch:
+        # the workers of the server were forked before, they are not patched
+        patch.setattr("sdrf_pipelines.parse_sdrf.validate_file", lambda *args, **kwargs: pytest.fail("not forwarded"))
+        patch.setattr("sdrf_pipelines.parse_sdrf.OpenMS", lambda: pytest.fail("not forwarded"))
+        assert run_and_check_status_code(cli, args, 1).output == local.output
+        run_and_check_status_code(cli, ["convert-openms", "-s", test_sdrf])
+    for name in ("openms.tsv", "experimental_design.tsv"):
+        assert (on_tmpdir / name).read_text() == (on_tmpdir / "server" / name).read_text()
+
+    # a server of another version is not used
+    server.version = "0.0.0"
+    assert find_server() is None
+    monkeypatch.delenv(SERVER_ENV)
+    assert not use_server() and use_server(True)
+
+
+def test_server_listens_on_loopback_only():
+    with pytest.raises(ValueError, match="--allow-remote"):
+        SdrfServer(("0.0.0.0", 0), jobs=1)
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from sdrf_pipelines.parse_sdrf import cli
+from sdrf_pipelines.sdrf.split import GroupFiles
+from sdrf_pipelines.sdrf.split import split_sdrf_file
+
+from .helpers import run_and_check_status_code
+
+
+def test_split_sdrf(shared_datadir, on_tmpdir):
+    test_sdrf = shared_datadir / "reference/PDC000126/PDC000126.sdrf.tsv"
+    (on_tmpdir / "PDC000126.sdrf.tsv").write_bytes(test_sdrf.read_bytes())
+    run_and_check_status_code(cli, ["split-sdrf", "-s", "PDC000126.sdrf.tsv", "-a", "comment[label]"])
+
+    lines = [line + "\n" for line in test_sdrf.read_text().splitlines()]
+    sdrf = pd.read_csv(test_sdrf, sep="\t")
+    for label, group in sdrf.groupby("comment[label]"):
+        # the header and the rows as they are in the SDRF, duplicated column names and quotes included
+        output = (on_tmpdir / f"PDC000126-{label}.sdrf.tsv").read_text()
+        assert output == "".join([lines[0]] + [lines[i + 1] for i in group.index])
+
+
+def test_split_sdrf_open_files(on_tmpdir):
+    # more groups than open files, the files are reopened to append
+    lines = ["source name\tcomment[data file]\tcomment[fraction identifier]\n"]
+    lines += [f"sample {i % 7}\tfile_{i}.raw\t{i % 3 + 1}\n" for i in range(500)]
+    lines += ["\n", "sample 1\t\t1"]
+    (on_tmpdir / "test.sdrf.tsv").write_text("".join(lines))
+
+    rows = split_sdrf_file(
+        "test.sdrf.tsv", ["source name", "comment[fraction identifier]"], prefix="split", max_open_files=2
+    )
+    assert len(rows) == 21
+    assert sum(rows.values()) == 501
+    assert rows["split-sample_1-1.sdrf.tsv"] == 25
+    assert (on_tmpdir / "split-sample_1-1.sdrf.tsv").read_text() == "".join(
+        [lines[0]]
+        + [line for line in lines[1:-2] if line.startswith("sample 1\t") and line.endswith("\t1\n")]
+        + ["sample 1\t\t1\n"]
+    )
+
+
+def test_split_sdrf_writers(on_tmpdir, monkeypatch):
+    lines = ["source name\tcomment[data file]\n"] + [f"sample {i % 50}\tfile_{i}.raw\n" for i in range(2000)]
+    (on_tmpdir / "test.sdrf.tsv").write_text("".join(lines))
+    (on_tmpdir / "one").mkdir()
+    (on_tmpdir / "four").mkdir()
+    progress = []
+    rows = split_sdrf_file("test.sdrf.tsv", ["source name"], output_directory="one", jobs=1)
+    assert split_sdrf_file(
+        "test.sdrf.tsv", ["source name"], output_directory="four", max_open_files=8, jobs=4, progress=progress.append
+    ) == {path.replace("one", "four"): n for path, n in rows.items()}
+    assert len(progress) == 1 and progress[0].rows == 2000 and progress[0].files == 50
+    for path in rows:
+        assert (on_tmpdir / path).read_text() == (on_tmpdir / path.replace("one", "four")).read_text()
+
+    # the writers never have more open files than allowed, whatever the number of threads
+    for max_open_files, jobs, quotas in [(2, 8, [1, 1]), (10, 4, [3, 3, 2, 2]), (0, 2, [1])]:
+        group_files = GroupFiles("header\n", max_open_files, jobs)
+        assert [shard.max_open_files for shard in group_files.shards] == quotas
+        group_files.close(complete=False)
+    (on_tmpdir / "two").mkdir()
+    assert split_sdrf_file("test.sdrf.tsv", ["source name"], output_directory="two", max_open_files=2, jobs=8) == {
+        path.replace("one", "two"): n for path, n in rows.items()
+    }
+    for path in rows:
+        assert (on_tmpdir / path).read_text() == (on_tmpdir / path.replace("one", "two")).read_text()
+
+    # a failed split leaves neither partial nor temporary files
+    def fail(self, path, lines):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr("sdrf_pipelines.sdrf.split._FileShard.write", fail)
+    (on_tmpdir / "failed").mkdir()
+    for jobs in (1, 4):
+        with pytest.raises(OSError, match="No space left"):
+            split_sdrf_file("test.sdrf.tsv", ["source name"], output_directory="failed", jobs=jobs)
+        assert not list((on_tmpdir / "failed").iterdir())
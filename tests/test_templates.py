@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from sdrf_pipelines.sdrf import templates
+from sdrf_pipelines.sdrf.sdrf_schema import OntologyTerm
+
+
+@pytest.fixture
+def template_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("SDRF_PIPELINES_CACHE", str(tmp_path))
+    monkeypatch.setattr(templates, "_loaded_templates", {})
+    return tmp_path / "templates"
+
+
+def test_only_requested_templates_are_loaded(template_cache):
+    schemas = templates.load_schemas("human")
+
+    assert [schema.name for schema in schemas] == ["default", "human"]
+    assert sorted(name for _, name in templates._loaded_templates) == ["default", "human"]
+    organism = [column for column in schemas[0].columns if column.name == "characteristics[organism]"][0]
+    assert isinstance(organism.validations[-1], OntologyTerm)
+
+
+def test_parsed_template_is_cached_on_disk(template_cache, monkeypatch):
+    schema = templates.load_template("mass_spectrometry")
+    cache_files = list(template_cache.glob("mass_spectrometry-*.json"))
+    assert len(cache_files) == 1
+
+    def fail(content):
+        raise AssertionError("the template should not be parsed again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(templates.yaml, "safe_load", fail)
+        patch.setattr(templates, "_loaded_templates", {})
+        cached = templates.load_template("mass_spectrometry")
+    assert [column.name for column in cached.columns] == [column.name for column in schema.columns]
+    assert cached.digest == schema.digest
+
+    # a corrupted cache is parsed again
+    cache_files[0].write_text("{not json")
+    monkeypatch.setattr(templates, "_loaded_templates", {})
+    reparsed = templates.load_template("mass_spectrometry")
+    assert [column.name for column in reparsed.columns] == [column.name for column in schema.columns]
+
+
+def test_changed_definition_is_compiled_again(template_cache, tmp_path):
+    definitions = tmp_path / "definitions"
+    definitions.mkdir()
+    definition = {"name": "custom", "columns": [{"name": "source name", "validations": ["leading_whitespace"]}]}
+    (definitions / "custom.json").write_text(json.dumps(definition))
+    assert templates.load_template("custom", str(definitions)).columns[0].name == "source name"
+
+    definition["columns"][0]["name"] = "assay name"
+    (definitions / "custom.json").write_text(json.dumps(definition))
+    templates._loaded_templates.clear()
+
+    assert templates.load_template("custom", str(definitions)).columns[0].name == "assay name"
+    assert len(list(template_cache.glob("custom-*.json"))) == 2
+
+
+def test_unknown_rule_is_rejected():
+    with pytest.raises(ValueError, match="Unknown rule"):
+        templates.compile_rule({"not_a_rule": {}})
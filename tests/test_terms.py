@@ -0,0 +1,50 @@
+import re
+
+import pandas as pd
+import pytest
+
+from sdrf_pipelines.sdrf.terms import extract_keys
+from sdrf_pipelines.sdrf.terms import format_term
+from sdrf_pipelines.sdrf.terms import parse_column
+from sdrf_pipelines.sdrf.terms import parse_term
+
+cells = [
+    "NT=Oxidation;MT=Variable;TA=M;AC=UNIMOD:35",
+    "NT=Carbamidomethyl;AC=UNIMOD:4;TA=C;MT=Fixed",
+    "NT=Acetyl;AC=UNIMOD:1;PP=Protein N-term;MT=variable",
+    "NT=Phospho;AC=UNIMOD:21;TA=S,T,Y;MT=Variable; CF=H O(3) P",
+    "NT=Trypsin;AC=MS:1001251",
+    "label free sample",
+]
+
+
+@pytest.mark.parametrize("cell", cells)
+def test_parse_term_like_regular_expressions(cell):
+    term = parse_term(cell)
+    for key in ("NT", "AC", "MT", "PP", "TA", "CF"):
+        match = re.search(f"{key}=(.+?)(;|$)", cell)
+        assert term.get(key) == (match.group(1) if match else None)
+    assert parse_term(cell) is term
+    assert hash(term) == hash(parse_term(cell + ";"))
+
+
+def test_extract_keys_of_column():
+    column = pd.Series(cells * 3 + [None])
+    keys = extract_keys(column, ["NT", "TA", "PP"])
+    expected = [
+        [term.get(key) for key in ("NT", "TA", "PP")] if term is not None else [None] * 3
+        for term in parse_column(column)
+    ]
+    assert keys.values.tolist() == expected
+    assert list(keys.index) == list(column.index)
+
+
+def test_extract_keys_without_terms():
+    keys = extract_keys(pd.Series(["label free sample", "not available"]), ["NT"])
+    assert keys["NT"].tolist() == [None, None]
+
+
+def test_format_term():
+    values = {"NT": "Oxidation", "AC": "UNIMOD:35", "MT": "variable", "TA": "M"}
+    assert format_term(values) == "NT=Oxidation;AC=UNIMOD:35;MT=variable;TA=M"
+    assert dict(parse_term(format_term(values)).items()) == values